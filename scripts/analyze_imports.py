@@ -10,18 +10,100 @@ import sys
 import re
 import json
 import argparse
-from typing import List, Tuple, Set, Optional
+import hashlib
+from typing import TYPE_CHECKING, List, NamedTuple, Tuple, Set, Optional
 from github_utils import save_results, is_runtime_expired
+from repo_queue import RepoQueue
+from import_cache import ImportCache
+from git_fetch import SourceFile, fetch_selected_files, read_selected_files, fetch_timeout
+from mirror_cache import MirrorCache
+from sampling import AdaptiveSampler, SampleBudget
+from metrics import RepoMetrics, MetricsRecorder
+from import_scanner import scan_imports
+from import_store import IMPORT_SOURCE
+from manifests import IMPORT_PARSING
+
+if TYPE_CHECKING:
+    # Loads numpy, which only near-duplicate detection needs
+    from near_duplicates import NearDuplicateIndex
+    # Imports this module
+    from parse_sandbox import ParseSandbox
+
+# Ways of fetching repository contents
+FETCH_MODES = ("clone", "partial")
+
+# Import extraction engines: "ast" parses the file with a regex fallback on
+# syntax errors, "scan" uses the streaming scanner in import_scanner
+ENGINES = ("ast", "scan")
 
 # Standard library modules to exclude
 STANDARD_LIBS = sys.stdlib_module_names
 
-def extract_imports(content: str) -> Set[str]:
+# Bump whenever extract_imports, or the notebook code extraction in notebooks.py,
+# can return different results for the same blob
+EXTRACTOR_VERSION = 2
+
+class AnalysisOptions(NamedTuple):
+    """How the repositories of a run are fetched and analyzed (see analyze_repo)."""
+    # Maximum number of Python files analyzed per repository (the upper bound when sampling)
+    max_files: int = 10
+    # How repositories are fetched (see FETCH_MODES)
+    fetch_mode: str = "clone"
+    # Import cache consulted before reading and parsing files
+    cache: Optional[ImportCache] = None
+    # Import extraction engine (see ENGINES)
+    engine: str = "ast"
+    # Parser pool with per-file limits; files are parsed on the calling thread without it
+    sandbox: Optional["ParseSandbox"] = None
+    # Persistent bare mirrors repositories are fetched into
+    mirrors: Optional[MirrorCache] = None
+    # Also record the dependencies declared in manifests
+    manifests: bool = False
+    # When to parse Python files (see IMPORT_PARSING)
+    import_parsing: str = "always"
+    # Also analyze the code cells of Jupyter notebooks
+    notebooks: bool = False
+    # Index to skip near-duplicates of analyzed repositories with
+    near_duplicates: Optional["NearDuplicateIndex"] = None
+    # Sample files adaptively within this budget, up to max_files (see sampling.py)
+    sample_budget: Optional[SampleBudget] = None
+    # Epoch time git operations are cut off at
+    deadline: Optional[float] = None
+
+def extractor_version(engine: str = "ast") -> str:
+    """Version key for cached imports, covering the extractor logic, engine and STANDARD_LIBS."""
+    digest = hashlib.sha1(f"{EXTRACTOR_VERSION}:{engine}:{','.join(sorted(STANDARD_LIBS))}".encode())
+    return digest.hexdigest()
+
+def open_import_cache(cache_file: Optional[str], engine: str = "ast") -> Optional[ImportCache]:
+    """Open the import cache for the given extractor engine, or return None if no file is given."""
+    if not cache_file:
+        return None
+    return ImportCache(cache_file, extractor_version(engine))
+
+def open_mirror_cache(mirror_dir: Optional[str], max_gb: float = 20) -> Optional[MirrorCache]:
+    """Open the mirror cache in a directory, or return None if no directory is given."""
+    if not mirror_dir:
+        return None
+    return MirrorCache(mirror_dir, int(max_gb * 1024 ** 3))
+
+def open_near_duplicate_index(index_file: Optional[str], threshold: float = 0.8) -> Optional["NearDuplicateIndex"]:
+    """Open the near-duplicate index, or return None if no file is given."""
+    if not index_file:
+        return None
+    from near_duplicates import NearDuplicateIndex
+    return NearDuplicateIndex(index_file, threshold)
+
+def extract_imports(content: str, engine: str = "ast") -> Set[str]:
     """
     Extract imported libraries from Python content using AST parsing
-    and regex as a fallback for edge cases.
-    Filters out standard library imports.
+    and regex as a fallback for edge cases, or with the streaming scanner
+    when engine is "scan".
+    Filters out standard library and relative imports.
     """
+    if engine == "scan":
+        return {lib_name for lib_name in scan_imports(content) if lib_name not in STANDARD_LIBS}
+    
     libraries = set()
     
     # AST parsing for reliable import extraction
@@ -34,13 +116,13 @@ def extract_imports(content: str) -> Set[str]:
                     if lib_name not in STANDARD_LIBS:
                         libraries.add(lib_name)
             elif isinstance(node, ast.ImportFrom):
-                if node.module:
+                if node.module and not node.level:
                     lib_name = node.module.split('.')[0]
                     if lib_name not in STANDARD_LIBS:
                         libraries.add(lib_name)
     except SyntaxError:
         # Fallback to regex for files with syntax errors
-        import_pattern = r'^import\s+([\w\.]+)|^from\s+([\w\.]+)\s+import'
+        import_pattern = r'^import\s+([\w\.]+)|^from\s+(\w[\w\.]*)\s+import'
         for match in re.finditer(import_pattern, content, re.MULTILINE):
             lib = match.group(1) or match.group(2)
             if lib:
@@ -50,120 +132,243 @@ def extract_imports(content: str) -> Set[str]:
                 
     return libraries
 
-def analyze_repo(repo_info: Tuple[str, str, str], max_files: int = 10) -> List[Tuple[str, str, str, str, str]]:
+def fetch_repo_files(
+    repo_name: str,
+    max_files: int = 10,
+    fetch_mode: str = "clone",
+    cache: Optional[ImportCache] = None,
+    metrics: Optional[RepoMetrics] = None,
+    mirrors: Optional[MirrorCache] = None,
+    manifests: bool = False,
+    import_parsing: str = "always",
+    first_party: Optional[Set[str]] = None,
+    notebooks: bool = False,
+    near_duplicates: Optional["NearDuplicateIndex"] = None,
+    sampler: Optional[AdaptiveSampler] = None,
+    timeout: int = 300
+) -> Optional[List[SourceFile]]:
+    """
+    Fetch a repository and read up to max_files of its Python files.
+    
+    Args:
+        repo_name: Repository name (owner/repo)
+        max_files: Maximum number of Python files to read
+        fetch_mode: "clone" for a shallow clone without a working tree, "partial"
+            for a blobless clone that only fetches the Python blobs it reads
+        cache: Optional import cache; cached files come back with imports set and no content
+        metrics: Optional RepoMetrics to record clone, discover and read timings and counts in
+        mirrors: Optional MirrorCache; the repository is fetched into its persistent
+            mirror instead of a temporary clone
+        manifests: Also read dependency manifests; they come back as files with
+            source "manifest" and their declared dependencies as imports
+        import_parsing: When to read Python files (see IMPORT_PARSING)
+        first_party: Optional set the repository's own top-level module names are
+            added to, for build_results to leave out
+        notebooks: Also read the code cells of Jupyter notebooks
+        near_duplicates: Optional index of analyzed repositories; a near-duplicate
+            comes back as no files, with metrics.duplicate_of set
+        sampler: Optional AdaptiveSampler; files are then read and parsed one at
+            a time until it stops, and come back parsed
+        timeout: Timeout in seconds for each git network operation
+        
+    Returns:
+        List of SourceFile, or None if the repository could not be fetched
+    """
+    try:
+        if mirrors is not None:
+            with mirrors.open(repo_name, fetch_mode, timeout, metrics=metrics) as mirror:
+                if mirror is None:
+                    return None
+                repo_dir, blobless = mirror
+                return read_selected_files(
+                    repo_dir, max_files, timeout=timeout, cache=cache, metrics=metrics, blobless=blobless,
+                    manifests=manifests, import_parsing=import_parsing, first_party=first_party,
+                    notebooks=notebooks, near_duplicates=near_duplicates,
+                    sampler=sampler
+                )
+        
+        # Create a temporary directory for the cloned repo
+        with tempfile.TemporaryDirectory() as temp_dir:
+            return fetch_selected_files(
+                repo_name, temp_dir, max_files, timeout=timeout, cache=cache, metrics=metrics, fetch_mode=fetch_mode,
+                manifests=manifests, import_parsing=import_parsing, first_party=first_party,
+                notebooks=notebooks, near_duplicates=near_duplicates,
+                sampler=sampler
+            )
+    except subprocess.TimeoutExpired:
+        logging.error(f"Timeout while processing {repo_name}")
+        return None
+    except Exception as e:
+        logging.error(f"Failed to fetch repo {repo_name}: {e}")
+        return None
+
+def extract_file_imports(files: List[SourceFile], engine: str = "ast") -> List[SourceFile]:
+    """
+    Extract imports from the files that don't have them yet.
+    
+    Parsed files are returned without their content so they are cheap to
+    send back from a worker process, and with the time their parse took.
+    
+    Args:
+        files: List of SourceFile
+        engine: Import extraction engine (see ENGINES)
+        
+    Returns:
+        List of SourceFile with imports set
+    """
+    parsed = []
+    for file in files:
+        if file.imports is not None:
+            parsed.append(file)
+            continue
+        try:
+            start = time.perf_counter()
+            imports = extract_imports(file.content, engine)
+            parsed.append(file._replace(content=None, imports=imports, parse_time=time.perf_counter() - start))
+        except Exception as e:
+            logging.warning(f"Error processing file {file.path}: {e}")
+    return parsed
+
+def parse_files(
+    files: List[SourceFile],
+    engine: str = "ast",
+    sandbox=None,
+    repo_name: str = "",
+    metrics: Optional[RepoMetrics] = None
+) -> List[SourceFile]:
+    """
+    Extract imports in this process, or in a parse_sandbox.ParseSandbox with
+    per-file time and memory limits if one is given.
+    
+    Returns:
+        List of SourceFile with imports set (files that failed are left out)
+    """
+    if sandbox is not None:
+        return sandbox.parse(files, engine, repo_name, metrics)
+    return extract_file_imports(files, engine)
+
+def cache_file_imports(files: List[SourceFile], cache: Optional[ImportCache]) -> None:
+    """Store parsed imports in the cache, keyed by blob SHA."""
+    if cache is not None:
+        # Manifest dependencies are not the imports of the blob (setup.py is both)
+        cache.put_many((file.blob_sha, file.imports) for file in files if file.source == IMPORT_SOURCE)
+
+def build_results(
+    repo_info: Tuple[str, str, str],
+    files: List[SourceFile],
+    fetch_date: str,
+    first_party: Optional[Set[str]] = None
+) -> List[Tuple[str, str, str, str, str, str]]:
+    """
+    Turn per-file import sets into result rows.
+    
+    Args:
+        repo_info: Tuple of (repo_name, repo_url, last_updated)
+        files: Parsed files from extract_file_imports
+        fetch_date: When the repository was fetched
+        first_party: The repository's own module names; imports of them are left out
+    
+    Returns:
+        List of tuples (library_name, repo_name, file_path, fetch_date, last_updated, source)
+    """
+    repo_name, _, last_updated = repo_info
+    repo_results = []
+    first_party = first_party or set()
+    for file in files:
+        for library in file.imports:
+            if file.source == IMPORT_SOURCE and library in first_party:
+                continue
+            repo_results.append((
+                library, 
+                repo_name, 
+                file.path, 
+                fetch_date, 
+                last_updated,
+                file.source
+            ))
+    return repo_results
+
+def analyze_repo(
+    repo_info: Tuple[str, str, str],
+    options: AnalysisOptions,
+    metrics: Optional[RepoMetrics] = None
+) -> Optional[List[Tuple[str, str, str, str, str, str]]]:
     """
     Analyze a GitHub repository for Python library usage by cloning it once.
     
+    Every processing path (process_repo_from_file, process_repo_from_queue and
+    the concurrent pipeline) runs this; what happens to the results, and to a
+    repository that could not be fetched, is up to the caller.
+    
     Args:
         repo_info: Tuple of (repo_name, repo_url, last_updated)
-        max_files: Maximum number of Python files to analyze
+        options: How to fetch and analyze the repository
+        metrics: Optional RepoMetrics to record stage timings and counts in; a
+            failed fetch sets its status to "deadline" if the fetch was cut off
+            by options.deadline and to "fetch_failed" otherwise
         
     Returns:
-        List of tuples (library_name, repo_name, file_path, fetch_date, last_updated)
+        List of tuples (library_name, repo_name, file_path, fetch_date, last_updated, source),
+        or None if the repository could not be fetched
     """
-    repo_name, repo_url, last_updated = repo_info
+    repo_name = repo_info[0]
     logging.info(f"Processing repo: {repo_name}")
     
-    repo_results = []
+    metrics = metrics if metrics is not None else RepoMetrics(repo_name, options.fetch_mode, options.engine)
     fetch_date = datetime.utcnow().isoformat()
+    first_party = set()
+    parse = lambda batch: parse_files(batch, options.engine, options.sandbox, repo_name, metrics)
+    sampler = None
+    if options.sample_budget is not None:
+        # Files are parsed one at a time on this thread as they are read
+        sampler = AdaptiveSampler(options.sample_budget, parse, options.max_files, first_party)
+    files = fetch_repo_files(
+        repo_name,
+        max_files=options.max_files,
+        fetch_mode=options.fetch_mode,
+        cache=options.cache,
+        metrics=metrics,
+        mirrors=options.mirrors,
+        manifests=options.manifests,
+        import_parsing=options.import_parsing,
+        first_party=first_party,
+        notebooks=options.notebooks,
+        near_duplicates=options.near_duplicates,
+        sampler=sampler,
+        timeout=fetch_timeout(options.deadline, time.time())
+    )
+    if files is None:
+        cut_off = options.deadline is not None and time.time() >= options.deadline
+        metrics.status = "deadline" if cut_off else "fetch_failed"
+        return None
+    if metrics.duplicate_of is not None:
+        metrics.status = "near_duplicate"
+        return []
     
-    # Create a temporary directory for the cloned repo
-    with tempfile.TemporaryDirectory() as temp_dir:
-        try:
-            # Clone the repository with minimal depth
-            clone_cmd = f"git clone --depth 1 --single-branch https://github.com/{repo_name}.git {temp_dir}"
-            process = subprocess.run(
-                clone_cmd, 
-                shell=True, 
-                capture_output=True, 
-                text=True,
-                timeout=300  # 5 minute timeout for cloning
-            )
-            
-            if process.returncode != 0:
-                logging.error(f"Failed to clone repository: {process.stderr}")
-                return []
-            
-            # Find Python files in the repository (limit search time to 2 minutes)
-            search_start = time.time()
-            python_files = []
-            max_search_time = 120  # 2 minutes
-            
-            for root, _, files in os.walk(temp_dir):
-                # Check if we're exceeding our search time budget
-                if time.time() - search_start > max_search_time:
-                    logging.warning(f"Search time limit reached after finding {len(python_files)} Python files")
-                    break
-                    
-                for file in files:
-                    if file.endswith('.py'):
-                        relative_path = os.path.relpath(os.path.join(root, file), temp_dir)
-                        python_files.append(relative_path)
-                
-                # Limit the number of files to analyze
-                if len(python_files) >= max_files:
-                    python_files = python_files[:max_files]
-                    break
-            
-            # Process each Python file with a per-file timeout
-            for file_path in python_files:
-                try:
-                    # Skip files larger than 1MB to avoid processing huge files
-                    full_path = os.path.join(temp_dir, file_path)
-                    if os.path.getsize(full_path) > 1_000_000:
-                        logging.info(f"Skipping large file {file_path} ({os.path.getsize(full_path)/1_000_000:.2f} MB)")
-                        continue
-                        
-                    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                    
-                    # Extract non-standard library imports
-                    imports = extract_imports(content)
-                    
-                    # Only record non-empty results
-                    if imports:
-                        for library in imports:
-                            repo_results.append((
-                                library, 
-                                repo_name, 
-                                file_path, 
-                                fetch_date, 
-                                last_updated
-                            ))
-                except Exception as e:
-                    logging.warning(f"Error processing file {file_path} in {repo_name}: {e}")
-            
-            if repo_results:
-                logging.info(f"Found {len(repo_results)} non-standard library imports in {repo_name}")
-            else:
-                logging.info(f"No non-standard library imports found in {repo_name}")
-                
-            return repo_results
-        
-        except subprocess.TimeoutExpired:
-            logging.error(f"Timeout while processing {repo_name}")
-            return []
-        except Exception as e:
-            logging.error(f"Failed to analyze repo {repo_name}: {e}")
-            return []
+    if any(file.imports is None for file in files):
+        # Includes the wait for a free parser process
+        with metrics.stage("parse"):
+            files = parse(files)
+    metrics.record_parsed(files)
+    cache_file_imports(files, options.cache)
+    return build_results(repo_info, files, fetch_date, first_party)
+
+def load_unprocessed_repos(
 
-def process_repo_from_file(
     repo_file: str,
-    output_file: str = "imports.jsonl", 
     processed_file: str = "processed_repos.txt",
-    max_files: int = 10
-) -> bool:
+    limit: Optional[int] = None
+) -> List[Tuple[str, str, str]]:
     """
-    Process a single repository from a file containing repository information.
+    Load unprocessed repositories from a file containing repository information.
     
     Args:
         repo_file: Path to file containing repository information (JSONL)
-        output_file: Path to output file for imports
         processed_file: Path to file containing processed repository names
-        max_files: Maximum number of Python files to analyze per repository
+        limit: Maximum number of repositories to return
         
     Returns:
-        True if successful, False otherwise
+        List of tuples (repo_name, repo_url, last_updated)
     """
     # Load already processed repositories
     processed_repos = set()
@@ -171,23 +376,59 @@ def process_repo_from_file(
         with open(processed_file, 'r') as f:
             processed_repos = {line.strip() for line in f}
     
-    # Find next repository to process
-    next_repo = None
+    repos = []
+    seen = set()
+    if not os.path.exists(repo_file):
+        return repos
+    
     with open(repo_file, 'r') as f:
         for line in f:
+            if limit is not None and len(repos) >= limit:
+                break
             try:
                 repo_data = json.loads(line.strip())
                 repo_name = repo_data.get("repo_name")
                 
-                if repo_name and repo_name not in processed_repos:
-                    next_repo = (
+                if repo_name and repo_name not in processed_repos and repo_name not in seen:
+                    seen.add(repo_name)
+                    repos.append((
                         repo_name,
                         repo_data.get("repo_url", f"https://github.com/{repo_name}"),
                         repo_data.get("last_updated", datetime.utcnow().isoformat())
-                    )
-                    break
+                    ))
             except json.JSONDecodeError:
                 continue
+    return repos
+
+def mark_processed(processed_file: str, repo_name: str) -> None:
+    """Append a repository name to the processed file."""
+    with open(processed_file, 'a') as f:
+        f.write(f"{repo_name}\n")
+
+def process_repo_from_file(
+    repo_file: str,
+    options: AnalysisOptions,
+    output_file: str = "imports.jsonl", 
+    processed_file: str = "processed_repos.txt",
+    recorder: Optional[MetricsRecorder] = None
+) -> bool:
+    """
+    Process a single repository from a file containing repository information.
+    
+    Args:
+        repo_file: Path to file containing repository information (JSONL)
+        options: How to fetch and analyze the repository; a repository whose
+            fetch is cut off by options.deadline is left unprocessed
+        output_file: Path to output file for imports
+        processed_file: Path to file containing processed repository names
+        recorder: Optional MetricsRecorder the repository's metrics are added to
+        
+    Returns:
+        True if successful, False otherwise
+    """
+    # Find next repository to process
+    unprocessed = load_unprocessed_repos(repo_file, processed_file, limit=1)
+    next_repo = unprocessed[0] if unprocessed else None
     
     if not next_repo:
         logging.info("No unprocessed repositories found")
@@ -195,34 +436,175 @@ def process_repo_from_file(
     
     # Process the repository
     logging.info(f"Processing repository: {next_repo[0]}")
+    metrics = RepoMetrics(next_repo[0], options.fetch_mode, options.engine)
+    results = []
     try:
-        results = analyze_repo(next_repo, max_files)
+        results = analyze_repo(next_repo, options, metrics)
+        
+        if metrics.status == "deadline":
+            # Left unprocessed for the next run
+            logging.info(f"Run deadline reached while fetching {next_repo[0]}")
+            return False
         
         if results:
             # Save results
-            save_results(results, output_file)
+            with metrics.stage("save"):
+                save_results(results, output_file)
             logging.info(f"Found {len(results)} non-standard imported libraries in {next_repo[0]}")
+        elif results is not None:
+            logging.info(f"No non-standard library imports found in {next_repo[0]}")
         
         # Mark as processed
-        with open(processed_file, 'a') as f:
-            f.write(f"{next_repo[0]}\n")
+        mark_processed(processed_file, next_repo[0])
+        if options.near_duplicates is not None and results is not None:
+            options.near_duplicates.commit(next_repo[0])
         
         return True
     
     except Exception as e:
         logging.error(f"Error processing repository {next_repo[0]}: {e}")
+        metrics.status = "error"
+        return False
+    
+    finally:
+        metrics.finish(len(results or []))
+        if recorder is not None:
+            recorder.record(metrics)
+
+def process_repo_from_queue(
+    queue: RepoQueue,
+    options: AnalysisOptions,
+    output_file: str = "imports.jsonl",
+    processed_file: Optional[str] = None,
+    recorder: Optional[MetricsRecorder] = None
+) -> bool:
+    """
+    Lease and process a single repository from the work queue.
+    
+    Repositories that cannot be fetched are returned to the queue for a retry
+    instead of being marked processed.
+    
+    Args:
+        queue: Work queue to lease the repository from
+        options: How to fetch and analyze the repository; a repository whose
+            fetch is cut off by options.deadline is released without a failed attempt
+        output_file: Path to output file for imports
+        processed_file: Optional processed repositories file to append to on success
+        recorder: Optional MetricsRecorder the repository's metrics are added to
+        
+    Returns:
+        True if successful, False otherwise
+    """
+    leased = queue.lease(1)
+    if not leased:
+        logging.info("No unprocessed repositories found")
+        return False
+    
+    repo_info = leased[0]
+    repo_name = repo_info[0]
+    logging.info(f"Processing repository: {repo_name}")
+    metrics = RepoMetrics(repo_name, options.fetch_mode, options.engine)
+    results = []
+    try:
+        results = analyze_repo(repo_info, options, metrics)
+        if metrics.status == "deadline":
+            # Cut off by the run deadline: back to the queue without a failed attempt
+            queue.release(repo_name)
+            return False
+        if results is None:
+            state = queue.fail(repo_name, "fetch failed")
+            logging.warning(f"Could not fetch {repo_name}, repository is now {state}")
+            return False
+        if not queue.renew(repo_name):
+            # Another worker took the repository over; its results are theirs to save
+            logging.warning(f"Lease on {repo_name} was lost, dropping its results")
+            metrics.status = "lease_lost"
+            results = []
+            return False
+        
+        if results:
+            with metrics.stage("save"):
+                save_results(results, output_file)
+            logging.info(f"Found {len(results)} non-standard imported libraries in {repo_name}")
+        
+        queue.complete(repo_name)
+        if processed_file:
+            mark_processed(processed_file, repo_name)
+        if options.near_duplicates is not None:
+            options.near_duplicates.commit(repo_name)
+        return True
+    
+    except Exception as e:
+        logging.error(f"Error processing repository {repo_name}: {e}")
+        metrics.status = "error"
+        queue.fail(repo_name, str(e))
         return False
+    
+    finally:
+        metrics.finish(len(results or []))
+        if recorder is not None:
+            recorder.record(metrics)
 
 if __name__ == "__main__":
+
     parser = argparse.ArgumentParser(description="Analyze Python imports in repositories")
     parser.add_argument("--repos", type=str, default="repos.jsonl", help="Repository information file")
     parser.add_argument("--output", type=str, default="imports.jsonl", help="Output file for imports")
     parser.add_argument("--processed", type=str, default="processed_repos.txt", help="File to track processed repositories")
     parser.add_argument("--max-files", type=int, default=10, help="Maximum number of Python files to analyze per repository")
     parser.add_argument("--count", type=int, default=1, help="Number of repositories to process in this run")
+    parser.add_argument("--fetch-mode", type=str, default="clone", choices=FETCH_MODES, help="How to fetch repository contents")
+    parser.add_argument("--import-cache", type=str, default=None, help="SQLite cache of imports keyed by blob SHA")
+    parser.add_argument("--engine", type=str, default="ast", choices=ENGINES, help="Import extraction engine")
+    parser.add_argument("--mirror-cache", type=str, default=None, help="Directory of persistent bare mirrors for re-analysis")
+    parser.add_argument("--mirror-cache-gb", type=float, default=20, help="Disk size of the mirror cache before LRU eviction")
+    parser.add_argument("--metrics-file", type=str, default=None, help="JSONL file for per-repository metrics")
+    parser.add_argument("--metrics-prom", type=str, default=None, help="Prometheus textfile for run metrics")
+    parser.add_argument("--parse-timeout", type=float, default=30, help="Wall-clock seconds allowed per parsed file")
+    parser.add_argument("--parse-cpu-limit", type=int, default=10, help="CPU seconds allowed per parsed file")
+    parser.add_argument("--parse-memory-limit", type=int, default=2048, help="Address space limit of a parser process in MB")
+    parser.add_argument("--no-sandbox", action="store_true", help="Parse files in this process without limits")
+    parser.add_argument("--manifests", action="store_true", help="Also record dependencies declared in manifest files")
+    parser.add_argument("--import-parsing", type=str, default="always", choices=IMPORT_PARSING,
+                        help="Parse Python files always, only for repositories without manifests, or never")
+    parser.add_argument("--notebooks", action="store_true", help="Also extract imports from Jupyter notebook code cells")
+    parser.add_argument("--dedup-index", type=str, default=None, help="SQLite MinHash index to skip near-duplicate repositories with")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8, help="Estimated file similarity of a near-duplicate")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Sample files until imports saturate or the budget is spent, up to --max-files")
+    parser.add_argument("--sample-bytes", type=int, default=2_000_000, help="Bytes read per repository when sampling adaptively")
+    parser.add_argument("--sample-seconds", type=float, default=30.0, help="Seconds spent reading and parsing per repository when sampling adaptively")
+    parser.add_argument("--sample-patience", type=int, default=5, help="Files in a row without a new library before sampling stops")
     
     args = parser.parse_args()
     
+    # parse_sandbox imports this module, so it can only be imported here
+    import parse_sandbox
+    
+    if args.mirror_cache and not args.import_cache:
+        # Unchanged blobs of re-analyzed repositories are answered by the import cache
+        args.import_cache = os.path.join(args.mirror_cache, "imports.db")
+    cache = open_import_cache(args.import_cache, args.engine)
+    mirrors = open_mirror_cache(args.mirror_cache, args.mirror_cache_gb)
+    near_duplicates = open_near_duplicate_index(args.dedup_index, args.dedup_threshold)
+    sample_budget = SampleBudget(args.sample_bytes, args.sample_seconds, args.sample_patience) if args.adaptive else None
+    recorder = MetricsRecorder(args.metrics_file, args.metrics_prom) if args.metrics_file or args.metrics_prom else None
+    sandbox = None
+    if not args.no_sandbox:
+        sandbox = parse_sandbox.ParseSandbox(None, args.parse_cpu_limit, args.parse_memory_limit, args.parse_timeout)
+    options = AnalysisOptions(
+        max_files=args.max_files,
+        fetch_mode=args.fetch_mode,
+        cache=cache,
+        engine=args.engine,
+        sandbox=sandbox,
+        mirrors=mirrors,
+        manifests=args.manifests,
+        import_parsing=args.import_parsing,
+        notebooks=args.notebooks,
+        near_duplicates=near_duplicates,
+        sample_budget=sample_budget
+    )
     start_time = time.time()
     successful = 0
     
@@ -234,9 +616,10 @@ if __name__ == "__main__":
         
         if process_repo_from_file(
             repo_file=args.repos,
+            options=options,
             output_file=args.output,
             processed_file=args.processed,
-            max_files=args.max_files
+            recorder=recorder
         ):
             successful += 1
         
@@ -245,4 +628,17 @@ if __name__ == "__main__":
     
     elapsed_time = time.time() - start_time
     logging.info(f"Processed {successful}/{args.count} repositories in {elapsed_time:.2f} seconds")
+    if cache is not None:
+        logging.info(f"Import cache: {cache.stats()}")
+    if mirrors is not None:
+        logging.info(f"Mirror cache: {mirrors.stats()}")
+    if near_duplicates is not None:
+        logging.info(f"Near-duplicate index: {near_duplicates.stats()}")
+    sandbox_report = None
+    if sandbox is not None:
+        sandbox.close()
+        sandbox_report = sandbox.report()
+        logging.info(f"Parse sandbox: {sandbox_report['files_parsed']} files parsed, killed {sandbox_report['killed']}")
+    if recorder is not None:
+        recorder.write_summary(elapsed_seconds=round(elapsed_time, 3), sandbox=sandbox_report)
     print(f"Processed {successful} repositories. Results saved to {args.output}")
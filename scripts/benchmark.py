@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Hot Path Benchmarks
+
+Reproducible benchmarks for the import extraction, repository fetching,
+result writing and aggregation steps. All inputs are generated from a fixed
+seed: synthetic Python corpora (small, huge, syntax-error and deeply nested
+files), local git repositories of different shapes served over file://, and
+a synthetic multi-million-row imports.jsonl.
+
+Each benchmark runs in a fresh process so its peak RSS can be measured, and
+reports throughput, latency percentiles and peak RSS. Results can be saved
+as a baseline and later runs compared against it.
+
+Usage:
+    python benchmark.py --output bench.json --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json --only extract,count
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from typing import Callable, Dict, List, Tuple
+
+BENCHMARKS = ("extract", "fetch", "save", "count")
+
+LIBRARIES = ["numpy", "pandas", "requests", "django", "flask", "torch", "matplotlib", "scipy",
+             "yaml", "click", "tqdm", "sqlalchemy", "boto3", "pytest", "cv2", "sklearn"]
+
+# Corpus generation
+
+def _import_block(rng: random.Random, count: int) -> List[str]:
+    lines = []
+    for _ in range(count):
+        library = rng.choice(LIBRARIES)
+        if rng.random() < 0.5:
+            lines.append(f"import {library}")
+        else:
+            lines.append(f"from {library}.sub import name_{rng.randint(0, 99)}")
+    return lines
+
+def _function(rng: random.Random, index: int) -> List[str]:
+    return [
+        f"def function_{index}(a, b=None):",
+        f'    """Docstring mentioning import {rng.choice(LIBRARIES)} in prose."""',
+        f"    value = {{'key': a, 'other': [b, {index}]}}  # import os in a comment",
+        "    for item in range(10):",
+        "        value['key'] = item * 2 if item % 3 else 'text: import nothing'",
+        "    return value",
+        ""
+    ]
+
+def make_small_file(rng: random.Random) -> str:
+    """A typical module: a few imports and functions."""
+    lines = _import_block(rng, 6)
+    for index in range(8):
+        lines.extend(_function(rng, index))
+    return "\n".join(lines) + "\n"
+
+def make_huge_file(rng: random.Random, target_bytes: int = 900_000) -> str:
+    """A generated-looking module close to the 1MB read limit."""
+    lines = _import_block(rng, 20)
+    size, index = 0, 0
+    while size < target_bytes:
+        block = _function(rng, index)
+        lines.extend(block)
+        size += sum(len(line) + 1 for line in block)
+        index += 1
+    return "\n".join(lines) + "\n"
+
+def make_syntax_error_file(rng: random.Random) -> str:
+    """A Python 2 module, which fails ast.parse."""
+    lines = ["#!/usr/bin/env python", 'print "starting"']
+    lines.extend(_import_block(rng, 6))
+    lines.extend(["try:", "    import simplejson as json", "except ImportError, e:", "    print e"])
+    for index in range(8):
+        lines.extend(_function(rng, index))
+    return "\n".join(lines) + "\n"
+
+def make_nested_file(rng: random.Random, depth: int = 60) -> str:
+    """Deeply nested blocks with imports at every level."""
+    lines = []
+    for level in range(depth):
+        indent = "    " * level
+        lines.append(f"{indent}import {rng.choice(LIBRARIES)}")
+        lines.append(f"{indent}if condition_{level}:")
+    lines.append("    " * depth + "pass")
+    return "\n".join(lines) + "\n"
+
+def make_corpora(seed: int) -> Dict[str, List[str]]:
+    """Generate the named Python corpora used by the extract benchmark."""
+    rng = random.Random(seed)
+    return {
+        "small": [make_small_file(rng) for _ in range(300)],
+        "huge": [make_huge_file(rng) for _ in range(3)],
+        "syntax_error": [make_syntax_error_file(rng) for _ in range(300)],
+        "nested": [make_nested_file(rng) for _ in range(100)],
+    }
+
+def _git(repo_dir: str, *args: str) -> None:
+    subprocess.run(["git", *args], cwd=repo_dir, check=True, capture_output=True)
+
+def make_git_repo(base_dir: str, name: str, rng: random.Random, py_files: int,
+                  depth: int, binary_bytes: int) -> str:
+    """
+    Create a bare repository under base_dir/bench/<name>.git.
+
+    Args:
+        base_dir: Directory served as GIT_BASE_URL
+        name: Repository name
+        rng: Random source
+        py_files: Number of Python files
+        depth: Directory nesting depth of the Python files
+        binary_bytes: Size of a non-Python data blob to include
+
+    Returns:
+        Repository name as owner/repo
+    """
+    work_dir = os.path.join(base_dir, "work", name)
+    os.makedirs(work_dir)
+    _git(work_dir, "init", "-q")
+    for index in range(py_files):
+        sub_dir = os.path.join(work_dir, *[f"level{level}" for level in range(index % (depth + 1))])
+        os.makedirs(sub_dir, exist_ok=True)
+        with open(os.path.join(sub_dir, f"module_{index}.py"), "w") as f:
+            f.write(make_small_file(rng))
+    if binary_bytes:
+        os.makedirs(os.path.join(work_dir, "data"), exist_ok=True)
+        with open(os.path.join(work_dir, "data", "blob.bin"), "wb") as f:
+            f.write(rng.randbytes(binary_bytes))
+    _git(work_dir, "add", "-A")
+    _git(work_dir, "-c", "user.name=bench", "-c", "user.email=bench@example.com", "commit", "-qm", "bench")
+
+    bare_dir = os.path.join(base_dir, "bench", f"{name}.git")
+    subprocess.run(["git", "clone", "-q", "--bare", work_dir, bare_dir], check=True, capture_output=True)
+    # Let partial clones filter and fetch individual blobs, as GitHub does
+    _git(bare_dir, "config", "uploadpack.allowFilter", "true")
+    _git(bare_dir, "config", "uploadpack.allowAnySHA1InWant", "true")
+    return f"bench/{name}"
+
+def make_git_repos(base_dir: str, seed: int) -> List[str]:
+    """Generate local repositories of varying shapes."""
+    rng = random.Random(seed)
+    shapes = [
+        ("flat", 200, 0, 0),
+        ("deep", 200, 12, 0),
+        ("data_heavy", 20, 2, 20_000_000),
+        ("tiny", 3, 0, 0),
+    ]
+    return [make_git_repo(base_dir, name, rng, *shape) for name, *shape in shapes]
+
+def make_imports_file(path: str, rows: int, seed: int) -> None:
+    """Write a synthetic imports.jsonl with a long-tailed library distribution."""
+    rng = random.Random(seed)
+    tail = [f"lib_{index}" for index in range(20_000)]
+    with open(path, "w") as f:
+        for index in range(rows):
+            library = rng.choice(LIBRARIES) if rng.random() < 0.6 else rng.choice(tail)
+            repo = f"owner{index // 40}/repo{index // 40}"
+            f.write(json.dumps({
+                "library": library,
+                "repo": repo,
+                "file_path": f"pkg/module_{index % 40}.py",
+                "fetch_date": "2025-01-01T00:00:00",
+                "last_updated": "2024-12-31T00:00:00Z"
+            }) + "\n")
+
+# Measurement
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def summarize(name: str, unit: str, items: int, seconds: float, latencies: List[float]) -> Dict:
+    """Build a result record; latencies are in seconds, reported in milliseconds."""
+    return {
+        "name": name,
+        "unit": unit,
+        "items": items,
+        "seconds": round(seconds, 4),
+        "throughput": round(items / seconds, 2) if seconds > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+def bench_extract(work_dir: str, seed: int, repeat: int, **_) -> List[Dict]:
+    from analyze_imports import extract_imports, ENGINES
+
+    results = []
+    for corpus_name, files in make_corpora(seed).items():
+        for engine in ENGINES:
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for content in files:
+                    file_start = time.perf_counter()
+                    extract_imports(content, engine)
+                    latencies.append(time.perf_counter() - file_start)
+            elapsed = time.perf_counter() - start
+            results.append(summarize(f"extract/{corpus_name}/{engine}", "files/s", len(latencies), elapsed, latencies))
+    return results
+
+def bench_fetch(work_dir: str, seed: int, repeat: int, **_) -> List[Dict]:
+    import git_fetch
+    from analyze_imports import fetch_repo_files, FETCH_MODES
+
+    git_fetch.GIT_BASE_URL = "file://" + work_dir
+    repos = make_git_repos(work_dir, seed)
+
+    results = []
+    for fetch_mode in FETCH_MODES:
+        for repo_name in repos:
+            latencies = []
+            files = 0
+            start = time.perf_counter()
+            for _ in range(repeat):
+                repo_start = time.perf_counter()
+                fetched = fetch_repo_files(repo_name, max_files=10, fetch_mode=fetch_mode) or []
+                latencies.append(time.perf_counter() - repo_start)
+                files += len(fetched)
+            elapsed = time.perf_counter() - start
+            result = summarize(f"fetch/{repo_name.split('/')[1]}/{fetch_mode}", "files/s", files, elapsed, latencies)
+            result["repos_per_s"] = round(repeat / elapsed, 2) if elapsed > 0 else 0.0
+            results.append(result)
+    return results
+
+def bench_save(work_dir: str, seed: int, repeat: int, rows: int, **_) -> List[Dict]:
+    from github_utils import save_results
+
+    rng = random.Random(seed)
+    batch = 40
+    batches = max(1, min(rows, 200_000) // batch)
+    output_file = os.path.join(work_dir, "save_bench.jsonl")
+    results_batches = [
+        [(rng.choice(LIBRARIES), f"owner{index}/repo{index}", f"pkg/module_{row}.py",
+          "2025-01-01T00:00:00", "2024-12-31T00:00:00Z", "import") for row in range(batch)]
+        for index in range(batches)
+    ]
+
+    results = []
+    for storage in ("jsonl", "columnar"):
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            for batch_results in results_batches:
+                batch_start = time.perf_counter()
+                save_results(batch_results, output_file, storage=storage)
+                latencies.append(time.perf_counter() - batch_start)
+        elapsed = time.perf_counter() - start
+        result = summarize(f"save/{storage}", "rows/s", batches * batch * repeat, elapsed, latencies)
+        result["file_mb"] = round(os.path.getsize(output_file) / 1_000_000, 2)
+        results.append(result)
+    return results
+
+def bench_count(work_dir: str, seed: int, repeat: int, rows: int, **_) -> List[Dict]:
+    from contextlib import redirect_stdout
+    from count_libs import count_libraries
+    from import_store import convert_jsonl
+
+    jsonl_file = os.path.join(work_dir, "imports_bench.jsonl")
+    make_imports_file(jsonl_file, rows, seed)
+    columnar_file = os.path.join(work_dir, "imports_bench.seg")
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        convert_jsonl(jsonl_file, columnar_file)
+    output_file = os.path.join(work_dir, "counts_bench.csv")
+
+    results = []
+    for storage, input_file in (("jsonl", jsonl_file), ("columnar", columnar_file)):
+        latencies = []
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            for _ in range(repeat):
+                run_start = time.perf_counter()
+                count_libraries(input_file, output_file)
+                latencies.append(time.perf_counter() - run_start)
+        result = summarize(f"count/{storage}", "rows/s", rows * repeat, sum(latencies), latencies)
+        result["file_mb"] = round(os.path.getsize(input_file) / 1_000_000, 2)
+        results.append(result)
+    return results
+
+BENCHMARK_FUNCTIONS: Dict[str, Callable[..., List[Dict]]] = {
+    "extract": bench_extract,
+    "fetch": bench_fetch,
+    "save": bench_save,
+    "count": bench_count,
+}
+
+def _run_child(name: str, kwargs: Dict, conn) -> None:
+    # Silence per-repo logging from the code under test
+    import logging
+    logging.disable(logging.WARNING)
+    try:
+        results = BENCHMARK_FUNCTIONS[name](**kwargs)
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        for result in results:
+            result["peak_rss_mb"] = round(peak_rss_mb, 1)
+        conn.send(results)
+    except Exception as e:
+        conn.send(e)
+    finally:
+        conn.close()
+
+def run_benchmark(name: str, **kwargs) -> List[Dict]:
+    """Run one benchmark group in a fresh process and return its results."""
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_run_child, args=(name, kwargs, child_conn))
+    process.start()
+    child_conn.close()
+    results = parent_conn.recv()
+    process.join()
+    if isinstance(results, Exception):
+        raise results
+    return results
+
+# Reporting
+
+def compare_to_baseline(results: List[Dict], baseline: List[Dict], threshold: float) -> List[Tuple[str, float]]:
+    """
+    Print the throughput change of each benchmark against a baseline.
+
+    Returns:
+        List of (name, change) for benchmarks slower than the threshold
+    """
+    previous = {result["name"]: result for result in baseline}
+    regressions = []
+    print(f"\n{'benchmark':40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for result in results:
+        old = previous.get(result["name"])
+        if not old or not old["throughput"]:
+            print(f"{result['name']:40} {'-':>12} {result['throughput']:>12} {'new':>8}")
+            continue
+        change = result["throughput"] / old["throughput"] - 1
+        flag = "  REGRESSION" if change < -threshold else ""
+        print(f"{result['name']:40} {old['throughput']:>12} {result['throughput']:>12} {change:>+8.1%}{flag}")
+        if change < -threshold:
+            regressions.append((result["name"], change))
+    return regressions
+
+def print_results(results: List[Dict]) -> None:
+    print(f"{'benchmark':40} {'throughput':>14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}")
+    for result in results:
+        throughput = f"{result['throughput']} {result['unit']}"
+        print(f"{result['name']:40} {throughput:>14} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+              f"{result['p99_ms']:>9} {result['peak_rss_mb']:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark extraction, fetching, writing and aggregation")
+    parser.add_argument("--only", type=str, default=",".join(BENCHMARKS),
+                        help=f"Comma-separated benchmarks to run ({', '.join(BENCHMARKS)})")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for generated inputs")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per benchmark")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Rows in the synthetic imports.jsonl")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare against a saved baseline")
+    parser.add_argument("--save-baseline", type=str, default=None, help="Save results as a new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Throughput drop (fraction) reported as a regression")
+
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Make the scripts importable from the spawned benchmark processes
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [sys.path[0], os.environ.get("PYTHONPATH")]))
+
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        results = []
+        for name in selected:
+            print(f"Running {name} benchmarks...", flush=True)
+            results.extend(run_benchmark(name, work_dir=work_dir, seed=args.seed,
+                                         repeat=args.repeat, rows=args.rows))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "rows": args.rows,
+        "results": results,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f)["results"], args.threshold)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Import Extractor Comparison
+
+Differential check between the AST and streaming scanner import extractors.
+Every Python file under the given paths is run through both engines; files
+that parse as valid Python must produce identical import sets, and any
+mismatch is reported. Total extraction time per engine is printed as well.
+
+Usage:
+    python compare_extractors.py /path/to/checkout [/another/path ...]
+"""
+import os
+import ast
+import sys
+import time
+import argparse
+from typing import Iterator, List
+
+from analyze_imports import extract_imports, ENGINES
+
+def iter_python_files(paths: List[str]) -> Iterator[str]:
+    """Yield Python files under the given files or directories."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, _, files in os.walk(path):
+            for file in files:
+                if file.endswith('.py'):
+                    yield os.path.join(root, file)
+
+def compare(paths: List[str], show: int = 20) -> int:
+    """
+    Compare the extraction engines on every Python file under paths.
+
+    Args:
+        paths: Files or directories to scan
+        show: Maximum number of mismatches to print
+
+    Returns:
+        Number of valid files where the engines disagree
+    """
+    timings = {engine: 0.0 for engine in ENGINES}
+    valid = invalid = mismatches = 0
+
+    for file_path in iter_python_files(paths):
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+
+        results = {}
+        for engine in ENGINES:
+            start = time.perf_counter()
+            results[engine] = extract_imports(content, engine)
+            timings[engine] += time.perf_counter() - start
+
+        try:
+            ast.parse(content)
+        except (SyntaxError, ValueError):
+            invalid += 1
+            continue
+        valid += 1
+
+        if results["ast"] != results["scan"]:
+            mismatches += 1
+            if mismatches <= show:
+                print(f"Mismatch in {file_path}")
+                print(f"  ast only:  {sorted(results['ast'] - results['scan'])}")
+                print(f"  scan only: {sorted(results['scan'] - results['ast'])}")
+
+    print(f"Compared {valid} valid files ({invalid} with syntax errors): {mismatches} mismatches")
+    for engine, seconds in timings.items():
+        print(f"  {engine}: {seconds:.3f} seconds")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare import extraction engines")
+    parser.add_argument("paths", nargs="+", help="Python files or directories to scan")
+    parser.add_argument("--show", type=int, default=20, help="Maximum number of mismatches to print")
+
+    args = parser.parse_args()
+
+    sys.exit(1 if compare(args.paths, args.show) else 0)
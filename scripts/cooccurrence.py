@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Library Co-occurrence Index
+
+Keeps a persistent SQLite index of which libraries are used together in the
+same repository. For every repository the set of libraries it imports is
+stored once, along with the number of repositories using each library and
+each pair of libraries. Pairs are stored in both directions, so the
+libraries used with X are one primary-key range scan.
+
+The index is updated incrementally: it remembers the byte offset of the
+imports file it has consumed (like count_libs --state) and only reads the
+records appended since. Records of a repository that is already indexed
+only add the libraries it did not have before.
+
+Usage:
+    python cooccurrence.py update data/imports.jsonl --db data/cooccurrence.db
+    python cooccurrence.py top torch --db data/cooccurrence.db --by lift -k 20
+    python cooccurrence.py pair flask sqlalchemy --db data/cooccurrence.db
+"""
+import os
+import sqlite3
+import argparse
+from itertools import combinations
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from count_libs import file_fingerprint, iter_repo_library_batches
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS repo_libraries (
+    repo TEXT NOT NULL,
+    library TEXT NOT NULL,
+    PRIMARY KEY (repo, library)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS libraries (
+    library TEXT PRIMARY KEY,
+    repos INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pairs (
+    library TEXT NOT NULL,
+    other TEXT NOT NULL,
+    repos INTEGER NOT NULL,
+    PRIMARY KEY (library, other)
+) WITHOUT ROWID;
+"""
+
+# Orderings accepted by CooccurrenceIndex.top
+RANKINGS = ("count", "lift", "jaccard")
+
+def iter_new_records(input_file: str, offset: int) -> Iterator[Tuple[List[Tuple[str, str]], int]]:
+    """
+    Yield batches of (repo, library) records appended after offset.
+
+    JSON Lines input stops before a trailing partial line, and columnar input
+    before an incomplete segment, so they are read on the next update.
+
+    Returns:
+        Iterator of tuples (records, offset after the batch)
+    """
+    with open(input_file, 'rb') as f:
+        yield from iter_repo_library_batches(f, offset, complete_lines=True)
+
+class CooccurrenceIndex:
+    """Repository-level library co-occurrence counts in SQLite."""
+
+    def __init__(self, db_path: str):
+        """
+        Open (and create if needed) an index database.
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def clear(self) -> None:
+        """Remove all indexed data."""
+        self.conn.execute("BEGIN")
+        for table in ("meta", "repo_libraries", "libraries", "pairs"):
+            self.conn.execute(f"DELETE FROM {table}")
+        self.conn.execute("COMMIT")
+
+    @property
+    def total_repos(self) -> int:
+        """Number of indexed repositories."""
+        return int(self._meta("total_repos", "0"))
+
+    def add_repo_libraries(self, records: Iterable[Tuple[str, str]]) -> int:
+        """
+        Add (repo, library) records to the index in one transaction.
+
+        Returns:
+            Number of repositories new to the index
+        """
+        grouped: Dict[str, Set[str]] = {}
+        for repo, library in records:
+            grouped.setdefault(repo, set()).add(library)
+
+        library_deltas: Dict[str, int] = {}
+        pair_deltas: Dict[Tuple[str, str], int] = {}
+        new_repos = 0
+        self.conn.execute("BEGIN")
+        try:
+            for repo, libraries in grouped.items():
+                existing = {row[0] for row in self.conn.execute(
+                    "SELECT library FROM repo_libraries WHERE repo = ?", (repo,)
+                )}
+                added = sorted(libraries - existing)
+                if not added:
+                    continue
+                if not existing:
+                    new_repos += 1
+                self.conn.executemany(
+                    "INSERT INTO repo_libraries (repo, library) VALUES (?, ?)",
+                    [(repo, library) for library in added]
+                )
+                for library in added:
+                    library_deltas[library] = library_deltas.get(library, 0) + 1
+                    for other in existing:
+                        pair_deltas[(library, other)] = pair_deltas.get((library, other), 0) + 1
+                        pair_deltas[(other, library)] = pair_deltas.get((other, library), 0) + 1
+                for library, other in combinations(added, 2):
+                    pair_deltas[(library, other)] = pair_deltas.get((library, other), 0) + 1
+                    pair_deltas[(other, library)] = pair_deltas.get((other, library), 0) + 1
+
+            self.conn.executemany(
+                "INSERT INTO libraries (library, repos) VALUES (?, ?) "
+                "ON CONFLICT(library) DO UPDATE SET repos = repos + excluded.repos",
+                library_deltas.items()
+            )
+            self.conn.executemany(
+                "INSERT INTO pairs (library, other, repos) VALUES (?, ?, ?) "
+                "ON CONFLICT(library, other) DO UPDATE SET repos = repos + excluded.repos",
+                ((library, other, count) for (library, other), count in pair_deltas.items())
+            )
+            self._set_meta("total_repos", self.total_repos + new_repos)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return new_repos
+
+    def update(self, input_file: str) -> int:
+        """
+        Index the records appended to an imports file since the last update.
+
+        A truncated or rewritten input file is re-indexed from the start.
+
+        Returns:
+            Number of repositories new to the index
+        """
+        offset = int(self._meta("offset", "0"))
+        with open(input_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if offset and (offset > size or file_fingerprint(f, offset) != self._meta("fingerprint")):
+                print("Input file was truncated or rewritten, rebuilding index")
+                self.clear()
+                offset = 0
+
+        new_repos = 0
+        for records, end in iter_new_records(input_file, offset):
+            new_repos += self.add_repo_libraries(records)
+            with open(input_file, 'rb') as f:
+                fingerprint = file_fingerprint(f, end)
+            self.conn.execute("BEGIN")
+            self._set_meta("offset", end)
+            self._set_meta("fingerprint", fingerprint)
+            self.conn.execute("COMMIT")
+        return new_repos
+
+    def library_repos(self, library: str) -> int:
+        """Number of repositories using a library."""
+        row = self.conn.execute("SELECT repos FROM libraries WHERE library = ?", (library,)).fetchone()
+        return row[0] if row else 0
+
+    def _stats(self, library: str, other: str, both: int, repos_a: int, repos_b: int) -> Dict:
+        total = self.total_repos
+        return {
+            "library": library,
+            "other": other,
+            "repos": both,
+            "confidence": both / repos_a if repos_a else 0.0,
+            "lift": both * total / (repos_a * repos_b) if repos_a and repos_b else 0.0,
+            "jaccard": both / (repos_a + repos_b - both) if repos_a + repos_b - both else 0.0
+        }
+
+    def pair(self, library: str, other: str) -> Dict:
+        """
+        Co-occurrence statistics of two libraries.
+
+        Returns:
+            Dictionary with the number of repositories using both, the fraction
+            of library's repositories also using other (confidence), lift and Jaccard similarity
+        """
+        row = self.conn.execute(
+            "SELECT repos FROM pairs WHERE library = ? AND other = ?", (library, other)
+        ).fetchone()
+        return self._stats(library, other, row[0] if row else 0,
+                           self.library_repos(library), self.library_repos(other))
+
+    def top(self, library: str, k: int = 10, by: str = "count", min_repos: int = 1) -> List[Dict]:
+        """
+        Libraries most often used together with a library.
+
+        Args:
+            library: Library to query
+            k: Number of results
+            by: Ranking, one of RANKINGS
+            min_repos: Minimum number of shared repositories (filters noisy lift values)
+
+        Returns:
+            List of statistics dictionaries as returned by pair()
+        """
+        repos_a = self.library_repos(library)
+        rows = self.conn.execute(
+            "SELECT p.other, p.repos, l.repos FROM pairs p JOIN libraries l ON l.library = p.other "
+            "WHERE p.library = ? AND p.repos >= ?",
+            (library, min_repos)
+        ).fetchall()
+        results = [self._stats(library, other, both, repos_a, repos_b) for other, both, repos_b in rows]
+        key = "repos" if by == "count" else by
+        results.sort(key=lambda result: (-result[key], result["other"]))
+        return results[:k]
+
+def print_results(results: List[Dict]) -> None:
+    """Print co-occurrence statistics as a table."""
+    print(f"{'library':<30} {'repos':>7} {'conf':>7} {'lift':>8} {'jaccard':>8}")
+    for result in results:
+        print(f"{result['other']:<30} {result['repos']:>7} {result['confidence']:>7.3f} "
+              f"{result['lift']:>8.2f} {result['jaccard']:>8.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Library co-occurrence index")
+    parser.add_argument("--db", default="cooccurrence.db", help="Path to the index database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = subparsers.add_parser("update", help="Index records appended to an imports file")
+    update_parser.add_argument("input_file", help="Path to the imports JSON Lines or columnar file")
+
+    top_parser = subparsers.add_parser("top", help="Libraries most often used with a library")
+    top_parser.add_argument("library", help="Library to query")
+    top_parser.add_argument("-k", type=int, default=10, help="Number of results")
+    top_parser.add_argument("--by", choices=RANKINGS, default="count", help="Ranking")
+    top_parser.add_argument("--min-repos", type=int, default=5, help="Minimum number of shared repositories")
+
+    pair_parser = subparsers.add_parser("pair", help="Co-occurrence statistics of two libraries")
+    pair_parser.add_argument("library", help="First library")
+    pair_parser.add_argument("other", help="Second library")
+
+    args = parser.parse_args()
+
+    index = CooccurrenceIndex(args.db)
+    try:
+        if args.command == "update":
+            new_repos = index.update(args.input_file)
+            print(f"Indexed {new_repos} new repositories ({index.total_repos} total)")
+        elif args.command == "top":
+            print_results(index.top(args.library, args.k, args.by, args.min_repos))
+        else:
+            print_results([index.pair(args.library, args.other)])
+    finally:
+        index.close()
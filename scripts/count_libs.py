@@ -3,39 +3,62 @@
 Library Import Counter
 
 This script processes a JSON Lines file with GitHub repository import data
-and produces a CSV file with library name and occurrence counts.
+and produces a CSV file with library name and occurrence counts. Columnar
+files written by import_store are detected and counted from their library
+column without decoding JSON.
+
+With --state, counts are kept in a checkpoint file together with the byte
+offset already consumed, so later runs only read the lines appended since.
+
+With --mode repos, each library is counted once per repository using
+fixed-memory mergeable sketches (see sketches.py) instead of an exact
+Counter of rows; --sketch keeps the sketch on disk so runs and shards can
+be resumed or merged.
+
+Only rows whose library comes from an import statement are counted by
+default; --source selects dependencies declared in manifests instead, or
+both (see manifests.py).
 """
+import os
 import json
 import csv
+import hashlib
 import argparse
 from collections import Counter
 
-def count_libraries(input_file, output_file):
+from import_store import MAGIC, IMPORT_SOURCE, SOURCES, count_column, iter_segment_records, record_source
+
+# Aggregation modes: rows counts import rows, repos counts distinct repositories via sketches
+MODES = ("rows", "repos")
+
+# Record sources selectable with --source
+SOURCE_CHOICES = SOURCES + ("all",)
+
+# Number of bytes hashed at the start and just before the checkpoint offset
+# to detect a truncated or rewritten input file
+FINGERPRINT_BYTES = 4096
+
+def count_line(line, library_counter, sources=None):
     """
-    Count library occurrences from JSON Lines input file and write results to CSV.
+    Add the library from one JSON line to a counter.
     
     Args:
-        input_file (str): Path to input JSON Lines file
-        output_file (str): Path to output CSV file
+        line (bytes): JSON line
+        library_counter (Counter): Counter to update
+        sources (tuple): Only count records with one of these sources (all if None)
     """
-    # Initialize counter for libraries
-    library_counter = Counter()
-    
-    # Read and process the input file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                # Parse each JSON line
-                data = json.loads(line.strip())
-                
-                # Extract and count the library
-                if 'library' in data:
-                    library_counter[data['library']] += 1
-            except json.JSONDecodeError:
-                print(f"Warning: Skipping invalid JSON line: {line[:50]}...")
-                continue
-    
-    # Write the results to CSV
+    try:
+        # Parse the JSON line
+        data = json.loads(line)
+        
+        # Extract and count the library
+        if 'library' in data and (sources is None or record_source(data) in sources):
+            library_counter[data['library']] += 1
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        print(f"Warning: Skipping invalid JSON line: {line[:50].decode('utf-8', errors='replace')}...")
+
+def write_counts(library_counter, output_file):
+    """Write library counts to CSV, sorted by count in descending order."""
     with open(output_file, 'w', encoding='utf-8', newline='') as f:
         writer = csv.writer(f)
         # Write header
@@ -44,16 +67,212 @@ def count_libraries(input_file, output_file):
         # Write data rows (sorted by count in descending order)
         for library, count in library_counter.most_common():
             writer.writerow([library, count])
+
+def file_fingerprint(f, offset):
+    """
+    Hash the first bytes of the file and the bytes just before offset.
+    
+    Args:
+        f: Input file opened in binary mode
+        offset (int): Byte offset already consumed
+    
+    Returns:
+        str: Hex digest identifying the consumed prefix of the file
+    """
+    digest = hashlib.sha256()
+    f.seek(0)
+    digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+    tail_start = max(0, offset - FINGERPRINT_BYTES)
+    f.seek(tail_start)
+    digest.update(f.read(offset - tail_start))
+    return digest.hexdigest()
+
+def load_state(state_file):
+    """Load a checkpoint, returning None if it is missing or unreadable."""
+    if not state_file or not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        print(f"Warning: Ignoring unreadable state file {state_file}")
+        return None
+
+def save_state(state_file, state):
+    """Atomically write a checkpoint."""
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+def iter_repo_library_batches(f, offset, complete_lines, batch_size=100_000, sources=(IMPORT_SOURCE,)):
+    """
+    Yield batches of (repo, library) records from a byte offset.
+    
+    Args:
+        f: Input file opened in binary mode
+        offset (int): Byte offset to start from
+        complete_lines (bool): Stop before a trailing partial JSON line
+        batch_size (int): Records per JSON Lines batch
+        sources (tuple): Only yield records with one of these sources (all if None)
+    
+    Returns:
+        Iterator of tuples (records, offset after the batch)
+    """
+    f.seek(0)
+    if f.read(len(MAGIC)) == MAGIC:
+        for records, end in iter_segment_records(f, offset):
+            yield [
+                (record['repo'], record['library']) for record in records
+                if sources is None or record_source(record) in sources
+            ], end
+        return
+    
+    f.seek(offset)
+    batch = []
+    for line in f:
+        if complete_lines and not line.endswith(b'\n'):
+            break
+        offset += len(line)
+        try:
+            data = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            print(f"Warning: Skipping invalid JSON line: {line[:50].decode('utf-8', errors='replace')}...")
+            continue
+        if 'repo' in data and 'library' in data and (sources is None or record_source(data) in sources):
+            batch.append((data['repo'], data['library']))
+        if len(batch) >= batch_size:
+            yield batch, offset
+            batch = []
+    yield batch, offset
+
+def count_libraries(
+    input_file,
+    output_file,
+    state_file=None,
+    mode="rows",
+    sketch_file=None,
+    sketch_options=None,
+    sources=(IMPORT_SOURCE,)
+):
+    """
+    Count library occurrences from JSON Lines input file and write results to CSV.
+    
+    Args:
+        input_file (str): Path to input JSON Lines file
+        output_file (str): Path to output CSV file
+        state_file (str): Optional checkpoint file for incremental counting
+        mode (str): "rows" counts import rows, "repos" estimates distinct repositories per library
+        sketch_file (str): Sketch checkpoint for "repos" mode (needed to resume with state_file)
+        sketch_options (dict): Keyword arguments for a new LibrarySketch (error bounds, top_k)
+        sources (tuple): Record sources to count (see import_store.SOURCES)
+    """
+    # Initialize counter for libraries
+    library_counter = Counter()
+    sketch = None
+    offset = 0
+    if mode == "repos":
+        # Sketches need numpy, which plain row counting does without
+        from sketches import LibrarySketch
+    
+    with open(input_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        
+        # Resume from the checkpoint if the consumed prefix is unchanged
+        state = load_state(state_file)
+        if state is not None and state.get('mode', 'rows') != mode:
+            print(f"State file was written in {state.get('mode', 'rows')} mode, rebuilding counts")
+        elif state is not None and state.get('sources', [IMPORT_SOURCE]) != sorted(sources):
+            print(f"State file counts sources {state.get('sources', [IMPORT_SOURCE])}, rebuilding counts")
+        elif state is not None and mode == "repos" and not (sketch_file and os.path.exists(sketch_file)):
+            print("No sketch to resume from, rebuilding counts")
+        elif state is not None:
+            if state.get('offset', 0) <= size and file_fingerprint(f, state['offset']) == state.get('fingerprint'):
+                if mode == "repos":
+                    sketch = LibrarySketch.load(sketch_file)
+                else:
+                    library_counter.update(state.get('counts', {}))
+                offset = state['offset']
+                print(f"Resuming from byte {offset} of {size}")
+            else:
+                print("Input file was truncated or rewritten, rebuilding counts")
+        
+        if mode == "repos":
+            if sketch is None:
+                sketch = LibrarySketch(**(sketch_options or {}))
+            for records, offset in iter_repo_library_batches(f, offset, bool(state_file), sources=sources):
+                sketch.add(records)
+            library_counter = Counter(dict(sketch.top()))
+            if sketch_file:
+                sketch.save(sketch_file)
+        else:
+            f.seek(0)
+            if f.read(len(MAGIC)) == MAGIC:
+                # Columnar segments; an incomplete trailing segment is left for next time
+                delta, offset = count_column(f, offset, 'library', sources)
+                library_counter.update(delta)
+            else:
+                # Read and process the input file from the offset. In incremental mode
+                # stop before a trailing partial line so it is picked up next time
+                f.seek(offset)
+                for line in f:
+                    if state_file and not line.endswith(b'\n'):
+                        break
+                    offset += len(line)
+                    count_line(line, library_counter, sources)
+        
+        if state_file:
+            state = {
+                'mode': mode,
+                'sources': sorted(sources),
+                'offset': offset,
+                'fingerprint': file_fingerprint(f, offset)
+            }
+            if mode == "rows":
+                state['counts'] = dict(library_counter)
+            save_state(state_file, state)
+    
+    # Write the results to CSV
+    write_counts(library_counter, output_file)
     
     print(f"Processing complete: Found {len(library_counter)} unique libraries.")
     print(f"Results written to {output_file}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Count library imports from GitHub repository data")
-    parser.add_argument("input_file", help="Path to the input JSON Lines file")
+    parser.add_argument("input_file", help="Path to the input JSON Lines or columnar file")
     parser.add_argument("-o", "--output", default="library_counts.csv", 
                         help="Path to the output CSV file (default: library_counts.csv)")
+    parser.add_argument("--state", default=None,
+                        help="Checkpoint file for incremental counting (default: full recount)")
+    parser.add_argument("--mode", choices=MODES, default="rows",
+                        help="Count import rows, or distinct repositories per library with sketches")
+    parser.add_argument("--source", choices=SOURCE_CHOICES, default=IMPORT_SOURCE,
+                        help="Count libraries from import statements, declared manifest dependencies, or all")
+    parser.add_argument("--sketch", default=None,
+                        help="Sketch file kept in repos mode, mergeable with sketches.py")
+    parser.add_argument("--hll-error", type=float, default=0.05,
+                        help="Relative standard error of the distinct repository counts")
+    parser.add_argument("--cm-epsilon", type=float, default=0.0005,
+                        help="Count-Min collision error bound")
+    parser.add_argument("--cm-delta", type=float, default=0.01,
+                        help="Count-Min failure probability")
+    parser.add_argument("--top-k", type=int, default=2000,
+                        help="Number of libraries tracked and reported in repos mode")
     
     args = parser.parse_args()
     
-    count_libraries(args.input_file, args.output)
+    count_libraries(
+        args.input_file,
+        args.output,
+        args.state,
+        mode=args.mode,
+        sketch_file=args.sketch,
+        sketch_options={
+            'error': args.hll_error,
+            'epsilon': args.cm_epsilon,
+            'delta': args.cm_delta,
+            'top_k': args.top_k
+        },
+        sources=SOURCES if args.source == "all" else (args.source,)
+    )
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Library Usage Estimator
+
+Estimates the share of Python repositories that use each library, with
+bootstrap confidence intervals, and extrapolates it to the total number of
+Python repositories on GitHub.
+
+The imports data is reduced to a sparse repository x library incidence
+matrix (1 if any sampled file of the repository imports the library). Each
+bootstrap resample draws repositories with replacement, expressed as a
+vector of multinomial weights, so the library counts of a whole batch of
+resamples are one sparse-dense matrix product instead of a Python loop.
+
+Usage:
+    python estimate_usage.py data/imports.jsonl -o data/library_estimates.csv --processed-file data/processed_repos.txt
+"""
+import os
+import csv
+import json
+import argparse
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from import_store import IMPORT_SOURCE, is_columnar_file, iter_records, record_source
+
+# Estimated number of public Python repositories (see total_python_repos.ipynb)
+TOTAL_PYTHON_REPOS = 18_000_000
+
+def iter_repo_libraries(input_file: str, sources: Tuple[str, ...] = (IMPORT_SOURCE,)):
+    """Yield (repo, library) pairs of the given record sources from a JSON Lines or columnar imports file."""
+    if is_columnar_file(input_file):
+        for record in iter_records(input_file):
+            if record_source(record) in sources:
+                yield record["repo"], record["library"]
+        return
+
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping invalid JSON line: {line[:50]}...")
+                continue
+            if 'repo' in data and 'library' in data and record_source(data) in sources:
+                yield data['repo'], data['library']
+
+def load_incidence(input_file: str) -> Tuple[List[str], List[str], sparse.csr_matrix]:
+    """
+    Build the repository x library incidence matrix of an imports file.
+
+    Returns:
+        Tuple of (repository names, library names, CSR matrix of 0/1 entries)
+    """
+    repo_index: Dict[str, int] = {}
+    library_index: Dict[str, int] = {}
+    rows = array('I')
+    cols = array('I')
+    for repo, library in iter_repo_libraries(input_file):
+        rows.append(repo_index.setdefault(repo, len(repo_index)))
+        cols.append(library_index.setdefault(library, len(library_index)))
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (np.frombuffer(rows, dtype=np.uint32), np.frombuffer(cols, dtype=np.uint32))),
+        shape=(len(repo_index), len(library_index))
+    )
+    # Several files of a repository may import the same library
+    matrix.data[:] = 1
+    return list(repo_index), list(library_index), matrix
+
+def bootstrap_counts(incidence: sparse.csr_matrix, sample_size: int, resamples: int = 1000,
+                     seed: Optional[int] = None, batch: int = 100) -> np.ndarray:
+    """
+    Count the repositories using each library in bootstrap resamples.
+
+    Args:
+        incidence: Repository x library 0/1 matrix
+        sample_size: Number of sampled repositories; repositories beyond the
+            matrix rows are sampled repositories without any recorded import
+        resamples: Number of bootstrap resamples
+        seed: Optional seed for reproducible intervals
+        batch: Resamples computed per matrix product
+
+    Returns:
+        Array of shape (resamples, libraries) with the count of each library per resample
+    """
+    rng = np.random.default_rng(seed)
+    n_repos, n_libraries = incidence.shape
+    sample_size = max(sample_size, n_repos)
+    pvals = np.full(sample_size, 1.0 / sample_size)
+    transposed = incidence.T.tocsr()
+    counts = np.empty((resamples, n_libraries), dtype=np.float32)
+    for start in range(0, resamples, batch):
+        stop = min(start + batch, resamples)
+        # How often each repository is drawn in each resample
+        weights = rng.multinomial(sample_size, pvals, size=stop - start)[:, :n_repos]
+        counts[start:stop] = (transposed @ weights.T.astype(np.float32)).T
+    return counts
+
+def estimate_usage(
+    input_file: str,
+    output_file: str,
+    processed_file: Optional[str] = None,
+    total_repos: int = TOTAL_PYTHON_REPOS,
+    resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None
+) -> int:
+    """
+    Write per-library usage shares and extrapolated counts with confidence intervals.
+
+    Args:
+        input_file: Path to the imports file (JSON Lines or columnar)
+        output_file: Path to the output CSV file
+        processed_file: Optional processed repositories file; its line count is
+            used as the sample size so repositories without third-party imports count
+        total_repos: Number of repositories the shares are extrapolated to
+        resamples: Number of bootstrap resamples
+        confidence: Confidence level of the percentile intervals
+        seed: Optional seed for reproducible intervals
+
+    Returns:
+        Number of libraries written
+    """
+    repos, libraries, incidence = load_incidence(input_file)
+    sample_size = len(repos)
+    if processed_file and os.path.exists(processed_file):
+        with open(processed_file, 'r') as f:
+            sample_size = max(sample_size, len({line.strip() for line in f if line.strip()}))
+    if sample_size == 0:
+        print("No repositories found in input")
+        return 0
+
+    observed = np.asarray(incidence.sum(axis=0)).ravel()
+    counts = bootstrap_counts(incidence, sample_size, resamples, seed)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(counts, [alpha, 1 - alpha], axis=0) / sample_size
+    share = observed / sample_size
+
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            'library', 'repos', 'share', 'share_low', 'share_high',
+            'estimated_repos', 'estimated_low', 'estimated_high'
+        ])
+        for i in np.argsort(-observed, kind='stable'):
+            writer.writerow([
+                libraries[i], int(observed[i]),
+                f"{share[i]:.6f}", f"{low[i]:.6f}", f"{high[i]:.6f}",
+                round(share[i] * total_repos), round(low[i] * total_repos), round(high[i] * total_repos)
+            ])
+
+    print(f"Estimated {len(libraries)} libraries from {sample_size} repositories ({resamples} resamples)")
+    return len(libraries)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate library usage shares with bootstrap confidence intervals")
+    parser.add_argument("input_file", help="Path to the imports file (JSON Lines or columnar)")
+    parser.add_argument("-o", "--output", default="library_estimates.csv", help="Path to the output CSV file")
+    parser.add_argument("--processed-file", default=None, help="Processed repositories file (sample size including repos without imports)")
+    parser.add_argument("--total-repos", type=int, default=TOTAL_PYTHON_REPOS, help="Number of repositories to extrapolate to")
+    parser.add_argument("--resamples", type=int, default=1000, help="Number of bootstrap resamples")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the intervals")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible intervals")
+
+    args = parser.parse_args()
+
+    estimate_usage(
+        args.input_file,
+        args.output,
+        processed_file=args.processed_file,
+        total_repos=args.total_repos,
+        resamples=args.resamples,
+        confidence=args.confidence,
+        seed=args.seed
+    )
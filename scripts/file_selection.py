@@ -0,0 +1,189 @@
+# file_selection.py
+"""
+Python file selection policy
+
+Picks the files of a repository worth parsing from its git tree listing,
+before any blob is read. Vendored code, virtualenvs and build output are
+excluded, since their imports are someone else's. The remaining candidates
+are ranked so a small per-repository sample looks like the project itself:
+entry points first, then modules at the root of a package, then other
+source files, with tests, docs and examples last. Within a rank Python
+files come before notebooks, shallower files first and, when blob sizes
+are known, larger ones (empty and oversized files are dropped).
+
+The same listing gives the repository's first-party modules, whose imports
+are the project importing itself rather than using a library, and the blob
+SHAs its near-duplicate fingerprint is built from.
+"""
+import posixpath
+from typing import List, Optional, Sequence, Set, Tuple
+
+from notebooks import NOTEBOOK_SUFFIX, MAX_NOTEBOOK_BYTES
+
+# Directory names whose contents are never analyzed
+EXCLUDED_DIRS = {
+    # Dependencies checked into the repository
+    "node_modules", "vendor", "vendored", "_vendor", "third_party", "thirdparty", "3rdparty",
+    # Virtual environments and installed packages
+    "venv", ".venv", "env", ".env", "virtualenv", "site-packages", "dist-packages",
+    # Build output and tool caches
+    "build", "dist", ".eggs", "__pycache__", ".tox", ".nox", ".mypy_cache", ".pytest_cache",
+    ".ipynb_checkpoints", ".git", ".hg", ".svn"
+}
+
+# Directory name suffixes of packaging metadata and unpacked eggs
+EXCLUDED_DIR_SUFFIXES = (".egg-info", ".egg", ".dist-info")
+
+# File names that usually hold a program's top-level wiring
+ENTRY_POINTS = {
+    "__main__.py", "main.py", "app.py", "cli.py", "manage.py", "run.py",
+    "server.py", "wsgi.py", "asgi.py"
+}
+
+# Directory names of code that is not the project's own library or application
+LOW_PRIORITY_DIRS = {
+    "test", "tests", "testing", "unittests", "doc", "docs", "example", "examples",
+    "sample", "samples", "benchmark", "benchmarks", "demo", "demos"
+}
+
+# Object id of the empty blob, recognizable even when sizes are unknown
+EMPTY_BLOB_SHA = "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+
+# Suffixes of files importable as modules of the repository
+MODULE_SUFFIXES = (".py", ".pyx")
+
+# Directory of src layouts, whose children are top-level modules
+SOURCE_ROOT = "src"
+
+# Ranks, best first
+ENTRY_POINT, PACKAGE_ROOT, SOURCE, LOW_PRIORITY = range(4)
+
+def is_excluded(path: str) -> bool:
+    """Whether a repository path lies in a vendored, virtualenv or build directory."""
+    for part in path.split('/')[:-1]:
+        if part in EXCLUDED_DIRS or part.endswith(EXCLUDED_DIR_SUFFIXES):
+            return True
+    return False
+
+def is_low_priority_dir(directory: str) -> bool:
+    """Whether a directory is, or lies in, a test, documentation or example directory."""
+    return any(part.lower() in LOW_PRIORITY_DIRS for part in directory.split('/'))
+
+def is_low_priority(path: str) -> bool:
+    """Whether a path is a test, documentation or example file."""
+    name = posixpath.basename(path)
+    if name.startswith("test_") or name.endswith("_test.py") or name == "conftest.py":
+        return True
+    return is_low_priority_dir(posixpath.dirname(path))
+
+def package_dirs(paths: Sequence[str]) -> Set[str]:
+    """Directories that contain an __init__.py."""
+    return {posixpath.dirname(path) for path in paths if posixpath.basename(path) == "__init__.py"}
+
+def first_party_modules(paths: Sequence[str]) -> Set[str]:
+    """
+    Top-level module names a repository's own code can import.
+
+    Covers package roots at any depth (the outermost directory of a chain
+    of __init__.py directories), the children of src/ directories, and
+    modules at the repository root. Loose modules deeper in the tree
+    (docs/conf.py, examples/requests.py) and packages in test, documentation
+    and example directories (examples/flask/__init__.py) are not counted:
+    their names would hide real third-party imports in every file of the
+    repository. Vendored, virtualenv and build directories are left out.
+
+    Args:
+        paths: Paths of every blob in the repository's tree
+
+    Returns:
+        Set of module names
+    """
+    packages = package_dirs(paths)
+    modules = set()
+    for path in paths:
+        if not path.endswith(MODULE_SUFFIXES) or is_excluded(path):
+            continue
+        directory = posixpath.dirname(path)
+        if directory and directory in packages:
+            parent = posixpath.dirname(directory)
+            while parent and parent in packages:
+                directory, parent = parent, posixpath.dirname(parent)
+            if not is_low_priority_dir(directory):
+                modules.add(posixpath.basename(directory))
+        elif not directory:
+            modules.add(posixpath.splitext(path)[0])
+        parts = path.split('/')
+        if SOURCE_ROOT in parts[:-1]:
+            # src/name.py or src/name/... without an __init__.py
+            modules.add(posixpath.splitext(parts[parts.index(SOURCE_ROOT) + 1])[0])
+    return {name for name in modules if name.isidentifier() and not name.startswith("__")}
+
+def python_blob_shas(entries: Sequence[Tuple[str, str, Optional[int]]]) -> List[str]:
+    """
+    Blob SHAs of the Python files a repository's fingerprint is built from.
+
+    Files in vendored, virtualenv and build directories and empty files are
+    left out, since unrelated repositories share those.
+
+    Args:
+        entries: Tree entries as (path, blob_sha, size)
+    """
+    return sorted({
+        sha for path, sha, _ in entries
+        if path.endswith(".py") and sha != EMPTY_BLOB_SHA and not is_excluded(path)
+    })
+
+def file_rank(path: str, packages: Set[str]) -> int:
+    """
+    Rank of a Python file in the selection policy (lower is picked first).
+
+    Args:
+        path: Repository path of the file
+        packages: Package directories of the repository (see package_dirs)
+    """
+    if is_low_priority(path):
+        return LOW_PRIORITY
+    if posixpath.basename(path) in ENTRY_POINTS:
+        return ENTRY_POINT
+    directory = posixpath.dirname(path)
+    if directory in packages and posixpath.dirname(directory) not in packages:
+        return PACKAGE_ROOT
+    return SOURCE
+
+def select_files(
+    entries: Sequence[Tuple[str, str, Optional[int]]],
+    max_files: int = 10,
+    max_size: int = 1_000_000,
+    suffixes: Tuple[str, ...] = (".py",)
+) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    Choose the files to analyze from a tree listing.
+
+    Args:
+        entries: Tree entries as (path, blob_sha, size); size may be None when
+            the blobs are not available locally
+        max_files: Maximum number of files to pick
+        max_size: Drop files with a known size above this many bytes (notebooks,
+            which are mostly outputs, above MAX_NOTEBOOK_BYTES instead)
+        suffixes: File name suffixes of candidate files
+
+    Returns:
+        Up to max_files entries in selection order
+    """
+    # Empty __init__.py files still mark package directories
+    packages = package_dirs([entry[0] for entry in entries])
+    candidates = []
+    for entry in entries:
+        path, sha, size = entry
+        if not path.endswith(suffixes) or is_excluded(path) or sha == EMPTY_BLOB_SHA:
+            continue
+        limit = MAX_NOTEBOOK_BYTES if path.endswith(NOTEBOOK_SUFFIX) else max_size
+        if size is not None and (size == 0 or size > limit):
+            continue
+        candidates.append(entry)
+
+    def sort_key(entry):
+        path, _, size = entry
+        return (file_rank(path, packages), path.endswith(NOTEBOOK_SUFFIX), path.count('/'), -(size or 0), path)
+
+    return sorted(candidates, key=sort_key)[:max_files]
@@ -11,6 +11,7 @@ Usage:
 
 import os
 import time
+import asyncio
 import random
 import json
 import argparse
@@ -19,11 +20,16 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 
 # Import functions from github_utils
-from github_utils import make_github_request, RateLimitExceeded, GITHUB_API_URL
+from github_utils import enable_http_cache, RateLimitExceeded, GITHUB_API_URL
+from github_client import AsyncGitHubClient, fetch_rate_limits
+from gharchive import find_archive_repos
 
 # Default output file
 DEFAULT_OUTPUT_FILE = "repos.jsonl"
 
+# Where random repositories are sampled from: the Search API, or hourly GHArchive dumps
+BACKENDS = ("search", "gharchive")
+
 def get_random_date_hour(years_back: int = 10) -> datetime:
     """
     Generate a random date and hour from the past X years
@@ -42,14 +48,14 @@ def get_random_date_hour(years_back: int = 10) -> datetime:
     
     return random_date.replace(hour=random_hour, minute=0, second=0, microsecond=0)
 
-def get_repos_from_hour(
+def hour_search_params(
     date_hour: datetime, 
     language: str = "python", 
     min_stars: int = 0,
     min_size_kb: int = 0
-) -> List[Dict]:
+) -> Dict:
     """
-    Get repositories updated in a specific hour with optional filtering
+    Build Search API parameters for repositories pushed to in a specific hour
     
     Args:
         date_hour: Datetime object representing the hour to sample
@@ -58,7 +64,7 @@ def get_repos_from_hour(
         min_size_kb: Minimum repository size in KB (0 for no filtering)
         
     Returns:
-        List of repository dictionaries
+        Query parameters for the repository search endpoint
     """
     # Format timestamps for GitHub Search API
     start_time = date_hour.isoformat() + "Z"  # GitHub needs the Z suffix for UTC
@@ -73,48 +79,163 @@ def get_repos_from_hour(
     if min_size_kb > 0:
         query_parts.append(f"size:>={min_size_kb}")
     
-    query = " ".join(query_parts)
+    return {
+        "q": " ".join(query_parts),
+        "sort": "updated",
+        "order": "desc",
+        "per_page": 10  # Fixed at 10 repos per hour
+    }
+
+def clean_search_results(data: Dict, date_hour: datetime) -> List[Dict]:
+    """
+    Extract relevant fields of a repository search response to match the expected format
     
-    # Make API request using the utility function
-    try:
-        params = {
-            "q": query,
-            "sort": "updated",
-            "order": "desc",
-            "per_page": 10  # Fixed at 10 repos per hour
-        }
+    Args:
+        data: Parsed Search API response
+        date_hour: Hour the search covered (for logging)
         
-        data = make_github_request(f"{GITHUB_API_URL}/search/repositories", params)
+    Returns:
+        List of repository dictionaries
+    """
+    # Check if we got any results
+    if "items" not in data:
+        logging.info(f"No results found for {date_hour.isoformat()}Z")
+        return []
+    
+    return [
+        {
+            "repo_name": repo.get("full_name"),
+            "repo_url": repo.get("html_url"),
+            "last_updated": repo.get("updated_at"),
+            # Kept for the run scheduler's cost model (see scheduler.py)
+            "size": repo.get("size"),
+            "stargazers_count": repo.get("stargazers_count"),
+            "fork": repo.get("fork")
+        }
+        for repo in data["items"]
+    ]
+
+async def get_repos_from_hour_async(
+    client: AsyncGitHubClient,
+    date_hour: datetime, 
+    language: str = "python", 
+    min_stars: int = 0,
+    min_size_kb: int = 0
+) -> List[Dict]:
+    """
+    Get repositories updated in a specific hour with optional filtering, using a shared client
+    
+    Args:
+        client: Client whose connection pool and rate-limit buckets are shared by all requests
+        date_hour: Datetime object representing the hour to sample
+        language: Programming language to filter for
+        min_stars: Minimum number of stars (0 for no filtering)
+        min_size_kb: Minimum repository size in KB (0 for no filtering)
         
-        # Check if we got any results
-        if "items" in data:
-            repos = data["items"]
-            
-            # Extract relevant fields to match expected format
-            cleaned_repos = []
-            for repo in repos:
-                cleaned_repos.append({
-                    "repo_name": repo.get("full_name"),
-                    "repo_url": repo.get("html_url"),
-                    "last_updated": repo.get("updated_at")
-                })
-            
-            return cleaned_repos
-        else:
-            logging.info(f"No results found for {start_time}")
-            return []
-            
+    Returns:
+        List of repository dictionaries
+    
+    Raises:
+        RateLimitExceeded: If the quota does not reset within the client's max_wait
+    """
+    params = hour_search_params(date_hour, language, min_stars, min_size_kb)
+    try:
+        data = await client.get(f"{GITHUB_API_URL}/search/repositories", params)
+        return clean_search_results(data, date_hour)
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         logging.error(f"Error querying GitHub API: {e}")
         return []
 
+async def sample_hours_async(
+    count: int,
+    min_stars: int,
+    language: str,
+    min_size_kb: int,
+    output_file: str,
+    years_back: int,
+    concurrency: int
+) -> List[Dict]:
+    """
+    Sample random hours concurrently until count repositories are found.
+    
+    Up to concurrency hours are searched at once (never more than the number
+    of repositories still missing, since each hour contributes at most one);
+    the client's rate-limit buckets hold requests back when the quota runs out.
+    
+    Returns:
+        List of found repositories
+    """
+    found_repos = []
+    seen = set()
+    attempts = 0
+    max_attempts = count * 3  # Allow more attempts than needed
+    
+    async with AsyncGitHubClient(max_in_flight=concurrency) as client:
+        try:
+            await fetch_rate_limits(client)
+        except Exception as e:
+            logging.warning(f"Could not fetch rate limits: {e}")
+        
+        pending = set()
+        
+        def refill():
+            nonlocal attempts
+            while len(pending) < min(concurrency, count - len(found_repos)) and attempts < max_attempts:
+                attempts += 1
+                random_hour = get_random_date_hour(years_back)
+                logging.info(f"Sampling hour {attempts}/{max_attempts}: {random_hour.strftime('%Y-%m-%d %H:00')}")
+                pending.add(asyncio.ensure_future(get_repos_from_hour_async(
+                    client, random_hour, language, min_stars=min_stars, min_size_kb=min_size_kb
+                )))
+        
+        # Open output file for immediate writing (to preserve progress)
+        with open(output_file, 'w') as f:
+            refill()
+            try:
+                while pending and len(found_repos) < count:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        repos = task.result()
+                        if not repos or len(found_repos) >= count:
+                            continue
+                        # Select one random repo from the results for this hour
+                        repo = random.choice(repos)
+                        # Check if we already have this repo (avoid duplicates)
+                        if repo["repo_name"] in seen:
+                            continue
+                        seen.add(repo["repo_name"])
+                        found_repos.append(repo)
+                        
+                        # Write to file immediately to preserve progress
+                        f.write(json.dumps(repo) + '\n')
+                        f.flush()
+                        
+                        logging.info(f"Found {len(found_repos)}/{count} repositories: {repo['repo_name']}")
+                    refill()
+            except RateLimitExceeded:
+                logging.error("API rate limit reached. Stopping repository search.")
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        logging.info(f"Made {client.requests_made} API requests")
+    
+    return found_repos
+
 def find_random_repos(
     count: int = 10,
     min_stars: int = 5,
     language: str = "python",
     min_size_kb: int = 100,
     output_file: str = DEFAULT_OUTPUT_FILE,
-    years_back: int = 10
+    years_back: int = 10,
+    backend: str = "search",
+    archive_dir: str = "gharchive",
+    per_hour: int = 10,
+    concurrency: int = 4
 ) -> List[Dict]:
     """
     Find multiple random repositories and save them to a file.
@@ -126,60 +247,29 @@ def find_random_repos(
         min_size_kb: Minimum repository size in KB
         output_file: File to save results to
         years_back: How many years back to sample from
+        backend: "search" for the GitHub Search API, "gharchive" to sample hourly
+            GHArchive dumps without API quota (min_stars and min_size_kb don't apply)
+        archive_dir: Directory of local or cached GHArchive files for the gharchive backend
+        per_hour: Maximum repositories the gharchive backend takes from each hourly archive
+        concurrency: Maximum number of concurrent Search API requests
         
     Returns:
         List of found repositories
     """
-    start_time = time.time()
-    found_repos = []
-    attempts = 0
-    max_attempts = count * 3  # Allow more attempts than needed
+    if backend == "gharchive":
+        return find_archive_repos(
+            count=count,
+            language=language,
+            output_file=output_file,
+            archive_dir=archive_dir,
+            years_back=years_back,
+            per_hour=per_hour
+        )
     
-    # Open output file for immediate writing (to preserve progress)
-    with open(output_file, 'w') as f:
-        while len(found_repos) < count and attempts < max_attempts:
-            try:
-                attempts += 1
-                
-                # Generate a random hour
-                random_hour = get_random_date_hour(years_back)
-                hour_str = random_hour.strftime("%Y-%m-%d %H:00")
-                logging.info(f"Sampling hour {attempts}/{max_attempts}: {hour_str}")
-                
-                # Get repositories for this hour
-                repos = get_repos_from_hour(
-                    random_hour, 
-                    language,
-                    min_stars=min_stars,
-                    min_size_kb=min_size_kb
-                )
-                
-                if repos:
-                    # Select one random repo from the results for this hour
-                    repo = random.choice(repos)
-                    
-                    # Check if we already have this repo (avoid duplicates)
-                    if repo["repo_name"] not in [r["repo_name"] for r in found_repos]:
-                        found_repos.append(repo)
-                        
-                        # Write to file immediately to preserve progress
-                        f.write(json.dumps(repo) + '\n')
-                        f.flush()  # Ensure it's written to disk
-                        
-                        logging.info(f"Found {len(found_repos)}/{count} repositories: {repo['repo_name']}")
-                        
-                        # If we have enough repos, we can stop
-                        if len(found_repos) >= count:
-                            break
-                
-                # Add a small delay
-                time.sleep(1)
-                
-            except RateLimitExceeded:
-                logging.error("API rate limit reached. Stopping repository search.")
-                break
-            except Exception as e:
-                logging.error(f"Error during repository search: {e}")
+    start_time = time.time()
+    found_repos = asyncio.run(sample_hours_async(
+        count, min_stars, language, min_size_kb, output_file, years_back, concurrency
+    ))
     
     elapsed_time = time.time() - start_time
     logging.info(f"Found {len(found_repos)} repositories in {elapsed_time:.2f} seconds")
@@ -199,9 +289,16 @@ def main():
     parser.add_argument("--min-size", type=int, default=100, help="Minimum repository size in KB") 
     parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT_FILE, help="Output file")
     parser.add_argument("--years-back", type=int, default=10, help="How many years back to sample from")
+    parser.add_argument("--backend", type=str, default="search", choices=BACKENDS, help="Where to sample repositories from")
+    parser.add_argument("--archive-dir", type=str, default="gharchive", help="Directory of GHArchive files")
+    parser.add_argument("--per-hour", type=int, default=10, help="Maximum repositories taken from each GHArchive hour")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of concurrent API requests")
+    parser.add_argument("--http-cache", type=str, default=None, help="SQLite cache of API responses revalidated with ETags")
     
     args = parser.parse_args()
     
+    http_cache = enable_http_cache(args.http_cache) if args.http_cache else None
+    
     try:
         repos = find_random_repos(
             count=args.count,
@@ -209,10 +306,16 @@ def main():
             language=args.language,
             min_size_kb=args.min_size,
             output_file=args.output,
-            years_back=args.years_back
+            years_back=args.years_back,
+            backend=args.backend,
+            archive_dir=args.archive_dir,
+            per_hour=args.per_hour,
+            concurrency=args.concurrency
         )
         
         print(f"Found {len(repos)} repositories. Results saved to {args.output}")
+        if http_cache is not None:
+            print(f"HTTP cache: {http_cache.stats()}")
             
     except KeyboardInterrupt:
         print("\nOperation interrupted by user.")
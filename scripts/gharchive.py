@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+GHArchive Repository Sampler
+
+Samples repositories from hourly GHArchive dumps instead of the GitHub
+Search API, so no API quota is spent. Each hourly `.json.gz` file is
+decompressed as a stream and only lines that can matter are decoded as JSON.
+Repositories with a push in that hour are kept when their language, taken
+from any event in the same hour that carries it (pull request events
+include the base repository's language, pre-2015 events include it
+directly), matches the requested language. Hours are processed in parallel
+worker processes.
+
+Usage:
+    python gharchive.py --archive-dir data/gharchive --count 50 --per-hour 2 --output repos.jsonl
+"""
+import os
+import gzip
+import json
+import random
+import logging
+import argparse
+import multiprocessing
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+GHARCHIVE_URL = "https://data.gharchive.org"
+
+# Only lines containing one of these are decoded
+_PUSH_MARKER = b'"PushEvent"'
+_LANGUAGE_MARKER = b'"language":"'
+
+def archive_file_name(date_hour: datetime) -> str:
+    """GHArchive file name for an hour, e.g. 2015-01-01-15.json.gz (hours are not zero-padded)."""
+    return f"{date_hour:%Y-%m-%d}-{date_hour.hour}.json.gz"
+
+def download_hour(date_hour: datetime, cache_dir: str, timeout: int = 300) -> Optional[str]:
+    """
+    Download an hourly archive into cache_dir unless it is already there.
+
+    Returns:
+        Path to the archive file, or None if the download failed
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, archive_file_name(date_hour))
+    if os.path.exists(path):
+        return path
+
+    url = f"{GHARCHIVE_URL}/{archive_file_name(date_hour)}"
+    tmp_path = path + ".part"
+    try:
+        with requests.get(url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        logging.warning(f"Error downloading {url}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+def iter_events(path: str) -> Iterator[Dict]:
+    """
+    Stream the events of an hourly archive that are push events or carry a language.
+
+    The file is decompressed line by line; other events are skipped without
+    being decoded.
+    """
+    try:
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                if _PUSH_MARKER not in line and _LANGUAGE_MARKER not in line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    except (OSError, EOFError) as e:
+        # Truncated or corrupt archives still yield the events read so far
+        logging.warning(f"Error reading {path}: {e}")
+
+def event_repo_name(event: Dict) -> Optional[str]:
+    """Repository full name of an event in either the current or pre-2015 format."""
+    repo = event.get("repo")
+    if repo and repo.get("name") and "/" in repo["name"]:
+        return repo["name"]
+    repository = event.get("repository")
+    if repository and repository.get("owner") and repository.get("name"):
+        return f"{repository['owner']}/{repository['name']}"
+    return None
+
+def event_language(event: Dict) -> Optional[str]:
+    """Primary language of the event's repository, if the event carries it."""
+    repository = event.get("repository")
+    if repository and repository.get("language"):
+        return repository["language"]
+    pull_request = (event.get("payload") or {}).get("pull_request") or {}
+    base_repo = (pull_request.get("base") or {}).get("repo") or {}
+    return base_repo.get("language")
+
+def sample_hour_file(path: str, language: str = "python", per_hour: int = 10,
+                     seed: Optional[int] = None) -> List[Dict]:
+    """
+    Sample repositories pushed to during one archived hour.
+
+    Args:
+        path: Path to an hourly .json.gz archive
+        language: Repository language to keep (case-insensitive)
+        per_hour: Maximum number of repositories to return
+        seed: Optional seed for the random sample
+
+    Returns:
+        List of repository dictionaries in the repos.jsonl format
+    """
+    pushed: Dict[str, str] = {}
+    languages: Dict[str, str] = {}
+    for event in iter_events(path):
+        repo_name = event_repo_name(event)
+        if not repo_name:
+            continue
+        repo_language = event_language(event)
+        if repo_language:
+            languages[repo_name] = repo_language.lower()
+        if event.get("type") == "PushEvent":
+            pushed[repo_name] = event.get("created_at", "")
+
+    candidates = sorted(name for name in pushed if languages.get(name) == language.lower())
+    if len(candidates) > per_hour:
+        candidates = random.Random(seed).sample(candidates, per_hour)
+
+    return [
+        {
+            "repo_name": repo_name,
+            "repo_url": f"https://github.com/{repo_name}",
+            "last_updated": pushed[repo_name]
+        }
+        for repo_name in candidates
+    ]
+
+def _sample_hour_job(job):
+    return sample_hour_file(*job)
+
+def sample_archives(paths: List[str], language: str = "python", per_hour: int = 10,
+                    procs: Optional[int] = None, seed: Optional[int] = None) -> Iterator[List[Dict]]:
+    """
+    Sample several hourly archives in parallel worker processes.
+
+    Returns:
+        Iterator of per-hour repository lists, in completion order
+    """
+    rng = random.Random(seed)
+    jobs = [(path, language, per_hour, rng.randrange(1 << 30)) for path in paths]
+    if procs == 1 or len(jobs) <= 1:
+        yield from map(_sample_hour_job, jobs)
+        return
+    with multiprocessing.Pool(procs) as pool:
+        yield from pool.imap_unordered(_sample_hour_job, jobs)
+
+def random_hours(count: int, years_back: int = 10, seed: Optional[int] = None) -> List[datetime]:
+    """Pick distinct random hours from the past years_back years."""
+    rng = random.Random(seed)
+    now = datetime.utcnow() - timedelta(hours=2)
+    span = int(timedelta(days=365 * years_back).total_seconds() // 3600)
+    hours = set()
+    while len(hours) < min(count, span):
+        hours.add((now - timedelta(hours=rng.randrange(span))).replace(minute=0, second=0, microsecond=0))
+    return sorted(hours)
+
+def find_archive_repos(
+    count: int = 10,
+    language: str = "python",
+    output_file: str = "repos.jsonl",
+    archive_dir: str = "gharchive",
+    years_back: int = 10,
+    per_hour: int = 10,
+    download: bool = True,
+    procs: Optional[int] = None,
+    seed: Optional[int] = None
+) -> List[Dict]:
+    """
+    Find random repositories from GHArchive and save them to a file.
+
+    Archives already in archive_dir are used first; with download enabled,
+    random hours are fetched into archive_dir until enough repositories are found.
+
+    Args:
+        count: Number of repositories to find
+        language: Programming language filter
+        output_file: File to save results to
+        archive_dir: Directory of local or cached hourly archives
+        years_back: How many years back to sample downloaded hours from
+        per_hour: Maximum repositories taken from each hour
+        download: Download random hours when local archives run out
+        procs: Number of worker processes (defaults to the CPU count)
+        seed: Optional seed for reproducible samples
+
+    Returns:
+        List of found repositories
+    """
+    rng = random.Random(seed)
+    local = []
+    if os.path.isdir(archive_dir):
+        local = sorted(os.path.join(archive_dir, name) for name in os.listdir(archive_dir)
+                       if name.endswith(".json.gz"))
+    rng.shuffle(local)
+
+    found: List[Dict] = []
+    seen = set()
+    with open(output_file, "w") as f:
+        def collect(paths):
+            for repos in sample_archives(paths, language, per_hour, procs, rng.randrange(1 << 30)):
+                for repo in repos:
+                    if repo["repo_name"] in seen or len(found) >= count:
+                        continue
+                    seen.add(repo["repo_name"])
+                    found.append(repo)
+                    f.write(json.dumps(repo) + "\n")
+                    f.flush()
+                if len(found) >= count:
+                    return
+
+        collect(local)
+
+        attempts = 0
+        while download and len(found) < count and attempts < 3:
+            attempts += 1
+            batch = max(1, (count - len(found)) // max(1, per_hour))
+            hours = random_hours(batch, years_back, rng.randrange(1 << 30))
+            paths = [path for path in (download_hour(hour, archive_dir) for hour in hours) if path]
+            collect(paths)
+
+    logging.info(f"Found {len(found)} repositories from GHArchive")
+    return found
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Sample random repositories from GHArchive")
+    parser.add_argument("--count", type=int, default=10, help="Number of repositories to find")
+    parser.add_argument("--language", type=str, default="python", help="Programming language filter")
+    parser.add_argument("--archive-dir", type=str, default="gharchive", help="Directory of hourly archives")
+    parser.add_argument("--per-hour", type=int, default=10, help="Maximum repositories per hour")
+    parser.add_argument("--years-back", type=int, default=10, help="How many years back to sample from")
+    parser.add_argument("--no-download", action="store_true", help="Only use archives already in --archive-dir")
+    parser.add_argument("--procs", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible samples")
+    parser.add_argument("--output", type=str, default="repos.jsonl", help="Output file")
+
+    args = parser.parse_args()
+
+    repos = find_archive_repos(
+        count=args.count,
+        language=args.language,
+        output_file=args.output,
+        archive_dir=args.archive_dir,
+        years_back=args.years_back,
+        per_hour=args.per_hour,
+        download=not args.no_download,
+        procs=args.procs,
+        seed=args.seed
+    )
+    print(f"Found {len(repos)} repositories. Results saved to {args.output}")
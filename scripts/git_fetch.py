@@ -0,0 +1,560 @@
+# git_fetch.py
+"""
+Tree-based repository fetching
+
+Repositories are cloned without a working tree. The files to analyze are
+chosen from the tree listing by the policy in file_selection, and only their
+blobs are read, streamed out of one persistent `git cat-file --batch`
+process. A partial clone goes further and fetches no blobs at all until the
+chosen ones are requested in a single round trip.
+"""
+import os
+import logging
+import subprocess
+from typing import Callable, Iterator, List, NamedTuple, Optional, Set, TypeVar
+
+from github_utils import GIT_BASE_URL
+from metrics import RepoMetrics, directory_bytes
+from file_selection import select_files, first_party_modules, python_blob_shas
+from import_store import IMPORT_SOURCE, MANIFEST_SOURCE
+from manifests import MAX_MANIFEST_BYTES, parse_manifest, select_manifests
+from notebooks import NOTEBOOK_SUFFIX, MAX_NOTEBOOK_BYTES, NotebookError, notebook_source
+from sampling import AdaptiveSampler
+
+T = TypeVar("T")
+
+# Bytes read from git at a time when a blob is streamed or discarded
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Files whose blobs a sampled blobless read fetches per request
+SAMPLE_PREFETCH_FILES = 4
+
+class SourceFile(NamedTuple):
+    """A file picked for analysis; imports come from the cache or from parsing content."""
+    path: str
+    blob_sha: Optional[str]
+    content: Optional[str]
+    imports: Optional[Set[str]] = None
+    # Seconds spent extracting imports (None for cache hits)
+    parse_time: Optional[float] = None
+    # import_store.IMPORT_SOURCE, or MANIFEST_SOURCE for declared dependencies
+    source: str = IMPORT_SOURCE
+
+class TreeEntry(NamedTuple):
+    """A blob in a commit's tree."""
+    path: str
+    sha: str
+    # Blob size in bytes, None if it was not looked up
+    size: Optional[int] = None
+
+def repo_clone_url(repo_name: str) -> str:
+    """Clone URL for a repository (owner/repo)."""
+    return f"{GIT_BASE_URL}/{repo_name}.git"
+
+def fetch_timeout(deadline: Optional[float], now: float, timeout: int = 300) -> int:
+    """Timeout of a git network operation, cut to the time left before the deadline."""
+    if deadline is None:
+        return timeout
+    return max(1, min(timeout, int(deadline - now)))
+
+def shallow_clone(
+    repo_name: str,
+    dest_dir: str,
+    timeout: int = 300,
+    blobless: bool = False,
+    bare: bool = False
+) -> bool:
+    """
+    Clone a repository's latest commit without a checkout.
+
+    Args:
+        repo_name: Repository name (owner/repo)
+        dest_dir: Directory to clone into
+        timeout: Timeout in seconds for the clone
+        blobless: Make a partial clone of commits and trees only
+        bare: Make a bare repository (dest_dir is the git directory itself)
+
+    Returns:
+        True if the clone succeeded, False otherwise
+    """
+    blob_filter = ["--filter=blob:none"] if blobless else []
+    layout = ["--bare"] if bare else ["--no-checkout"]
+    process = subprocess.run(
+        ["git", "clone", "--quiet", *blob_filter, *layout,
+         "--depth", "1", "--single-branch", repo_clone_url(repo_name), dest_dir],
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+    if process.returncode != 0:
+        logging.error(f"Failed to clone repository: {process.stderr}")
+        return False
+    return True
+
+def has_commit(repo_dir: str, rev: str = "HEAD", timeout: int = 120) -> bool:
+    """Whether rev names a commit in the repository."""
+    process = subprocess.run(
+        ["git", "rev-parse", "--verify", "--quiet", f"{rev}^{{commit}}"],
+        cwd=repo_dir,
+        capture_output=True,
+        timeout=timeout
+    )
+    return process.returncode == 0
+
+def list_tree(repo_dir: str, rev: str = "HEAD", timeout: int = 120, sizes: bool = False) -> List[TreeEntry]:
+    """
+    List the blobs in a commit's tree without reading them.
+
+    Args:
+        repo_dir: Repository directory
+        rev: Commit whose tree is listed
+        timeout: Timeout in seconds
+        sizes: Look up blob sizes; only for clones that have the blobs, since
+            `ls-tree -l` would fetch every blob of a partial clone one by one
+
+    Returns:
+        List of TreeEntry, empty for an empty repository whose HEAD has no commit yet
+    """
+    long_format = ["-l"] if sizes else []
+    process = subprocess.run(
+        ["git", "ls-tree", "-r", "-z", *long_format, rev],
+        cwd=repo_dir,
+        capture_output=True,
+        timeout=timeout
+    )
+    if process.returncode != 0:
+        if rev == "HEAD" and not has_commit(repo_dir, rev, timeout):
+            # Unborn HEAD: the repository has no commits, so no files
+            return []
+        raise subprocess.CalledProcessError(process.returncode, process.args, process.stdout, process.stderr)
+    entries = []
+    for record in process.stdout.split(b'\0'):
+        if not record:
+            continue
+        meta, _, path = record.partition(b'\t')
+        fields = meta.split()
+        if fields[1] == b'blob':
+            size = int(fields[3]) if sizes else None
+            entries.append(TreeEntry(path.decode('utf-8', errors='replace'), fields[2].decode(), size))
+    return entries
+
+def prefetch_blobs(repo_dir: str, shas: List[str], timeout: int = 300) -> bool:
+    """
+    Fetch the given blobs from the promisor remote in a single request.
+
+    Without this, `cat-file` would lazily fetch each missing blob one round trip at a time.
+
+    Returns:
+        True if the fetch succeeded, False otherwise
+    """
+    if not shas:
+        return True
+    process = subprocess.run(
+        ["git", "-c", "fetch.negotiationAlgorithm=noop", "fetch", "--quiet", "--no-tags",
+         "--no-write-fetch-head", "--recurse-submodules=no", "--filter=blob:none",
+         "--stdin", "origin"],
+        cwd=repo_dir,
+        input="\n".join(shas) + "\n",
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+    if process.returncode != 0:
+        logging.warning(f"Failed to prefetch blobs: {process.stderr}")
+        return False
+    return True
+
+class BlobReader:
+    """Reads blobs through one persistent `git cat-file --batch` process."""
+
+    def __init__(self, repo_dir: str):
+        self.process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=repo_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        # Size of the last blob looked up, None if it was missing
+        self.last_size: Optional[int] = None
+
+    def read(self, sha: str, max_size: Optional[int] = None) -> Optional[bytes]:
+        """
+        Read a blob's contents.
+
+        Args:
+            sha: Blob object id
+            max_size: Skip (and return None for) blobs larger than this many bytes
+
+        Returns:
+            Blob contents, or None if the blob is missing or too large
+        """
+        self.process.stdin.write(sha.encode() + b'\n')
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        self.last_size = None
+        if len(header) != 3:
+            # "<sha> missing" or "<sha> ambiguous"
+            return None
+        size = self.last_size = int(header[2])
+        if max_size is not None and size > max_size:
+            self._discard(size + 1)
+            return None
+        return self.process.stdout.read(size + 1)[:size]
+
+    def stream(
+        self,
+        sha: str,
+        consume: Callable[[Iterator[bytes]], T],
+        max_size: Optional[int] = None,
+        chunk_size: int = STREAM_CHUNK_BYTES
+    ) -> Optional[T]:
+        """
+        Pass a blob's contents to a function as a stream of chunks.
+
+        The blob is never held in memory whole. Whatever consume leaves
+        unread (or all of it, if consume raises) is discarded so the next
+        blob can be read.
+
+        Args:
+            sha: Blob object id
+            consume: Function taking an iterator of byte chunks
+            max_size: Skip (and return None for) blobs larger than this many bytes
+            chunk_size: Bytes per chunk
+
+        Returns:
+            What consume returned, or None if the blob is missing or too large
+        """
+        self.process.stdin.write(sha.encode() + b'\n')
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        self.last_size = None
+        if len(header) != 3:
+            return None
+        remaining = self.last_size = int(header[2])
+        if max_size is not None and remaining > max_size:
+            self._discard(remaining + 1)
+            return None
+
+        def chunks() -> Iterator[bytes]:
+            nonlocal remaining
+            while remaining > 0:
+                chunk = self.process.stdout.read(min(chunk_size, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+        try:
+            return consume(chunks())
+        finally:
+            # The rest of the blob and its trailing newline
+            self._discard(remaining + 1)
+
+    def _discard(self, size: int) -> None:
+        """Read and drop size bytes of output."""
+        while size > 0:
+            chunk = self.process.stdout.read(min(STREAM_CHUNK_BYTES, size))
+            if not chunk:
+                return
+            size -= len(chunk)
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                # A process forked meanwhile (e.g. a parse pool worker) can hold
+                # a copy of our stdin pipe, so git never sees end of input
+                self.process.kill()
+                self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_manifests(repo_dir: str, tree: List[TreeEntry], timeout: int = 300, blobless: bool = False) -> Optional[List[SourceFile]]:
+    """
+    Read the dependency manifests in a tree listing and parse them.
+
+    Args:
+        repo_dir: Clone without a working tree (or a bare mirror)
+        tree: Entries of the HEAD tree
+        timeout: Timeout in seconds for fetching the manifest blobs
+        blobless: Whether repo_dir is a partial clone without blobs
+
+    Returns:
+        SourceFile per manifest that declares dependencies, with them as its
+        imports, or None if the blobs could not be fetched
+    """
+    selected = select_manifests(tree)
+    if not selected:
+        return []
+    if blobless and not prefetch_blobs(repo_dir, sorted({entry.sha for entry in selected}), timeout):
+        return None
+
+    manifests = []
+    with BlobReader(repo_dir) as reader:
+        for entry in selected:
+            data = reader.read(entry.sha, MAX_MANIFEST_BYTES)
+            if data is None:
+                continue
+            names = parse_manifest(entry.path, data.decode('utf-8', errors='ignore'))
+            if names:
+                manifests.append(SourceFile(entry.path, entry.sha, None, names, source=MANIFEST_SOURCE))
+    return manifests
+
+def read_source(reader: BlobReader, entry: TreeEntry, max_size: int, metrics: RepoMetrics) -> Optional[str]:
+    """
+    Read a selected file's source: the blob itself, or a notebook's code cells.
+
+    Files that are too large, missing or unreadable are logged and counted
+    as skipped.
+
+    Returns:
+        Source text, or None if the file was skipped
+    """
+    if entry.path.endswith(NOTEBOOK_SUFFIX):
+        try:
+            content = reader.stream(entry.sha, notebook_source, MAX_NOTEBOOK_BYTES)
+        except NotebookError as e:
+            logging.info(f"Skipping unreadable notebook {entry.path}: {e}")
+            metrics.files_skipped += 1
+            return None
+    else:
+        data = reader.read(entry.sha, max_size)
+        content = data.decode('utf-8', errors='ignore') if data is not None else None
+    if content is None:
+        logging.info(f"Skipping large or missing file {entry.path}")
+        metrics.files_skipped += 1
+        return None
+    metrics.files_read += 1
+    return content
+
+def read_sampled_files(
+    repo_dir: str,
+    candidates: List[TreeEntry],
+    sampler: AdaptiveSampler,
+    max_size: int = 1_000_000,
+    timeout: int = 300,
+    cache=None,
+    metrics=None,
+    blobless: bool = False
+) -> Optional[List[SourceFile]]:
+    """
+    Read and parse ranked candidate files one at a time until the sampler stops.
+
+    Cache hits cost nothing; other files are passed over when they do not
+    fit the sampler's remaining budget. A blobless clone fetches the blobs
+    of the next SAMPLE_PREFETCH_FILES uncached candidates at a time.
+
+    Args:
+        repo_dir: Clone without a working tree (or a bare mirror)
+        candidates: Files in selection order
+        sampler: AdaptiveSampler holding the budget and the parse function
+        max_size: Skip files larger than this many bytes
+        timeout: Timeout in seconds for each blob fetch
+        cache: Optional ImportCache consulted before reading
+        metrics: RepoMetrics; read and parse time go to their stages and the
+            stop reason to stop_reason
+        blobless: Whether repo_dir is a partial clone without blobs
+
+    Returns:
+        List of parsed SourceFile, or None if the blobs could not be fetched
+    """
+    metrics = metrics if metrics is not None else RepoMetrics(repo_dir)
+    files = []
+    sampler.start()
+    with BlobReader(repo_dir) as reader:
+        for start in range(0, len(candidates), SAMPLE_PREFETCH_FILES):
+            if sampler.done:
+                break
+            window = candidates[start:start + SAMPLE_PREFETCH_FILES]
+            cached = {entry.sha: cache.get(entry.sha) for entry in window} if cache is not None else {}
+            if blobless:
+                missing = sorted({entry.sha for entry in window if cached.get(entry.sha) is None})
+                with metrics.stage("read"):
+                    if not prefetch_blobs(repo_dir, missing, timeout):
+                        return None
+
+            for entry in window:
+                if sampler.done:
+                    break
+                imports = cached.get(entry.sha)
+                if imports is not None:
+                    metrics.cache_hits += 1
+                    files.extend(sampler.add(SourceFile(entry.path, entry.sha, None, imports)))
+                    continue
+                if not sampler.admit(entry.size):
+                    continue
+                with metrics.stage("read"):
+                    content = read_source(reader, entry, max_size, metrics)
+                if content is None:
+                    continue
+                with metrics.stage("parse"):
+                    files.extend(sampler.add(SourceFile(entry.path, entry.sha, content), reader.last_size or 0))
+
+    metrics.files_selected = sampler.files
+    metrics.stop_reason = sampler.finish()
+    return files
+
+def read_selected_files(
+    repo_dir: str,
+    max_files: int = 10,
+    max_size: int = 1_000_000,
+    timeout: int = 300,
+    cache=None,
+    metrics=None,
+    blobless: bool = False,
+    manifests: bool = False,
+    import_parsing: str = "always",
+    first_party: Optional[Set[str]] = None,
+    notebooks: bool = False,
+    near_duplicates=None,
+    sampler: Optional[AdaptiveSampler] = None
+) -> Optional[List[SourceFile]]:
+    """
+    Pick up to max_files Python files from a clone's HEAD tree and read them.
+
+    Files are picked with file_selection.select_files. Blob sizes take part
+    in the selection unless the clone is blobless; a blobless clone only
+    downloads the blobs it reads.
+
+    Args:
+        repo_dir: Clone without a working tree (or a bare mirror)
+        max_files: Maximum number of Python files to read
+        max_size: Skip files larger than this many bytes
+        timeout: Timeout in seconds for each git network operation
+        cache: Optional ImportCache; blobs it already holds are not read
+        metrics: Optional RepoMetrics to record the discover and read stages in
+        blobless: Whether repo_dir is a partial clone without blobs
+        manifests: Also read dependency manifests (see manifests.py) before the
+            Python files; they come back first, with source MANIFEST_SOURCE
+        import_parsing: "always" reads Python files, "no-manifest" only when no
+            manifest declares dependencies, "never" reads manifests only
+        first_party: Optional set the repository's first-party module names
+            (see file_selection.first_party_modules) are added to
+        notebooks: Also pick Jupyter notebooks; their code cells are streamed
+            out of the blob (see notebooks.py) and stand in for the content
+        near_duplicates: Optional NearDuplicateIndex the tree is looked up in
+            (under metrics.repo) before anything is read; a near-duplicate
+            comes back as an empty list with metrics.duplicate_of set; the
+            caller commits the lookup once the results are saved
+        sampler: Optional AdaptiveSampler; every candidate is ranked and files
+            are read and parsed one at a time until it stops (see
+            read_sampled_files), so the files come back parsed
+
+    Returns:
+        List of SourceFile, or None if the blobs could not be fetched
+    """
+    metrics = metrics if metrics is not None else RepoMetrics(repo_dir)
+
+    with metrics.stage("discover"):
+        tree = list_tree(repo_dir, sizes=not blobless)
+        suffixes = (".py", NOTEBOOK_SUFFIX) if notebooks else (".py",)
+        # A sampler decides how many of the ranked candidates are read
+        limit = len(tree) if sampler is not None else max_files
+        selected = select_files(tree, limit, max_size, suffixes) if import_parsing != "never" else []
+        if first_party is not None:
+            first_party.update(first_party_modules([entry.path for entry in tree]))
+    metrics.tree_files = metrics.files_walked = len(tree)
+
+    if near_duplicates is not None:
+        with metrics.stage("fingerprint"):
+            match = near_duplicates.find(metrics.repo, python_blob_shas(tree))
+        if match is not None:
+            metrics.duplicate_of, metrics.duplicate_similarity = match[0], round(match[1], 4)
+            logging.info(f"Skipping {metrics.repo}, a near-duplicate of {match[0]} (similarity {match[1]:.2f})")
+            return []
+
+    files = []
+    if manifests or import_parsing != "always":
+        with metrics.stage("manifest"):
+            files = read_manifests(repo_dir, tree, timeout, blobless)
+        if files is None:
+            return None
+        metrics.manifest_files = len(files)
+        if files and import_parsing == "no-manifest":
+            selected = []
+    metrics.files_selected = len(selected)
+
+    if sampler is not None:
+        sampled = read_sampled_files(repo_dir, selected, sampler, max_size, timeout, cache, metrics, blobless)
+        return files + sampled if sampled is not None else None
+
+    with metrics.stage("read"):
+        to_read = []
+        for entry in selected:
+            imports = cache.get(entry.sha) if cache is not None else None
+            if imports is not None:
+                metrics.cache_hits += 1
+                files.append(SourceFile(entry.path, entry.sha, None, imports))
+            else:
+                to_read.append(entry)
+
+        if blobless and not prefetch_blobs(repo_dir, sorted({entry.sha for entry in to_read}), timeout):
+            return None
+
+        with BlobReader(repo_dir) as reader:
+            for entry in to_read:
+                content = read_source(reader, entry, max_size, metrics)
+                if content is not None:
+                    files.append(SourceFile(entry.path, entry.sha, content))
+    return files
+
+def fetch_selected_files(
+    repo_name: str,
+    dest_dir: str,
+    max_files: int = 10,
+    max_size: int = 1_000_000,
+    timeout: int = 300,
+    cache=None,
+    metrics=None,
+    fetch_mode: str = "partial",
+    manifests: bool = False,
+    import_parsing: str = "always",
+    first_party: Optional[Set[str]] = None,
+    notebooks: bool = False,
+    near_duplicates=None,
+    sampler: Optional[AdaptiveSampler] = None
+) -> Optional[List[SourceFile]]:
+    """
+    Clone a repository without a working tree and read up to max_files of its Python files.
+
+    Args:
+        repo_name: Repository name (owner/repo)
+        dest_dir: Empty directory to hold the clone
+        max_files: Maximum number of Python files to read
+        max_size: Skip files larger than this many bytes
+        timeout: Timeout in seconds for each git network operation
+        cache: Optional ImportCache; blobs it already holds are not read
+        metrics: Optional RepoMetrics to record stage timings and file counts in
+        fetch_mode: "clone" fetches every blob of HEAD, "partial" only the blobs read
+        manifests: Also read dependency manifests (see read_selected_files)
+        import_parsing: When to read Python files (see read_selected_files)
+        first_party: Optional set the repository's first-party module names are added to
+        notebooks: Also read Jupyter notebooks (see read_selected_files)
+        near_duplicates: Optional NearDuplicateIndex to skip near-duplicates with
+            (see read_selected_files)
+        sampler: Optional AdaptiveSampler that decides how many files are read
+            and parses them (see read_selected_files)
+
+    Returns:
+        List of SourceFile, or None if the repository could not be fetched
+    """
+    metrics = metrics if metrics is not None else RepoMetrics(repo_name, fetch_mode)
+    blobless = fetch_mode == "partial"
+
+    with metrics.stage("clone"):
+        if not shallow_clone(repo_name, dest_dir, timeout, blobless=blobless):
+            return None
+
+    files = read_selected_files(
+        dest_dir, max_files, max_size, timeout, cache, metrics, blobless, manifests, import_parsing, first_party,
+        notebooks, near_duplicates, sampler
+    )
+    metrics.clone_bytes = directory_bytes(os.path.join(dest_dir, ".git"))
+    return files
@@ -0,0 +1,251 @@
+# github_client.py
+"""
+Asynchronous GitHub API client
+
+Requests go through one keep-alive `requests.Session` whose connection pool
+is sized to the number of in-flight requests; each blocking call runs in a
+worker thread so many requests can be awaited at once. Quota is tracked per
+rate-limit resource ("core", "search", ...) from the X-RateLimit-* headers
+the server returns: every request takes a token from its resource's bucket,
+and an empty bucket waits until the reset time the server reported.
+Secondary rate limits are retried after the server's Retry-After delay.
+Every request sent also counts against the same hourly guard as the
+synchronous path (github_utils.track_api_request), so the two together
+stay under the Actions quota.
+With a response cache enabled (see github_utils.enable_http_cache) fresh
+entries are served without a request and stale ones are revalidated.
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Mapping, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from github_utils import (
+    GITHUB_API_URL, RateLimitExceeded, get_headers, get_http_cache, track_api_request, untrack_api_request
+)
+from http_cache import HttpCache, cache_key
+
+# Longest we wait for a quota reset or Retry-After before giving up
+DEFAULT_MAX_WAIT = 120
+
+def rate_limit_resource(url: str) -> str:
+    """Rate-limit resource a request counts against before the server says otherwise."""
+    return "search" if "/search/" in url else "core"
+
+class RateLimitBucket:
+    """
+    Token bucket for one rate-limit resource.
+
+    The bucket holds the number of requests left in the current window and
+    refills to the window's limit at the reset time. Until the first
+    response arrives the quota is unknown and requests are not held back.
+    """
+
+    def __init__(self, name: str, max_wait: float = DEFAULT_MAX_WAIT):
+        self.name = name
+        self.max_wait = max_wait
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset: float = 0.0
+        self._lock = asyncio.Lock()
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """Synchronise the bucket with the X-RateLimit-* headers of a response."""
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+            limit = int(headers.get("X-RateLimit-Limit", remaining))
+        except (KeyError, ValueError):
+            return
+        if reset != self.reset or self.remaining is None:
+            # New window
+            self.limit, self.remaining, self.reset = limit, remaining, reset
+        else:
+            # Requests still in flight are already taken off the local count
+            self.remaining = min(self.remaining, remaining)
+
+    def drain(self, reset: Optional[float] = None) -> None:
+        """Mark the bucket empty until reset (e.g. after a rate-limit error)."""
+        self.remaining = 0
+        if reset is not None:
+            self.reset = reset
+
+    async def acquire(self) -> None:
+        """
+        Take one token, waiting for the window to reset if the bucket is empty.
+
+        Raises:
+            RateLimitExceeded: If the reset is further away than max_wait
+        """
+        async with self._lock:
+            while self.remaining is not None and self.remaining <= 0:
+                wait_time = self.reset - time.time()
+                if wait_time > self.max_wait:
+                    logging.error(f"Rate limit for {self.name} exhausted. Would reset in {wait_time/60:.1f} minutes.")
+                    raise RateLimitExceeded(f"GitHub API {self.name} rate limit exceeded")
+                if wait_time > 0:
+                    logging.info(f"Rate limit for {self.name} exhausted, waiting {wait_time:.0f} seconds for reset")
+                    await asyncio.sleep(wait_time + 1)
+                # Refilled; the next response corrects the count
+                self.remaining = self.limit
+            if self.remaining is not None:
+                self.remaining -= 1
+
+class AsyncGitHubClient:
+    """
+    Pooled, rate-limit-aware GitHub API client for asyncio.
+
+    Usage:
+        async with AsyncGitHubClient(max_in_flight=8) as client:
+            data = await client.get(f"{GITHUB_API_URL}/search/repositories", params)
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        max_retries: int = 3,
+        timeout: float = 30,
+        http_cache: Optional[HttpCache] = None
+    ):
+        """
+        Args:
+            max_in_flight: Maximum number of concurrent requests (and pooled connections)
+            max_wait: Longest wait for a quota reset or Retry-After before raising
+            max_retries: Retries after secondary rate limits and rate-limit errors
+            timeout: Per-request timeout in seconds
+            http_cache: Response cache (defaults to the one enabled in github_utils)
+        """
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.buckets: Dict[str, RateLimitBucket] = {}
+        self.requests_made = 0
+        self.http_cache = http_cache if http_cache is not None else get_http_cache()
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self._session.close()
+
+    def bucket(self, resource: str) -> RateLimitBucket:
+        """Bucket for a rate-limit resource, created on first use."""
+        if resource not in self.buckets:
+            self.buckets[resource] = RateLimitBucket(resource, self.max_wait)
+        return self.buckets[resource]
+
+    async def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        use_cache: bool = True,
+        counted: bool = True
+    ) -> Dict[str, Any]:
+        """
+        GET an API URL and return the parsed JSON response.
+
+        Args:
+            url: The API URL to request
+            params: Optional query parameters
+            use_cache: Whether the response cache may answer or store this request
+            counted: Whether the request counts against the hourly request guard
+                (False for endpoints GitHub does not charge, such as /rate_limit)
+
+        Raises:
+            RateLimitExceeded: If the quota does not reset within max_wait, or
+                the hourly request guard shared with the synchronous client is reached
+            RequestException: For other request errors
+        """
+        http_cache = self.http_cache if use_cache else None
+        key = cache_key(url, params)
+        cached = None
+        if http_cache is not None:
+            cached = await asyncio.to_thread(http_cache.get, key)
+            if cached is not None and http_cache.is_fresh(cached):
+                http_cache.record_hit()
+                return cached.body
+
+        bucket = self.bucket(rate_limit_resource(url))
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            if counted:
+                # Shared with make_github_request; raises once the hourly guard is reached
+                track_api_request()
+            async with self._semaphore:
+                headers = get_headers()
+                headers.update(HttpCache.conditional_headers(cached))
+                try:
+                    response = await asyncio.to_thread(
+                        self._session.get, url, headers=headers, params=params, timeout=self.timeout
+                    )
+                except requests.exceptions.RequestException as e:
+                    logging.warning(f"Request error for {url}: {e}")
+                    raise
+            self.requests_made += 1
+
+            # The server names the resource; it may differ from the guess
+            bucket = self.bucket(response.headers.get("X-RateLimit-Resource", bucket.name))
+            bucket.update(response.headers)
+
+            if response.status_code == 304 and cached is not None:
+                if counted:
+                    untrack_api_request()
+                await asyncio.to_thread(http_cache.refresh, key)
+                return cached.body
+
+            if response.status_code in (403, 429):
+                retry_after = response.headers.get("Retry-After")
+                if retry_after is not None:
+                    # Secondary rate limit
+                    delay = float(retry_after)
+                    if delay > self.max_wait or attempt == self.max_retries:
+                        raise RateLimitExceeded(f"GitHub API secondary rate limit (Retry-After {delay:.0f}s)")
+                    logging.warning(f"Secondary rate limit for {url}, retrying in {delay:.0f} seconds")
+                    await asyncio.sleep(delay)
+                    continue
+                if response.headers.get("X-RateLimit-Remaining") == "0":
+                    if attempt == self.max_retries:
+                        raise RateLimitExceeded(f"GitHub API {bucket.name} rate limit exceeded")
+                    bucket.drain()
+                    continue
+
+            if response.status_code == 404:
+                logging.warning(f"Resource not found: {url}")
+            elif response.status_code == 451:
+                logging.warning(f"Resource unavailable for legal reasons (451): {url}")
+
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                logging.warning(f"HTTP error for {url}: {e}")
+                raise
+            data = response.json()
+            if http_cache is not None:
+                await asyncio.to_thread(http_cache.put, key, data, response.headers)
+            return data
+
+        raise RateLimitExceeded(f"GitHub API rate limit retries exhausted for {url}")
+
+async def fetch_rate_limits(client: AsyncGitHubClient) -> Dict[str, Any]:
+    """Fetch /rate_limit (not counted against the quota) and seed the client's buckets."""
+    data = await client.get(f"{GITHUB_API_URL}/rate_limit", use_cache=False, counted=False)
+    for resource, values in data.get("resources", {}).items():
+        client.bucket(resource).update({
+            "X-RateLimit-Remaining": str(values["remaining"]),
+            "X-RateLimit-Reset": str(values["reset"]),
+            "X-RateLimit-Limit": str(values["limit"])
+        })
+    return data
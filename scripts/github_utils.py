@@ -7,9 +7,14 @@ import json
 import requests
 from typing import Dict, Any, Optional, Tuple, List
 from requests.exceptions import RequestException
+from import_store import FIELDS, COLUMNAR_SUFFIX, IMPORT_SOURCE, append_segment
+from http_cache import HttpCache, cache_key
 
 # Constants
-GITHUB_API_URL = "https://api.github.com"
+# API base URL (point it at a local stub server for offline runs)
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+# Base URL repositories are cloned from (a file:// path works for offline runs)
+GIT_BASE_URL = os.environ.get("GIT_BASE_URL", "https://github.com").rstrip("/")
 GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -27,6 +32,12 @@ logging.basicConfig(
 api_requests_count = 0
 api_request_reset_time = time.time() + 3600  # Start with assumption of 1 hour window
 
+# Shared session so sequential requests reuse keep-alive connections
+_session = requests.Session()
+
+# Optional on-disk response cache, see enable_http_cache
+_http_cache: Optional[HttpCache] = None
+
 class RateLimitExceeded(Exception):
     """Exception raised when GitHub API rate limit is exceeded."""
     pass
@@ -67,6 +78,31 @@ def track_api_request():
     if api_requests_count % 100 == 0:
         logging.info(f"API request count: {api_requests_count}/1000 for this hour")
 
+def untrack_api_request():
+    """Take back a tracked request the server did not count (a 304 Not Modified)."""
+    global api_requests_count
+    api_requests_count = max(0, api_requests_count - 1)
+
+def enable_http_cache(db_path: str, ttl: float = 600, max_bytes: int = 256 * 1024 * 1024) -> HttpCache:
+    """
+    Cache API responses on disk and revalidate them with conditional requests.
+    
+    Args:
+        db_path: Path to the SQLite cache database
+        ttl: Seconds a stored response is served without revalidation
+        max_bytes: Total response size kept before least recently used entries are evicted
+        
+    Returns:
+        The cache, whose stats() report hits and quota saved
+    """
+    global _http_cache
+    _http_cache = HttpCache(db_path, ttl, max_bytes)
+    return _http_cache
+
+def get_http_cache() -> Optional[HttpCache]:
+    """The response cache enabled with enable_http_cache, if any."""
+    return _http_cache
+
 def make_github_request(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Make a request to GitHub API with GitHub Actions limits in mind.
@@ -82,11 +118,25 @@ def make_github_request(url: str, params: Optional[Dict[str, Any]] = None) -> Di
         RateLimitExceeded: If limits are reached
         RequestException: For other request errors
     """
+    key = cache_key(url, params)
+    cached = _http_cache.get(key) if _http_cache is not None else None
+    if cached is not None and _http_cache.is_fresh(cached):
+        _http_cache.record_hit()
+        return cached.body
+    
     # Track this request against our hourly quota
     track_api_request()
     
     try:
-        response = requests.get(url, headers=get_headers(), params=params)
+        headers = get_headers()
+        headers.update(HttpCache.conditional_headers(cached))
+        response = _session.get(url, headers=headers, params=params)
+        
+        # Not modified: served from disk, and not counted against the quota
+        if response.status_code == 304 and cached is not None:
+            untrack_api_request()
+            _http_cache.refresh(key)
+            return cached.body
         
         # Handle rate limiting - no retry, just report the error
         if response.status_code == 403 and 'X-RateLimit-Remaining' in response.headers:
@@ -104,7 +154,10 @@ def make_github_request(url: str, params: Optional[Dict[str, Any]] = None) -> Di
             logging.warning(f"Resource unavailable for legal reasons (451): {url}")
         
         response.raise_for_status()
-        return response.json()
+        data = response.json()
+        if _http_cache is not None:
+            _http_cache.put(key, data, response.headers)
+        return data
     
     except requests.exceptions.HTTPError as e:
         logging.warning(f"HTTP error for {url}: {e}")
@@ -121,19 +174,28 @@ def is_runtime_expired(start_time: float, max_runtime_seconds: int = 21000) -> b
     elapsed_time = time.time() - start_time
     return elapsed_time > max_runtime_seconds
 
-def save_results(results: List[Tuple], output_file: str, format_json=True):
-    """Save results to a file."""
+def save_results(results: List[Tuple], output_file: str, format_json=True, storage: Optional[str] = None):
+    """
+    Save results to a file.
+    
+    storage selects "jsonl" (one JSON object per row) or "columnar" (one
+    dictionary-encoded segment per call, see import_store). By default files
+    ending in COLUMNAR_SUFFIX are written as columnar segments.
+    """
+    if storage is None:
+        storage = "columnar" if output_file.endswith(COLUMNAR_SUFFIX) else "jsonl"
+    if storage == "columnar":
+        append_segment(output_file, results, FIELDS)
+        return
+    
     with open(output_file, 'a') as f:
         for result in results:
             if format_json:
                 # Convert tuple to dictionary
-                result_obj = {
-                    "library": result[0],
-                    "repo": result[1],
-                    "file_path": result[2],
-                    "fetch_date": result[3],
-                    "last_updated": result[4]
-                }
+                result_obj = dict(zip(FIELDS, result))
+                if result_obj.get("source") == IMPORT_SOURCE:
+                    # Rows without a source are imports (see import_store.record_source)
+                    del result_obj["source"]
                 f.write(json.dumps(result_obj) + '\n')
             else:
                 # Write as CSV-like format
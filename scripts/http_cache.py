@@ -0,0 +1,168 @@
+# http_cache.py
+"""
+Conditional-request cache for GitHub API responses
+
+Stores response bodies with their ETag and Last-Modified validators in
+SQLite, keyed by URL and query parameters. Entries younger than the TTL are
+served straight from disk; older ones are revalidated with If-None-Match /
+If-Modified-Since, and a 304 reply is answered from disk. GitHub does not
+count 304 responses to authenticated requests against the primary rate
+limit, so both cases save quota. Entries are evicted least-recently-used
+once the stored bodies exceed max_bytes.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import urlencode
+from typing import Any, Dict, Mapping, NamedTuple, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used);
+"""
+
+class CachedResponse(NamedTuple):
+    """A stored response body with its validators."""
+    body: Any
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+def cache_key(url: str, params: Optional[Mapping[str, Any]] = None) -> str:
+    """Canonical cache key for a GET request."""
+    if not params:
+        return url
+    return f"{url}?{urlencode(sorted(params.items()))}"
+
+class HttpCache:
+    """On-disk cache of API responses revalidated with conditional requests."""
+
+    def __init__(self, db_path: str, ttl: float = 600, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Open (and create if needed) a cache database.
+
+        Args:
+            db_path: Path to the SQLite database file
+            ttl: Seconds a stored response is served without revalidation
+            max_bytes: Total body size kept before least recently used entries are evicted
+        """
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        # Shared by the sync client and the async client's worker threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        Look up a stored response, marking the entry as recently used.
+
+        Returns:
+            The stored response, or None if there is none
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return CachedResponse(json.loads(row[0]), row[1], row[2], row[3])
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        """Whether an entry can be served without revalidation."""
+        return time.time() - entry.stored_at < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CachedResponse]) -> Dict[str, str]:
+        """Request headers that revalidate a stored entry."""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def record_hit(self) -> None:
+        """Count a response served from disk without a request."""
+        with self.lock:
+            self.hits += 1
+
+    def refresh(self, key: str) -> None:
+        """Restart the TTL of an entry after a 304 response."""
+        with self.lock:
+            self.revalidated += 1
+            self.conn.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+
+    def put(self, key: str, body: Any, headers: Mapping[str, str]) -> None:
+        """
+        Store a 200 response body with its validators.
+
+        Args:
+            key: Cache key from cache_key()
+            body: Parsed JSON body
+            headers: Response headers (ETag and Last-Modified are kept)
+        """
+        data = json.dumps(body)
+        now = time.time()
+        with self.lock:
+            self.misses += 1
+            self.conn.execute("BEGIN")
+            try:
+                row = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, etag, last_modified, body, size, stored_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, headers.get("ETag"), headers.get("Last-Modified"), data, len(data), now, now)
+                )
+                self.size += len(data) - (row[0] if row else 0)
+                if self.size > self.max_bytes:
+                    self._evict()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache fits max_bytes."""
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if self.size <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.size -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters, requests saved from the quota and current size."""
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "quota_saved": self.hits + self.revalidated,
+            "evictions": self.evictions,
+            "bytes": self.size
+        }
@@ -0,0 +1,128 @@
+# import_cache.py
+"""
+Content-addressed import cache
+
+Maps a file's git blob SHA to the set of libraries extracted from it, so
+identical files shared across forks, templates and vendored copies are only
+parsed once. Entries are evicted least-recently-used once the cache holds
+more than max_entries, and the whole cache is dropped when the extractor
+version key changes.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS imports (
+    blob_sha TEXT PRIMARY KEY,
+    libraries TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_imports_last_used ON imports(last_used);
+"""
+
+class ImportCache:
+    """On-disk LRU cache of extracted imports keyed by git blob SHA."""
+
+    def __init__(self, db_path: str, version: str, max_entries: int = 500_000):
+        """
+        Open (and create if needed) a cache database.
+
+        Args:
+            db_path: Path to the SQLite database file
+            version: Extractor version key; a different key invalidates all entries
+            max_entries: Number of entries kept before least recently used ones are evicted
+        """
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The pipeline looks up and stores entries from several fetch threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != version:
+            if row is not None:
+                logging.info("Extractor version changed, clearing import cache")
+            self.conn.execute("DELETE FROM imports")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+        self.size = self.conn.execute("SELECT COUNT(*) FROM imports").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, blob_sha: str) -> Optional[Set[str]]:
+        """
+        Look up the imports of a blob, marking the entry as recently used.
+
+        Returns:
+            Set of library names, or None on a cache miss
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT libraries FROM imports WHERE blob_sha = ?", (blob_sha,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE imports SET last_used = ? WHERE blob_sha = ?", (time.time(), blob_sha))
+            return set(json.loads(row[0]))
+
+    def put_many(self, entries: Iterable[Tuple[str, Set[str]]]) -> None:
+        """
+        Store the imports of several blobs; blobs already cached are left untouched.
+
+        Args:
+            entries: Iterable of tuples (blob_sha, libraries)
+        """
+        now = time.time()
+        rows = [(sha, json.dumps(sorted(libraries)), now) for sha, libraries in entries if sha]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                before = self.conn.total_changes
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO imports (blob_sha, libraries, last_used) VALUES (?, ?, ?)",
+                    rows
+                )
+                self.size += self.conn.total_changes - before
+                if self.size > self.max_entries:
+                    self._evict(self.size - self.max_entries)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, count: int) -> None:
+        """Delete the `count` least recently used entries."""
+        cursor = self.conn.execute(
+            "DELETE FROM imports WHERE blob_sha IN "
+            "(SELECT blob_sha FROM imports ORDER BY last_used LIMIT ?)",
+            (count,)
+        )
+        self.size -= cursor.rowcount
+        self.evictions += cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": self.size
+        }
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Columnar Import Storage
+
+Append-only segment format for import records. Each save appends one
+segment holding a small JSON header and one dictionary-encoded column per
+field: the distinct values are stored once in the header and every row is
+an integer index into them. Repeated repo names, file paths and dates are
+therefore stored once per segment instead of once per row, and readers can
+count a column without decoding any per-row JSON.
+
+Segment layout:
+    MAGIC (8 bytes) | header length (uint32, little-endian) | header JSON | column data
+
+Usage:
+    python import_store.py convert data/imports.jsonl data/imports.seg
+    python import_store.py export data/imports.seg data/imports.jsonl
+"""
+import os
+import sys
+import json
+import struct
+import argparse
+from array import array
+from collections import Counter
+from typing import Collection, Dict, Iterator, List, Optional, Sequence, Tuple
+
+MAGIC = b"IMPSEG1\n"
+COLUMNAR_SUFFIX = ".seg"
+
+# Field names of result tuples, in order
+FIELDS = ("library", "repo", "file_path", "fetch_date", "last_updated", "source")
+
+# Where a record's library name comes from: an import statement in a source
+# file, or a dependency declared in a manifest (see manifests.py)
+IMPORT_SOURCE = "import"
+MANIFEST_SOURCE = "manifest"
+SOURCES = (IMPORT_SOURCE, MANIFEST_SOURCE)
+
+_LENGTH = struct.Struct("<I")
+
+def is_columnar_file(path: str) -> bool:
+    """Check whether a file starts with a columnar segment."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def record_source(record: Dict[str, str]) -> str:
+    """Source of a record; records written before sources were recorded are imports."""
+    return record.get("source") or IMPORT_SOURCE
+
+def record_row(record: Dict[str, str]) -> Tuple:
+    """Result tuple of a record, in FIELDS order."""
+    return tuple(record_source(record) if field == "source" else record.get(field, "") for field in FIELDS)
+
+def _index_array(values: Sequence[int], distinct: int) -> array:
+    column = array("H" if distinct <= 0xFFFF else "I", values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+def encode_segment(rows: Sequence[Sequence], fields: Sequence[str] = FIELDS) -> bytes:
+    """
+    Encode rows as one segment.
+
+    Args:
+        rows: Result tuples, one value per field
+        fields: Field names of the tuple positions
+
+    Returns:
+        Encoded segment bytes
+    """
+    columns = []
+    data = []
+    offset = 0
+    for position, name in enumerate(fields):
+        dictionary: Dict[str, int] = {}
+        indexes = [dictionary.setdefault(row[position], len(dictionary)) for row in rows]
+        column = _index_array(indexes, len(dictionary))
+        raw = column.tobytes()
+        columns.append({
+            "name": name,
+            "values": list(dictionary),
+            "type": column.typecode,
+            "offset": offset,
+            "bytes": len(raw)
+        })
+        data.append(raw)
+        offset += len(raw)
+
+    header = json.dumps({"rows": len(rows), "data_bytes": offset, "columns": columns}).encode("utf-8")
+    return MAGIC + _LENGTH.pack(len(header)) + header + b"".join(data)
+
+def append_segment(path: str, rows: Sequence[Sequence], fields: Sequence[str] = FIELDS) -> None:
+    """Append rows to a columnar file as a new segment."""
+    if not rows:
+        return
+    with open(path, "ab") as f:
+        f.write(encode_segment(rows, fields))
+
+def read_segment_header(f, file_size: int) -> Optional[Tuple[Dict, int]]:
+    """
+    Read the segment header at the current position.
+
+    Returns:
+        Tuple of (header, data_start), or None at end of file or for an incomplete segment
+    """
+    start = f.tell()
+    prefix = f.read(len(MAGIC) + _LENGTH.size)
+    if len(prefix) < len(MAGIC) + _LENGTH.size:
+        return None
+    if prefix[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"Corrupt segment at byte {start}")
+    header_length = _LENGTH.unpack(prefix[len(MAGIC):])[0]
+    data_start = start + len(prefix) + header_length
+    if data_start > file_size:
+        return None
+    header = json.loads(f.read(header_length))
+    if data_start + header["data_bytes"] > file_size:
+        return None
+    return header, data_start
+
+def _read_column(f, data_start: int, column: Dict) -> array:
+    f.seek(data_start + column["offset"])
+    values = array(column["type"])
+    values.frombytes(f.read(column["bytes"]))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def count_column(
+    f,
+    start: int = 0,
+    field: str = "library",
+    sources: Optional[Collection[str]] = None
+) -> Tuple[Counter, int]:
+    """
+    Count the values of one column across the complete segments of a file.
+
+    Args:
+        f: Columnar file opened in binary mode
+        start: Byte offset of the first segment to read
+        field: Column to count
+        sources: Only count rows with one of these sources (all rows if None)
+
+    Returns:
+        Tuple of (Counter of values, offset after the last complete segment)
+    """
+    file_size = os.fstat(f.fileno()).st_size
+    counter = Counter()
+    offset = start
+    f.seek(offset)
+    while True:
+        segment = read_segment_header(f, file_size)
+        if segment is None:
+            break
+        header, data_start = segment
+        columns = {column["name"]: column for column in header["columns"]}
+        column = columns.get(field)
+        source_column = columns.get("source")
+        if column is not None and sources is not None and source_column is None:
+            # Segments written before sources were recorded hold imports only
+            if IMPORT_SOURCE not in sources:
+                column = None
+        if column is not None:
+            values = column["values"]
+            indexes = _read_column(f, data_start, column)
+            if sources is not None and source_column is not None:
+                wanted = {index for index, source in enumerate(source_column["values"]) if source in sources}
+                source_indexes = _read_column(f, data_start, source_column)
+                indexes = [index for index, source in zip(indexes, source_indexes) if source in wanted]
+            for index, count in Counter(indexes).items():
+                counter[values[index]] += count
+        offset = data_start + header["data_bytes"]
+        f.seek(offset)
+    return counter, offset
+
+def iter_segment_records(f, start: int = 0) -> Iterator[Tuple[List[Dict[str, str]], int]]:
+    """
+    Yield the records of each complete segment from a byte offset.
+
+    Args:
+        f: Columnar file opened in binary mode
+        start: Byte offset of the first segment to read
+
+    Returns:
+        Iterator of tuples (records of one segment, offset after that segment)
+    """
+    file_size = os.fstat(f.fileno()).st_size
+    f.seek(start)
+    while True:
+        segment = read_segment_header(f, file_size)
+        if segment is None:
+            break
+        header, data_start = segment
+        names = [column["name"] for column in header["columns"]]
+        decoded = [
+            [column["values"][index] for index in _read_column(f, data_start, column)]
+            for column in header["columns"]
+        ]
+        end = data_start + header["data_bytes"]
+        yield [dict(zip(names, row)) for row in zip(*decoded)], end
+        f.seek(end)
+
+def iter_records(path: str) -> Iterator[Dict[str, str]]:
+    """Yield every record of a columnar file as a dictionary."""
+    with open(path, "rb") as f:
+        for records, _ in iter_segment_records(f):
+            yield from records
+
+def convert_jsonl(input_file: str, output_file: str, chunk_rows: int = 100_000) -> int:
+    """
+    Convert an imports JSON Lines file to the columnar format.
+
+    Args:
+        input_file: Path to the JSON Lines file
+        output_file: Path to the columnar file (appended to)
+        chunk_rows: Rows per segment
+
+    Returns:
+        Number of rows converted
+    """
+    total = 0
+    rows: List[Tuple] = []
+    with open(input_file, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping invalid JSON line: {line[:50]}...")
+                continue
+            rows.append(record_row(data))
+            if len(rows) >= chunk_rows:
+                append_segment(output_file, rows)
+                total += len(rows)
+                rows = []
+    append_segment(output_file, rows)
+    return total + len(rows)
+
+def export_jsonl(input_file: str, output_file: str) -> int:
+    """
+    Write the records of a columnar file as JSON Lines.
+
+    Returns:
+        Number of rows written
+    """
+    total = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        for record in iter_records(input_file):
+            f.write(json.dumps(record) + "\n")
+            total += 1
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert import records between JSON Lines and columnar segments")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert JSON Lines to columnar segments")
+    convert_parser.add_argument("input_file", help="Path to the input JSON Lines file")
+    convert_parser.add_argument("output_file", help="Path to the output columnar file")
+    convert_parser.add_argument("--chunk-rows", type=int, default=100_000, help="Rows per segment")
+
+    export_parser = subparsers.add_parser("export", help="Export columnar segments as JSON Lines")
+    export_parser.add_argument("input_file", help="Path to the input columnar file")
+    export_parser.add_argument("output_file", help="Path to the output JSON Lines file")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        if os.path.exists(args.output_file):
+            parser.error(f"{args.output_file} already exists")
+        rows = convert_jsonl(args.input_file, args.output_file, args.chunk_rows)
+    else:
+        rows = export_jsonl(args.input_file, args.output_file)
+    print(f"Wrote {rows} rows to {args.output_file}")
@@ -7,9 +7,19 @@ import time
 from typing import Optional
 
 # Import functionality from other modules
-from github_utils import is_runtime_expired
-from find_repos import find_random_repos
-from analyze_imports import process_repo_from_file
+from github_utils import is_runtime_expired, enable_http_cache
+from find_repos import find_random_repos, BACKENDS
+from analyze_imports import (
+    process_repo_from_file, process_repo_from_queue, load_unprocessed_repos, open_import_cache, open_mirror_cache,
+    open_near_duplicate_index, AnalysisOptions,
+    FETCH_MODES, ENGINES, IMPORT_PARSING
+)
+from pipeline import run_pipeline
+from metrics import MetricsRecorder
+from sampling import SampleBudget
+from parse_sandbox import ParseSandbox
+from repo_queue import RepoQueue
+from sharding import shard_file, in_shard, load_shard_repos
 
 # Configure logging
 logging.basicConfig(
@@ -70,7 +80,38 @@ def run_incremental_process(
     min_stars: int = 5,
     language: str = "python",
     max_files: int = 10,
-    max_runtime: int = 21000  # ~6 hours minus buffer
+    max_runtime: int = 21000,  # ~6 hours minus buffer
+    workers: int = 1,
+    parse_procs: Optional[int] = None,
+    queue_db: Optional[str] = None,
+    fetch_mode: str = "clone",
+    import_cache: Optional[str] = None,
+    engine: str = "ast",
+    find_backend: str = "search",
+    archive_dir: str = "gharchive",
+    per_hour: int = 10,
+    http_cache: Optional[str] = None,
+    metrics_file: Optional[str] = None,
+    metrics_prom: Optional[str] = None,
+    sandbox: bool = True,
+    parse_timeout: float = 30,
+    parse_cpu_limit: int = 10,
+    parse_memory_limit: int = 2048,
+    mirror_cache: Optional[str] = None,
+    mirror_cache_gb: float = 20,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    manifests: bool = False,
+    import_parsing: str = "always",
+    notebooks: bool = False,
+    dedup_index: Optional[str] = None,
+    dedup_threshold: float = 0.8,
+    adaptive: bool = False,
+    sample_bytes: int = 2_000_000,
+    sample_seconds: float = 30.0,
+    sample_patience: int = 5,
+    schedule: bool = False,
+    cost_model: Optional[str] = None
 ) -> None:
     """
     Run the incremental process:
@@ -87,6 +128,47 @@ def run_incremental_process(
         language: Programming language filter
         max_files: Maximum number of Python files to analyze per repository
         max_runtime: Maximum runtime in seconds
+        workers: Number of concurrent clone jobs (1 processes repos one at a time)
+        parse_procs: Number of sandboxed parser processes (defaults to the CPU count)
+        queue_db: Optional SQLite work queue used instead of scanning processed_file
+        fetch_mode: "clone" for a full shallow clone, "partial" to fetch only the Python blobs read
+        import_cache: Optional SQLite cache of extracted imports keyed by blob SHA
+        engine: Import extraction engine, "ast" or the streaming "scan"
+        find_backend: Where to sample new repositories from, "search" or "gharchive"
+        archive_dir: Directory of local or cached GHArchive files
+        per_hour: Maximum repositories the gharchive backend takes from each hourly archive
+        http_cache: Optional SQLite cache of GitHub API responses revalidated with ETags
+        metrics_file: Optional JSONL file for per-repository metrics and the run summary
+        metrics_prom: Optional Prometheus textfile for the run's metrics
+        sandbox: Parse files in worker processes with the limits below
+        parse_timeout: Wall-clock seconds allowed per parsed file
+        parse_cpu_limit: CPU seconds allowed per parsed file
+        parse_memory_limit: Address space limit of a parser process in megabytes
+        mirror_cache: Optional directory of persistent bare mirrors; repeat visits
+            fetch incrementally and only read blobs missing from the import cache
+        mirror_cache_gb: Disk size of the mirror cache before least recently used mirrors are evicted
+        shard_index: This worker's shard when shard_count > 1
+        shard_count: Number of workers sharing the repository list; each only processes
+            its shard and writes to shard files that sharding.py merges
+        manifests: Also record the dependencies declared in requirements files,
+            setup.py/setup.cfg, pyproject.toml, Pipfile and environment.yml
+        import_parsing: Parse Python files "always", only for repositories whose
+            manifests declare nothing ("no-manifest"), or "never"
+        notebooks: Also extract imports from the code cells of Jupyter notebooks
+        dedup_index: Optional SQLite MinHash index of analyzed repositories; repositories
+            whose Python files are near-duplicates of an indexed one are not read
+        dedup_threshold: Estimated file similarity at which a repository is a near-duplicate
+        adaptive: Read and parse files one at a time, stopping once sample_patience
+            files in a row add no new library or a budget below is spent; max_files
+            becomes the upper bound
+        sample_bytes: Bytes of file content read per repository when adaptive
+        sample_seconds: Seconds of reading and parsing per repository when adaptive
+        sample_patience: Files without a new library before adaptive sampling stops
+        schedule: Order the batch by the processing time predicted from repository
+            metadata and history, and only start repositories predicted to finish
+            before max_runtime runs out
+        cost_model: Optional JSON state file of the cost model, updated with every
+            repository completed so later runs predict from this one's times
     """
     start_time = time.time()
     logging.info("Starting incremental process")
@@ -96,39 +178,168 @@ def run_incremental_process(
     os.makedirs(os.path.dirname(imports_file) if os.path.dirname(imports_file) else '.', exist_ok=True)
     os.makedirs(os.path.dirname(processed_file) if os.path.dirname(processed_file) else '.', exist_ok=True)
     
+    sharded = shard_count > 1
+    shard_filter = None
+    if sharded:
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Shard index {shard_index} is out of range for {shard_count} shards")
+        logging.info(f"Running shard {shard_index} of {shard_count}")
+        # Shared files are only read; this worker appends to its own shard files
+        base_repos_file, base_processed_file = repos_file, processed_file
+        repos_file = shard_file(repos_file, shard_index, shard_count)
+        imports_file = shard_file(imports_file, shard_index, shard_count)
+        processed_file = shard_file(processed_file, shard_index, shard_count)
+        shard_filter = lambda repo_name: in_shard(repo_name, shard_index, shard_count)
+
+    queue = None
+    if queue_db:
+        queue = RepoQueue(queue_db)
+        if not queue.stats():
+            # First run against this queue: carry over the processed history
+            logging.info(f"Importing processed repositories from {processed_file}")
+            queue.import_processed_file(processed_file)
+        if sharded:
+            # Merges add to the shared processed file between runs
+            queue.import_processed_file(base_processed_file)
+            queue.import_repos_file(base_repos_file, accept=shard_filter)
+        queue.import_repos_file(repos_file, accept=shard_filter)
+    
+    if mirror_cache and not import_cache:
+        # Unchanged blobs of re-analyzed repositories are answered by the import cache
+        import_cache = os.path.join(mirror_cache, "imports.db")
+    cache = open_import_cache(import_cache, engine)
+    mirrors = open_mirror_cache(mirror_cache, mirror_cache_gb)
+    near_duplicates = open_near_duplicate_index(dedup_index, dedup_threshold)
+    sample_budget = SampleBudget(sample_bytes, sample_seconds, sample_patience) if adaptive else None
+    response_cache = enable_http_cache(http_cache) if http_cache else None
+    recorder = MetricsRecorder(metrics_file, metrics_prom) if metrics_file or metrics_prom else None
+    parse_sandbox = None
+    if sandbox:
+        # A repository's files are spread over all the parser processes
+        parse_sandbox = ParseSandbox(parse_procs, parse_cpu_limit, parse_memory_limit, parse_timeout)
+    
     # Step 1: Find repositories if needed
-    if not enough_unprocessed_repos(repos_file, processed_file):
+    if queue is not None:
+        enough = queue.count() >= 5
+    elif sharded:
+        enough = len(load_shard_repos(
+            [base_repos_file, repos_file], [base_processed_file, processed_file], shard_index, shard_count, limit=5
+        )) >= 5
+    else:
+        enough = enough_unprocessed_repos(repos_file, processed_file)
+    if not enough:
         logging.info(f"Finding {repos_to_find} new repositories")
         find_random_repos(
             count=repos_to_find,
             min_stars=min_stars,
             language=language,
-            output_file=repos_file
+            output_file=repos_file,
+            backend=find_backend,
+            archive_dir=archive_dir,
+            per_hour=per_hour
         )
+        if queue is not None:
+            queue.import_repos_file(repos_file, accept=shard_filter)
     
     # Step 2: Process repositories
-    processed_count = 0
-    for i in range(repos_to_process):
-        # Check if we're approaching runtime limits
-        elapsed_time = time.time() - start_time
-        if elapsed_time > max_runtime:
-            logging.warning("Approaching runtime limit, stopping early")
-            break
-        
-        logging.info(f"Processing repository {i+1}/{repos_to_process}")
-        if process_repo_from_file(
-            repo_file=repos_file,
-            output_file=imports_file,
+    deadline = start_time + max_runtime
+    options = AnalysisOptions(
+        max_files=max_files,
+        fetch_mode=fetch_mode,
+        cache=cache,
+        engine=engine,
+        sandbox=parse_sandbox,
+        mirrors=mirrors,
+        manifests=manifests,
+        import_parsing=import_parsing,
+        notebooks=notebooks,
+        near_duplicates=near_duplicates,
+        sample_budget=sample_budget,
+        deadline=deadline
+    )
+    if workers > 1 or sharded or schedule:
+        if queue is not None:
+            # Leased one at a time as they start (see run_pipeline)
+            repos = queue.pending(repos_to_process)
+        elif sharded:
+            repos = load_shard_repos(
+                [base_repos_file, repos_file], [base_processed_file, processed_file],
+                shard_index, shard_count, limit=repos_to_process
+            )
+        else:
+            repos = load_unprocessed_repos(repos_file, processed_file, limit=repos_to_process)
+        scheduler = None
+        if schedule:
+            from scheduler import CostModel, RunScheduler, load_repo_metadata
+            # The queue does not keep repository metadata; it is looked up in repos.jsonl
+            metadata = load_repo_metadata([base_repos_file, repos_file] if sharded else [repos_file])
+            scheduler = RunScheduler(CostModel(cost_model), metadata, deadline, workers)
+        processed_count = run_pipeline(
+            repos,
+            options=options,
+            imports_file=imports_file,
             processed_file=processed_file,
-            max_files=max_files
-        ):
-            processed_count += 1
+            workers=workers,
+            queue=queue,
+            recorder=recorder,
+            scheduler=scheduler
+        )
+    else:
+        processed_count = 0
+        for i in range(repos_to_process):
+            # Check if we're approaching runtime limits
+            elapsed_time = time.time() - start_time
+            if elapsed_time > max_runtime:
+                logging.warning("Approaching runtime limit, stopping early")
+                break
         
-        # Small delay between repositories
-        time.sleep(1)
+            logging.info(f"Processing repository {i+1}/{repos_to_process}")
+            if queue is not None:
+                success = process_repo_from_queue(
+                    queue,
+                    options=options,
+                    output_file=imports_file,
+                    processed_file=processed_file,
+                    recorder=recorder
+                )
+            else:
+                success = process_repo_from_file(
+                    repo_file=repos_file,
+                    options=options,
+                    output_file=imports_file,
+                    processed_file=processed_file,
+                    recorder=recorder
+                )
+            if success:
+                processed_count += 1
+        
+            # Small delay between repositories
+            time.sleep(1)
     
     elapsed_time = time.time() - start_time
     logging.info(f"Processed {processed_count}/{repos_to_process} repositories in {elapsed_time:.2f} seconds")
+    if cache is not None:
+        logging.info(f"Import cache: {cache.stats()}")
+    if response_cache is not None:
+        logging.info(f"HTTP cache: {response_cache.stats()}")
+    if mirrors is not None:
+        logging.info(f"Mirror cache: {mirrors.stats()}")
+    if near_duplicates is not None:
+        logging.info(f"Near-duplicate index: {near_duplicates.stats()}")
+    sandbox_report = None
+    if parse_sandbox is not None:
+        parse_sandbox.close()
+        sandbox_report = parse_sandbox.report()
+        logging.info(f"Parse sandbox: {sandbox_report['files_parsed']} files parsed, killed {sandbox_report['killed']}, "
+                     f"{sandbox_report['restarts']} worker restarts")
+    if recorder is not None:
+        recorder.write_summary(
+            elapsed_seconds=round(elapsed_time, 3),
+            processed=processed_count,
+            requested=repos_to_process,
+            workers=workers,
+            sandbox=sandbox_report
+        )
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Incremental GitHub repository analysis")
@@ -140,6 +351,41 @@ if __name__ == "__main__":
     parser.add_argument("--min-stars", type=int, default=5, help="Minimum stars for random repo search")
     parser.add_argument("--language", type=str, default="python", help="Programming language filter")
     parser.add_argument("--max-files", type=int, default=10, help="Maximum number of Python files to analyze per repository")
+    parser.add_argument("--max-runtime", type=int, default=21000, help="Maximum runtime in seconds (~6 hours minus buffer)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of concurrent clone jobs")
+    parser.add_argument("--parse-procs", type=int, default=None, help="Number of parser processes (defaults to the CPU count)")
+    parser.add_argument("--fetch-mode", type=str, default="clone", choices=FETCH_MODES, help="How to fetch repository contents")
+    parser.add_argument("--import-cache", type=str, default=None, help="SQLite cache of imports keyed by blob SHA")
+    parser.add_argument("--engine", type=str, default="ast", choices=ENGINES, help="Import extraction engine")
+    parser.add_argument("--mirror-cache", type=str, default=None, help="Directory of persistent bare mirrors for re-analysis")
+    parser.add_argument("--mirror-cache-gb", type=float, default=20, help="Disk size of the mirror cache before LRU eviction")
+    parser.add_argument("--find-backend", type=str, default="search", choices=BACKENDS, help="Where to sample new repositories from")
+    parser.add_argument("--archive-dir", type=str, default="gharchive", help="Directory of GHArchive files")
+    parser.add_argument("--per-hour", type=int, default=10, help="Maximum repositories taken from each GHArchive hour")
+    parser.add_argument("--http-cache", type=str, default=None, help="SQLite cache of API responses revalidated with ETags")
+    parser.add_argument("--metrics-file", type=str, default=None, help="JSONL file for per-repository metrics and run summaries")
+    parser.add_argument("--metrics-prom", type=str, default=None, help="Prometheus textfile for run metrics")
+    parser.add_argument("--parse-timeout", type=float, default=30, help="Wall-clock seconds allowed per parsed file")
+    parser.add_argument("--parse-cpu-limit", type=int, default=10, help="CPU seconds allowed per parsed file")
+    parser.add_argument("--parse-memory-limit", type=int, default=2048, help="Address space limit of a parser process in MB")
+    parser.add_argument("--no-sandbox", action="store_true", help="Parse files in this process without limits")
+    parser.add_argument("--queue-db", type=str, default=None, help="SQLite work queue to use instead of scanning the processed file")
+    parser.add_argument("--manifests", action="store_true", help="Also record dependencies declared in manifest files")
+    parser.add_argument("--import-parsing", type=str, default="always", choices=IMPORT_PARSING,
+                        help="Parse Python files always, only for repositories without manifests, or never")
+    parser.add_argument("--notebooks", action="store_true", help="Also extract imports from Jupyter notebook code cells")
+    parser.add_argument("--dedup-index", type=str, default=None, help="SQLite MinHash index to skip near-duplicate repositories with")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8, help="Estimated file similarity of a near-duplicate")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Sample files until imports saturate or the budget is spent, up to --max-files")
+    parser.add_argument("--sample-bytes", type=int, default=2_000_000, help="Bytes read per repository when sampling adaptively")
+    parser.add_argument("--sample-seconds", type=float, default=30.0, help="Seconds spent reading and parsing per repository when sampling adaptively")
+    parser.add_argument("--sample-patience", type=int, default=5, help="Files in a row without a new library before sampling stops")
+    parser.add_argument("--schedule", action="store_true",
+                        help="Order repositories by predicted cost and only start those predicted to finish in time")
+    parser.add_argument("--cost-model", type=str, default=None, help="JSON state file of the repository cost model")
+    parser.add_argument("--shard-index", type=int, default=0, help="Shard of the repository list this worker processes")
+    parser.add_argument("--shard-count", type=int, default=1, help="Number of shards; results go to shard files merged by sharding.py")
     
     args = parser.parse_args()
     
@@ -151,5 +397,37 @@ if __name__ == "__main__":
         repos_to_process=args.repos_to_process,
         min_stars=args.min_stars,
         language=args.language,
-        max_files=args.max_files
+        max_files=args.max_files,
+        max_runtime=args.max_runtime,
+        workers=args.workers,
+        parse_procs=args.parse_procs,
+        queue_db=args.queue_db,
+        fetch_mode=args.fetch_mode,
+        import_cache=args.import_cache,
+        engine=args.engine,
+        find_backend=args.find_backend,
+        archive_dir=args.archive_dir,
+        per_hour=args.per_hour,
+        http_cache=args.http_cache,
+        metrics_file=args.metrics_file,
+        metrics_prom=args.metrics_prom,
+        sandbox=not args.no_sandbox,
+        parse_timeout=args.parse_timeout,
+        parse_cpu_limit=args.parse_cpu_limit,
+        parse_memory_limit=args.parse_memory_limit,
+        mirror_cache=args.mirror_cache,
+        mirror_cache_gb=args.mirror_cache_gb,
+        shard_index=args.shard_index,
+        shard_count=args.shard_count,
+        manifests=args.manifests,
+        import_parsing=args.import_parsing,
+        notebooks=args.notebooks,
+        dedup_index=args.dedup_index,
+        dedup_threshold=args.dedup_threshold,
+        adaptive=args.adaptive,
+        sample_bytes=args.sample_bytes,
+        sample_seconds=args.sample_seconds,
+        sample_patience=args.sample_patience,
+        schedule=args.schedule,
+        cost_model=args.cost_model
     )
\ No newline at end of file
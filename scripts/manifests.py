@@ -0,0 +1,312 @@
+# manifests.py
+"""
+Dependency manifest harvesting
+
+Reads the dependencies a repository declares in requirements*.txt,
+setup.py, setup.cfg, pyproject.toml, Pipfile or environment.yml. One small
+manifest can stand in for parsing many source files, so these are read from
+the tree before any Python file (see git_fetch.read_selected_files) and
+recorded with source "manifest". Names are distribution names normalized
+per PEP 503 ("Django", "django_rest" -> "django", "django-rest"), which is
+not always the imported module name (scikit-learn vs sklearn), so counts
+keep the two sources apart.
+
+Only runtime dependencies are taken from structured manifests: optional,
+development and build-system requirements are left out. Every line of a
+requirements file counts, whatever the file's name.
+"""
+import re
+import ast
+import posixpath
+import configparser
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    import tomllib
+except ImportError:
+    # Python < 3.11: fall back to _read_toml_subset
+    tomllib = None
+
+from file_selection import is_excluded, is_low_priority
+
+# How import parsing relates to manifests: always parse Python files, only
+# when no manifest declares dependencies, or never
+IMPORT_PARSING = ("always", "no-manifest", "never")
+
+# Manifest file names other than requirements files
+MANIFEST_NAMES = {
+    "setup.py", "setup.cfg", "pyproject.toml", "Pipfile", "environment.yml", "environment.yaml"
+}
+
+# Most manifests read per repository, shallowest first
+MAX_MANIFESTS = 10
+
+# Manifests larger than this are skipped
+MAX_MANIFEST_BYTES = 256 * 1024
+
+# Names that are never dependencies of the project (conda and Poetry list the interpreter)
+IGNORED_NAMES = {"python", "pip"}
+
+REQUIREMENT_NAME = re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?")
+EGG_FRAGMENT = re.compile(r"#egg=([A-Za-z0-9][A-Za-z0-9._-]*)")
+TOML_TABLE = re.compile(r"^\[\s*([^\[\]]+?)\s*\]\s*(?:#.*)?$")
+TOML_KEY = re.compile(r"""^("[^"]*"|'[^']*'|[A-Za-z0-9_.-]+)\s*=\s*(.*)$""")
+TOML_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"|\'([^\']*)\'')
+
+def normalize_name(name: str) -> str:
+    """PEP 503 normalized form of a distribution name."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def is_manifest(path: str) -> bool:
+    """Whether a repository path is a dependency manifest."""
+    name = posixpath.basename(path)
+    if name in MANIFEST_NAMES:
+        return True
+    if not name.endswith(".txt"):
+        return False
+    # requirements-dev.txt, requirements/base.txt
+    return name.startswith("requirements") or posixpath.basename(posixpath.dirname(path)) == "requirements"
+
+def select_manifests(entries: Sequence[Tuple[str, str, Optional[int]]]) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    Choose the manifests to read from a tree listing.
+
+    Manifests in vendored, build, test, documentation and example directories
+    are skipped; the rest are taken shallowest first.
+
+    Args:
+        entries: Tree entries as (path, blob_sha, size)
+
+    Returns:
+        Up to MAX_MANIFESTS entries
+    """
+    candidates = [
+        entry for entry in entries
+        if is_manifest(entry[0]) and not is_excluded(entry[0]) and not is_low_priority(entry[0])
+        and (entry[2] is None or 0 < entry[2] <= MAX_MANIFEST_BYTES)
+    ]
+    return sorted(candidates, key=lambda entry: (entry[0].count('/'), entry[0]))[:MAX_MANIFESTS]
+
+def requirement_name(spec: str) -> Optional[str]:
+    """
+    Distribution name of a PEP 508 requirement or pip requirement line.
+
+    Returns:
+        Normalized name, or None for options, paths and URLs without an #egg= name
+    """
+    spec = spec.strip()
+    egg = EGG_FRAGMENT.search(spec)
+    if egg:
+        return normalize_name(egg.group(1))
+    if not spec or spec.startswith(("-", ".", "/")) or "://" in spec.split("@")[0]:
+        return None
+    match = REQUIREMENT_NAME.match(spec)
+    if match is None:
+        return None
+    rest = spec[match.end():].lstrip()
+    # The name must be followed by extras, a version, a marker or a URL
+    if rest and rest[0] not in "[<>=!~;@(,":
+        return None
+    return normalize_name(match.group(0))
+
+def parse_requirements(content: str) -> Set[str]:
+    """Names in a pip requirements file; -r/-c includes are not followed."""
+    names = set()
+    # Backslash continuations join lines
+    for line in content.replace("\\\n", " ").splitlines():
+        line = line.strip()
+        if line.startswith("#"):
+            continue
+        if line.startswith(("-e ", "--editable")):
+            line = line.split(None, 1)[-1] if " " in line else ""
+        else:
+            line = re.split(r"\s#", line, 1)[0]
+        name = requirement_name(line)
+        if name:
+            names.add(name)
+    return names
+
+def _literal_strings(node: ast.AST, assignments: Dict[str, ast.AST]) -> List[str]:
+    """String elements of a list/tuple literal, following one level of module-level names."""
+    if isinstance(node, ast.Name) and node.id in assignments:
+        node = assignments[node.id]
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return [element.value for element in node.elts
+                if isinstance(element, ast.Constant) and isinstance(element.value, str)]
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value.splitlines()
+    return []
+
+def parse_setup_py(content: str) -> Set[str]:
+    """install_requires of a setup() call whose value is a literal or a module-level list."""
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return set()
+    assignments = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            assignments[node.targets[0].id] = node.value
+    names = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        func_name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        if func_name != "setup":
+            continue
+        for keyword in node.keywords:
+            if keyword.arg == "install_requires":
+                names.update(filter(None, map(requirement_name, _literal_strings(keyword.value, assignments))))
+    return names
+
+def parse_setup_cfg(content: str) -> Set[str]:
+    """install_requires of the [options] section of a setup.cfg."""
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read_string(content)
+    except configparser.Error:
+        return set()
+    value = parser.get("options", "install_requires", fallback="")
+    return {name for name in map(requirement_name, value.splitlines()) if name}
+
+def _toml_strings(value: str) -> List[str]:
+    return [double if double else single for double, single in TOML_STRING.findall(value)]
+
+def _read_toml_subset(content: str) -> Dict[str, Dict[str, str]]:
+    """
+    Raw values of the keys of each table of a TOML document.
+
+    Only what manifests need is understood: [table] headers, key = value
+    pairs and arrays spanning lines. Values are returned unparsed.
+    """
+    tables: Dict[str, Dict[str, str]] = {}
+    table: Optional[Dict[str, str]] = tables.setdefault("", {})
+    key, pending = None, None
+    for line in content.splitlines():
+        stripped = line.strip()
+        if pending is not None:
+            pending += " " + stripped
+            if pending.count("[") <= pending.count("]"):
+                table[key] = pending
+                pending = None
+            continue
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped.startswith("[["):
+            # Arrays of tables hold nothing manifests need
+            table = None
+            continue
+        header = TOML_TABLE.match(stripped)
+        if header:
+            table = tables.setdefault(header.group(1).replace('"', "").replace(" ", ""), {})
+            continue
+        match = TOML_KEY.match(stripped)
+        if match is None or table is None:
+            continue
+        key, value = match.group(1).strip("\"'"), match.group(2)
+        if value.startswith("[") and value.count("[") > value.count("]"):
+            pending = value
+        else:
+            table[key] = value
+    return tables
+
+def _toml_tables(content: str) -> Optional[Dict[str, Dict[str, object]]]:
+    """Tables of a TOML document keyed by dotted name, with values as lists of strings or raw text."""
+    if tomllib is None:
+        tables = _read_toml_subset(content)
+        return {name: {key: _toml_strings(value) if value.startswith("[") else value
+                       for key, value in table.items()}
+                for name, table in tables.items()}
+    try:
+        document = tomllib.loads(content)
+    except (tomllib.TOMLDecodeError, ValueError):
+        return None
+    tables = {}
+
+    def flatten(prefix: str, table: Dict) -> None:
+        tables[prefix] = table
+        for key, value in table.items():
+            if isinstance(value, dict):
+                flatten(f"{prefix}.{key}" if prefix else key, value)
+
+    flatten("", document)
+    return tables
+
+def _is_optional(value: object) -> bool:
+    """Whether a Poetry dependency value marks the dependency optional (an extra)."""
+    if isinstance(value, dict):
+        return bool(value.get("optional"))
+    return isinstance(value, str) and re.search(r"optional\s*=\s*true", value) is not None
+
+def parse_pyproject(content: str) -> Set[str]:
+    """[project] dependencies and [tool.poetry.dependencies] of a pyproject.toml."""
+    tables = _toml_tables(content)
+    if tables is None:
+        return set()
+    names = set()
+    dependencies = tables.get("project", {}).get("dependencies")
+    if isinstance(dependencies, list):
+        names.update(filter(None, (requirement_name(spec) for spec in dependencies if isinstance(spec, str))))
+    for key, value in tables.get("tool.poetry.dependencies", {}).items():
+        if not _is_optional(value):
+            names.add(normalize_name(key))
+    return names - IGNORED_NAMES
+
+def parse_pipfile(content: str) -> Set[str]:
+    """[packages] of a Pipfile."""
+    tables = _toml_tables(content)
+    if tables is None:
+        return set()
+    return {normalize_name(key) for key in tables.get("packages", {})} - IGNORED_NAMES
+
+def parse_environment_yml(content: str) -> Set[str]:
+    """Conda and pip dependencies of a conda environment file."""
+    names = set()
+    in_dependencies = False
+    for line in content.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        if not line[0].isspace() and not line.startswith("-"):
+            in_dependencies = line.split(":", 1)[0].strip() == "dependencies"
+            continue
+        stripped = line.strip()
+        if not in_dependencies or not stripped.startswith("-"):
+            continue
+        spec = stripped[1:].strip().strip("\"'")
+        if not spec or spec.endswith(":"):
+            # The "- pip:" header of the nested pip list
+            continue
+        if "::" in spec:
+            # conda-forge::numpy
+            spec = spec.split("::", 1)[1]
+        # Conda pins use single "=" (numpy=1.26=py311_0), which pip syntax lacks
+        spec = re.sub(r"(?<![=<>!~])=(?!=)", "==", spec, count=1)
+        name = requirement_name(spec)
+        if name:
+            names.add(name)
+    return names - IGNORED_NAMES
+
+def parse_manifest(path: str, content: str) -> Set[str]:
+    """
+    Declared dependencies of a manifest file.
+
+    Args:
+        path: Repository path of the manifest (its name selects the format)
+        content: File content
+
+    Returns:
+        Set of PEP 503 normalized distribution names
+    """
+    name = posixpath.basename(path)
+    if name == "setup.py":
+        return parse_setup_py(content)
+    if name == "setup.cfg":
+        return parse_setup_cfg(content)
+    if name == "pyproject.toml":
+        return parse_pyproject(content)
+    if name == "Pipfile":
+        return parse_pipfile(content)
+    if name in ("environment.yml", "environment.yaml"):
+        return parse_environment_yml(content)
+    return parse_requirements(content)
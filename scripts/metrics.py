@@ -0,0 +1,275 @@
+# metrics.py
+"""
+Per-repository processing metrics
+
+Every processed repository gets a RepoMetrics record with the wall time of
+each stage (clone, discover, fingerprint, manifest, read, parse, save), bytes cloned, tree size,
+files walked versus parsed, per-file parse times and import cache hits.
+Peak resident memory is a process-wide high-water mark shared by all
+pipeline threads, so a repository record only carries the mark as it
+stood when the repository finished; the run summary reports the run's
+peak. A MetricsRecorder appends the records to a JSON Lines
+file, keeps the samples for a run-level summary with p50/p95/p99 per stage,
+and can write everything as a Prometheus textfile for node_exporter's
+textfile collector.
+"""
+import os
+import json
+import math
+import time
+import resource
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+# Stages timed for each repository, in pipeline order
+STAGES = ("clone", "discover", "fingerprint", "manifest", "read", "parse", "save")
+
+# Quantiles reported in run summaries and Prometheus summaries
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Prefix of the exported Prometheus metric names
+PROMETHEUS_PREFIX = "repo_analysis"
+
+def directory_bytes(path: str) -> int:
+    """Total size of the files under a directory."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+    return total
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending sequence (0.0 if empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class RepoMetrics:
+    """Timings and counters collected while processing one repository."""
+
+    def __init__(self, repo_name: str, fetch_mode: str = "clone", engine: str = "ast"):
+        self.repo = repo_name
+        self.fetch_mode = fetch_mode
+        self.engine = engine
+        self.status = "ok"
+        self.started = time.time()
+        self.stages: Dict[str, float] = {}
+        self.clone_bytes = 0
+        self.tree_files = 0
+        self.files_walked = 0
+        self.files_selected = 0
+        self.manifest_files = 0
+        self.files_read = 0
+        self.files_skipped = 0
+        self.files_parsed = 0
+        self.files_killed = 0
+        self.cache_hits = 0
+        # Set when the repository was skipped as a near-duplicate (see near_duplicates.py)
+        self.duplicate_of: Optional[str] = None
+        self.duplicate_similarity: Optional[float] = None
+        # Why adaptive sampling stopped reading files (see sampling.STOP_REASONS)
+        self.stop_reason: Optional[str] = None
+        self.parse_times: List[float] = []
+        self.imports = 0
+        # High-water marks of the whole process and of its largest finished child
+        # when the repository finished; they never go down, so they are not this
+        # repository's own memory use
+        self.process_peak_rss_kb = 0
+        self.process_children_peak_rss_kb = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block of work and add it to the stage's wall time."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def record_parsed(self, files) -> None:
+        """Collect per-file parse times from files returned by extract_file_imports."""
+        for file in files:
+            if file.parse_time is not None:
+                self.files_parsed += 1
+                self.parse_times.append(file.parse_time)
+
+    def finish(self, imports: int = 0, status: Optional[str] = None) -> None:
+        """Set the outcome and sample the peak memory of this process and its finished children (git) so far."""
+        if status is not None:
+            self.status = status
+        self.imports = imports
+        # ru_maxrss is in kilobytes on Linux
+        self.process_peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.process_children_peak_rss_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": "repo",
+            "repo": self.repo,
+            "fetch_mode": self.fetch_mode,
+            "engine": self.engine,
+            "status": self.status,
+            "started": self.started,
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "total_seconds": round(time.time() - self.started, 6),
+            "clone_bytes": self.clone_bytes,
+            "tree_files": self.tree_files,
+            "files_walked": self.files_walked,
+            "files_selected": self.files_selected,
+            "manifest_files": self.manifest_files,
+            "files_read": self.files_read,
+            "files_skipped": self.files_skipped,
+            "files_parsed": self.files_parsed,
+            "files_killed": self.files_killed,
+            "cache_hits": self.cache_hits,
+            "duplicate_of": self.duplicate_of,
+            "duplicate_similarity": self.duplicate_similarity,
+            "stop_reason": self.stop_reason,
+            "parse_times": [round(seconds, 6) for seconds in self.parse_times],
+            "imports": self.imports,
+            "process_peak_rss_kb": self.process_peak_rss_kb,
+            "process_children_peak_rss_kb": self.process_children_peak_rss_kb
+        }
+
+class MetricsRecorder:
+    """Collects RepoMetrics records of a run and writes them out."""
+
+    def __init__(self, jsonl_file: Optional[str] = None, prometheus_file: Optional[str] = None):
+        """
+        Args:
+            jsonl_file: JSON Lines file each repository record is appended to
+            prometheus_file: Prometheus textfile rewritten by write_prometheus
+        """
+        self.jsonl_file = jsonl_file
+        self.prometheus_file = prometheus_file
+        self.lock = threading.Lock()
+        self.stage_samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self.parse_samples: List[float] = []
+        self.status_counts: Dict[str, int] = {}
+        self.stop_reason_counts: Dict[str, int] = {}
+        self.totals: Dict[str, int] = {
+            "clone_bytes": 0, "tree_files": 0, "files_walked": 0, "manifest_files": 0, "files_read": 0,
+            "files_parsed": 0, "files_killed": 0, "cache_hits": 0, "imports": 0
+        }
+        self.peak_rss_kb = 0
+        self.children_peak_rss_kb = 0
+
+    def record(self, metrics: RepoMetrics) -> None:
+        """Add a finished repository's metrics and append them to the JSONL file."""
+        record = metrics.to_dict()
+        with self.lock:
+            for stage, seconds in metrics.stages.items():
+                self.stage_samples.setdefault(stage, []).append(seconds)
+            self.parse_samples.extend(metrics.parse_times)
+            self.status_counts[metrics.status] = self.status_counts.get(metrics.status, 0) + 1
+            if metrics.stop_reason is not None:
+                self.stop_reason_counts[metrics.stop_reason] = self.stop_reason_counts.get(metrics.stop_reason, 0) + 1
+            for key in self.totals:
+                self.totals[key] += record[key]
+            self.peak_rss_kb = max(self.peak_rss_kb, metrics.process_peak_rss_kb)
+            self.children_peak_rss_kb = max(self.children_peak_rss_kb, metrics.process_children_peak_rss_kb)
+            if self.jsonl_file:
+                with open(self.jsonl_file, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+
+    def _quantiles(self, samples: List[float]) -> Dict[str, float]:
+        ordered = sorted(samples)
+        summary = {f"p{round(q * 100)}": round(percentile(ordered, q), 6) for q in QUANTILES}
+        summary["count"] = len(ordered)
+        summary["total"] = round(sum(ordered), 6)
+        return summary
+
+    def summary(self) -> Dict:
+        """Run-level summary: p50/p95/p99 per stage and per-file parse time, plus totals."""
+        with self.lock:
+            return {
+                "type": "run_summary",
+                "repos": dict(self.status_counts),
+                "stop_reasons": dict(self.stop_reason_counts),
+                "stages": {stage: self._quantiles(samples) for stage, samples in self.stage_samples.items() if samples},
+                "file_parse": self._quantiles(self.parse_samples),
+                "totals": dict(self.totals),
+                "peak_rss_kb": self.peak_rss_kb,
+                "children_peak_rss_kb": self.children_peak_rss_kb
+            }
+
+    def write_summary(self, **extra) -> Dict:
+        """
+        Append the run summary to the JSONL file and rewrite the Prometheus textfile.
+
+        Args:
+            extra: Additional fields for the summary record (e.g. elapsed time)
+
+        Returns:
+            The summary record
+        """
+        summary = {**self.summary(), **extra, "finished": time.time()}
+        if self.jsonl_file:
+            with self.lock, open(self.jsonl_file, 'a') as f:
+                f.write(json.dumps(summary) + '\n')
+        self.write_prometheus()
+        for stage, values in summary["stages"].items():
+            logging.info(f"Stage {stage}: p50 {values['p50']:.3f}s, p95 {values['p95']:.3f}s, p99 {values['p99']:.3f}s over {values['count']} repos")
+        return summary
+
+    def write_prometheus(self) -> None:
+        """Atomically write the collected metrics in the Prometheus text format."""
+        if not self.prometheus_file:
+            return
+        prefix = PROMETHEUS_PREFIX
+        summary = self.summary()
+        lines = [
+            f"# HELP {prefix}_repos_total Repositories processed, by outcome",
+            f"# TYPE {prefix}_repos_total counter"
+        ]
+        for status, count in sorted(summary["repos"].items()):
+            lines.append(f'{prefix}_repos_total{{status="{status}"}} {count}')
+
+        if summary["stop_reasons"]:
+            lines += [
+                f"# HELP {prefix}_sampling_stops_total Repositories sampled adaptively, by why sampling stopped",
+                f"# TYPE {prefix}_sampling_stops_total counter"
+            ]
+            for reason, count in sorted(summary["stop_reasons"].items()):
+                lines.append(f'{prefix}_sampling_stops_total{{reason="{reason}"}} {count}')
+
+        lines += [
+            f"# HELP {prefix}_stage_seconds Wall time per repository of each processing stage",
+            f"# TYPE {prefix}_stage_seconds summary"
+        ]
+        for stage, values in summary["stages"].items():
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{q}"}} {values[f"p{round(q * 100)}"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {values["total"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+
+        parse = summary["file_parse"]
+        lines += [
+            f"# HELP {prefix}_file_parse_seconds Import extraction time per file",
+            f"# TYPE {prefix}_file_parse_seconds summary"
+        ]
+        for q in QUANTILES:
+            lines.append(f'{prefix}_file_parse_seconds{{quantile="{q}"}} {parse[f"p{round(q * 100)}"]}')
+        lines.append(f"{prefix}_file_parse_seconds_sum {parse['total']}")
+        lines.append(f"{prefix}_file_parse_seconds_count {parse['count']}")
+
+        for key, value in summary["totals"].items():
+            lines += [f"# TYPE {prefix}_{key}_total counter", f"{prefix}_{key}_total {value}"]
+
+        lines += [
+            f"# HELP {prefix}_peak_rss_bytes Peak resident memory of the analysis process and of its git subprocesses",
+            f"# TYPE {prefix}_peak_rss_bytes gauge",
+            f'{prefix}_peak_rss_bytes{{process="self"}} {summary["peak_rss_kb"] * 1024}',
+            f'{prefix}_peak_rss_bytes{{process="children"}} {summary["children_peak_rss_kb"] * 1024}'
+        ]
+
+        tmp_file = self.prometheus_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_file, self.prometheus_file)
@@ -0,0 +1,254 @@
+# mirror_cache.py
+"""
+Persistent bare-mirror cache
+
+Keeps a shallow bare mirror of every analyzed repository on disk so a
+repository can be re-analyzed later without cloning it again: a repeat
+visit runs an incremental `git fetch` of the new HEAD into the mirror, and
+files whose blobs did not change are answered by the import cache without
+being read (or, for blobless mirrors, downloaded). Mirrors are evicted
+least-recently-used once their total size on disk exceeds max_bytes.
+
+The cache directory is meant to be used by one run at a time; fetch threads
+within a run may share it.
+"""
+import os
+import time
+import uuid
+import shutil
+import sqlite3
+import logging
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from git_fetch import repo_clone_url, shallow_clone
+from metrics import RepoMetrics, directory_bytes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirrors (
+    repo TEXT PRIMARY KEY,
+    blobless INTEGER NOT NULL,
+    head TEXT,
+    bytes INTEGER NOT NULL,
+    packed_bytes INTEGER NOT NULL,
+    visits INTEGER NOT NULL,
+    fetched REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mirrors_last_used ON mirrors(last_used);
+"""
+
+def rev_parse(repo_dir: str, rev: str = "HEAD", timeout: int = 60) -> Optional[str]:
+    """Object id of a revision, or None if it does not resolve."""
+    process = subprocess.run(
+        ["git", "rev-parse", "--verify", "--quiet", rev],
+        cwd=repo_dir, capture_output=True, text=True, timeout=timeout
+    )
+    return process.stdout.strip() if process.returncode == 0 else None
+
+def fetch_head(repo_name: str, repo_dir: str, blobless: bool, timeout: int = 300) -> bool:
+    """
+    Fetch the remote HEAD's latest commit into a shallow mirror and move HEAD to it.
+
+    Returns:
+        True if the fetch succeeded, False otherwise
+    """
+    blob_filter = ["--filter=blob:none"] if blobless else []
+    process = subprocess.run(
+        ["git", "fetch", "--quiet", "--no-tags", "--depth", "1", *blob_filter,
+         repo_clone_url(repo_name), "HEAD"],
+        cwd=repo_dir, capture_output=True, text=True, timeout=timeout
+    )
+    if process.returncode != 0:
+        logging.error(f"Failed to update mirror of {repo_name}: {process.stderr}")
+        return False
+    # HEAD is a symbolic ref, so this moves the mirrored branch
+    process = subprocess.run(
+        ["git", "update-ref", "HEAD", "FETCH_HEAD"],
+        cwd=repo_dir, capture_output=True, text=True, timeout=timeout
+    )
+    return process.returncode == 0
+
+class MirrorCache:
+    """Directory of shallow bare mirrors with an SQLite index and LRU eviction by size."""
+
+    def __init__(self, root_dir: str, max_bytes: int = 20 * 1024 ** 3):
+        """
+        Open (and create if needed) a mirror cache.
+
+        Args:
+            root_dir: Directory holding the mirrors and their index
+            max_bytes: Total size of the mirrors kept before least recently used ones are evicted
+        """
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root_dir, "mirrors"), exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # Signalled when a repository's mirror is released
+        self.released = threading.Condition(self.lock)
+        self.in_use: Set[str] = set()
+        self.conn = sqlite3.connect(
+            os.path.join(root_dir, "mirrors.db"), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def mirror_dir(self, repo_name: str) -> str:
+        """Directory of a repository's mirror."""
+        owner, _, name = repo_name.partition('/')
+        if not owner or not name or '/' in name or owner in ('.', '..') or name in ('.', '..'):
+            raise ValueError(f"Invalid repository name: {repo_name}")
+        return os.path.join(self.root_dir, "mirrors", owner, f"{name}.git")
+
+    def _row(self, repo_name: str) -> Optional[Tuple]:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT blobless, head, bytes, packed_bytes, visits FROM mirrors WHERE repo = ?", (repo_name,)
+            ).fetchone()
+
+    @contextmanager
+    def open(
+        self,
+        repo_name: str,
+        fetch_mode: str = "partial",
+        timeout: int = 300,
+        metrics: Optional[RepoMetrics] = None
+    ) -> Iterator[Optional[Tuple[str, bool]]]:
+        """
+        Bring a repository's mirror up to date and hold it for reading.
+
+        A new mirror is a blobless partial clone when fetch_mode is "partial";
+        an existing mirror keeps the kind it was created with.
+
+        Args:
+            repo_name: Repository name (owner/repo)
+            fetch_mode: "clone" or "partial", for new mirrors
+            timeout: Timeout in seconds for the clone or fetch
+            metrics: Optional RepoMetrics; the clone stage and clone_bytes (bytes
+                added to the mirror) are recorded in it
+
+        Yields:
+            Tuple of (mirror directory, whether it is blobless), or None if the
+            repository could not be fetched
+        """
+        metrics = metrics if metrics is not None else RepoMetrics(repo_name, fetch_mode)
+        repo_dir = self.mirror_dir(repo_name)
+        with self.released:
+            while repo_name in self.in_use:
+                self.released.wait()
+            self.in_use.add(repo_name)
+
+        try:
+            with metrics.stage("clone"):
+                mirror = self._update(repo_name, repo_dir, fetch_mode, timeout, metrics)
+            yield mirror
+        finally:
+            with self.released:
+                self.in_use.discard(repo_name)
+                self.released.notify_all()
+            self._evict()
+
+    def _update(
+        self,
+        repo_name: str,
+        repo_dir: str,
+        fetch_mode: str,
+        timeout: int,
+        metrics: RepoMetrics
+    ) -> Optional[Tuple[str, bool]]:
+        row = self._row(repo_name)
+        # A mirror of an empty repository has no HEAD to fetch into, so it is cloned again
+        if row is not None and row[1] is not None and os.path.isdir(repo_dir):
+            blobless, old_head, old_bytes, packed_bytes, visits = row
+            blobless = bool(blobless)
+            try:
+                updated = fetch_head(repo_name, repo_dir, blobless, timeout)
+            except subprocess.TimeoutExpired:
+                logging.error(f"Timeout while updating mirror of {repo_name}")
+                updated = False
+            if not updated:
+                with self.lock:
+                    self.failures += 1
+                return None
+            with self.lock:
+                self.hits += 1
+            head = rev_parse(repo_dir)
+            if head == old_head:
+                logging.info(f"Mirror of {repo_name} is up to date")
+        else:
+            blobless = fetch_mode == "partial"
+            old_bytes, packed_bytes, visits = 0, 0, 0
+            shutil.rmtree(repo_dir, ignore_errors=True)
+            os.makedirs(os.path.dirname(repo_dir), exist_ok=True)
+            if not shallow_clone(repo_name, repo_dir, timeout, blobless=blobless, bare=True):
+                shutil.rmtree(repo_dir, ignore_errors=True)
+                with self.lock:
+                    self.failures += 1
+                return None
+            with self.lock:
+                self.misses += 1
+            head = rev_parse(repo_dir)
+
+        size = directory_bytes(repo_dir)
+        if packed_bytes and size > 2 * packed_bytes:
+            # Each visit leaves the previous commit's objects behind
+            subprocess.run(["git", "gc", "--quiet", "--prune=now"], cwd=repo_dir, capture_output=True, timeout=timeout)
+            size = directory_bytes(repo_dir)
+            packed_bytes = size
+        metrics.clone_bytes = max(size - old_bytes, 0)
+
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO mirrors (repo, blobless, head, bytes, packed_bytes, visits, fetched, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (repo_name, int(blobless), head, size, packed_bytes or size, visits + 1, now, now)
+            )
+        return repo_dir, blobless
+
+    def _evict(self) -> None:
+        """Delete least recently used mirrors that are not in use until the cache fits max_bytes."""
+        trash = []
+        with self.lock:
+            total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM mirrors").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for repo_name, size in self.conn.execute("SELECT repo, bytes FROM mirrors ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                if repo_name in self.in_use:
+                    continue
+                self.conn.execute("DELETE FROM mirrors WHERE repo = ?", (repo_name,))
+                repo_dir = self.mirror_dir(repo_name)
+                if os.path.isdir(repo_dir):
+                    # Renamed under the lock so a new mirror of the repository can't collide with the deletion
+                    doomed = os.path.join(self.root_dir, f"evicted-{uuid.uuid4().hex}")
+                    os.rename(repo_dir, doomed)
+                    trash.append(doomed)
+                total -= size
+                self.evictions += 1
+        for doomed in trash:
+            shutil.rmtree(doomed, ignore_errors=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters, number of mirrors and their total size."""
+        with self.lock:
+            mirrors, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM mirrors").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "evictions": self.evictions,
+            "mirrors": mirrors,
+            "bytes": total
+        }
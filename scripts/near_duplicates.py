@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate repository detection
+
+Forks, course templates and mirrors share most of their files, so analyzing
+each of them costs a full fetch and parse for imports that are already
+counted. Before any blob is read, a repository's Python files are
+fingerprinted from its tree listing: the MinHash signature of its set of
+blob SHAs estimates the Jaccard similarity of its files with those of
+another repository, without any content. Signatures of analyzed
+repositories are kept in a SQLite locality-sensitive hashing (LSH) index:
+each signature is split into bands and only repositories sharing a band
+are compared, so a lookup touches a handful of rows however large the
+index grows.
+
+A repository whose estimated similarity to an indexed one reaches the
+threshold is not read. Lookups (find) happen on the fetch threads, but the
+index only changes once a repository's results are saved (commit): a new
+repository is indexed, and a near-duplicate is recorded as a duplicate of
+its original. A repository whose fetch fails or is cut off never becomes
+an original its forks are skipped against. With --fetch-mode partial (or a mirror cache) the
+tree listing comes from a blobless clone, so a duplicate costs no blob
+download at all.
+
+Usage:
+    python near_duplicates.py duplicates --index data/near_duplicates.db
+    python near_duplicates.py stats --index data/near_duplicates.db
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Signature length; the estimated similarity has standard error sqrt(J(1-J)/NUM_PERM)
+NUM_PERM = 128
+
+# LSH bands of NUM_PERM // BANDS rows. Repositories sharing any band are
+# compared; with 16 bands of 8 rows, pairs at similarity 0.8 are found with
+# probability 0.95 and pairs at 0.5 are compared with probability 0.06
+BANDS = 16
+
+# Seed of the permutations; signatures are only comparable with the same one
+SEED = 20240501
+
+# Repositories with fewer Python files are not fingerprinted: they are cheap
+# to analyze and one shared boilerplate file makes them look alike
+MIN_FILES = 5
+
+# Blob SHAs hashed per step, bounding the NUM_PERM x files working array
+CHUNK_FILES = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS signatures (
+    repo TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    files INTEGER NOT NULL,
+    added REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    repo TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bands_bucket ON bands(band, bucket);
+CREATE INDEX IF NOT EXISTS idx_bands_repo ON bands(repo);
+CREATE TABLE IF NOT EXISTS duplicates (
+    repo TEXT PRIMARY KEY,
+    original TEXT NOT NULL,
+    similarity REAL NOT NULL,
+    files INTEGER NOT NULL,
+    detected REAL NOT NULL
+);
+"""
+
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Multipliers (odd, so each hash is a bijection of 64-bit integers) and offsets."""
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    offsets = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+    return multipliers, offsets
+
+def minhash(shas: Sequence[str], num_perm: int = NUM_PERM, seed: int = SEED) -> np.ndarray:
+    """
+    MinHash signature of a set of git blob SHAs.
+
+    Blob SHAs are already uniform, so their leading 64 bits are used as the
+    base hash and permuted with a*x + b modulo 2^64.
+
+    Args:
+        shas: Hex blob SHAs (at least one)
+        num_perm: Signature length
+        seed: Seed of the permutations
+
+    Returns:
+        Array of num_perm unsigned 64-bit minimums
+    """
+    multipliers, offsets = _permutations(num_perm, seed)
+    signature = np.full(num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(shas), CHUNK_FILES):
+        values = np.array([int(sha[:16], 16) for sha in shas[start:start + CHUNK_FILES]], dtype=np.uint64)
+        # Wrapping uint64 arithmetic is the modulo
+        hashed = values[np.newaxis, :] * multipliers[:, np.newaxis] + offsets[:, np.newaxis]
+        np.minimum(signature, hashed.min(axis=1), out=signature)
+    return signature
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+def band_buckets(signature: np.ndarray, bands: int = BANDS) -> List[int]:
+    """Bucket of each band of a signature, as a signed 64-bit integer for SQLite."""
+    rows = len(signature) // bands
+    return [
+        int.from_bytes(
+            hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest(),
+            "little", signed=True
+        )
+        for band in range(bands)
+    ]
+
+class NearDuplicateIndex:
+    """Persistent MinHash LSH index of analyzed repositories."""
+
+    def __init__(self, db_path: str, threshold: float = 0.8):
+        """
+        Open (and create if needed) an index database.
+
+        Args:
+            db_path: Path to the SQLite database file
+            threshold: Estimated similarity at or above which a repository is a duplicate
+        """
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.threshold = threshold
+        self.checked = 0
+        self.duplicates = 0
+        # Lookups awaiting commit, by repository: (signature, files, match)
+        self.pending: Dict[str, Tuple[np.ndarray, int, Optional[Tuple[str, float]]]] = {}
+        # The pipeline checks repositories from several fetch threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        version = f"{NUM_PERM}:{BANDS}:{SEED}"
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != version:
+            if row is not None:
+                logging.info("Signature parameters changed, clearing near-duplicate index")
+            self.conn.execute("DELETE FROM signatures")
+            self.conn.execute("DELETE FROM bands")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _find(self, repo_name: str, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Most similar indexed repository other than repo_name, if it reaches the threshold."""
+        buckets = band_buckets(signature)
+        candidates = set()
+        for band, bucket in enumerate(buckets):
+            rows = self.conn.execute(
+                "SELECT repo FROM bands WHERE band = ? AND bucket = ?", (band, bucket)
+            ).fetchall()
+            candidates.update(row[0] for row in rows)
+        candidates.discard(repo_name)
+
+        best = None
+        for candidate in sorted(candidates):
+            row = self.conn.execute("SELECT signature FROM signatures WHERE repo = ?", (candidate,)).fetchone()
+            if row is None:
+                continue
+            score = similarity(signature, np.frombuffer(row[0], dtype=np.uint64))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (candidate, score)
+        return best
+
+    def _add(self, repo_name: str, signature: np.ndarray, files: int) -> None:
+        """Index a repository's signature, replacing an earlier one."""
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.execute("DELETE FROM bands WHERE repo = ?", (repo_name,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO signatures (repo, signature, files, added) VALUES (?, ?, ?, ?)",
+                (repo_name, signature.tobytes(), files, time.time())
+            )
+            self.conn.executemany(
+                "INSERT INTO bands (band, bucket, repo) VALUES (?, ?, ?)",
+                [(band, bucket, repo_name) for band, bucket in enumerate(band_buckets(signature))]
+            )
+            # A repository analyzed on its own is no longer anyone's duplicate
+            self.conn.execute("DELETE FROM duplicates WHERE repo = ?", (repo_name,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def find(self, repo_name: str, shas: Sequence[str]) -> Optional[Tuple[str, float]]:
+        """
+        Look up a repository by its Python blob SHAs without changing the index.
+
+        The lookup is held until commit (or dropped if the repository is
+        looked up again), so the index only ever refers to repositories that
+        were analyzed.
+
+        Args:
+            repo_name: Repository name (owner/repo)
+            shas: Blob SHAs of its Python files (see file_selection.python_blob_shas)
+
+        Returns:
+            Tuple of (original repository, estimated similarity) if the
+            repository is a near-duplicate, None otherwise
+        """
+        if len(shas) < MIN_FILES:
+            return None
+        signature = minhash(shas)
+        with self.lock:
+            self.checked += 1
+            match = self._find(repo_name, signature)
+            if match is not None:
+                self.duplicates += 1
+            self.pending[repo_name] = (signature, len(shas), match)
+            return match
+
+    def commit(self, repo_name: str) -> None:
+        """
+        Apply a repository's lookup once its results are saved.
+
+        A new repository is indexed; a near-duplicate is recorded as such and
+        not indexed. Does nothing for repositories without a pending lookup.
+        """
+        with self.lock:
+            lookup = self.pending.pop(repo_name, None)
+            if lookup is None:
+                return
+            signature, files, match = lookup
+            if match is None:
+                self._add(repo_name, signature, files)
+            else:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO duplicates (repo, original, similarity, files, detected) VALUES (?, ?, ?, ?, ?)",
+                    (repo_name, match[0], round(match[1], 4), files, time.time())
+                )
+
+    def iter_duplicates(self) -> Iterator[Dict]:
+        """Yield the recorded duplicates, oldest first."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT repo, original, similarity, files, detected FROM duplicates ORDER BY detected"
+            ).fetchall()
+        for repo, original, score, files, detected in rows:
+            yield {"repo": repo, "original": original, "similarity": score, "files": files, "detected": detected}
+
+    def stats(self) -> Dict[str, int]:
+        """Lookups and duplicates of this run, and the size of the index."""
+        with self.lock:
+            indexed = self.conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+            recorded = self.conn.execute("SELECT COUNT(*) FROM duplicates").fetchone()[0]
+        return {
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "indexed": indexed,
+            "recorded_duplicates": recorded
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the near-duplicate repository index")
+    parser.add_argument("command", choices=("duplicates", "stats"),
+                        help="List recorded duplicates as JSON Lines, or print index statistics")
+    parser.add_argument("--index", required=True, help="Near-duplicate index database")
+
+    args = parser.parse_args()
+
+    index = NearDuplicateIndex(args.index)
+    if args.command == "duplicates":
+        for duplicate in index.iter_duplicates():
+            print(json.dumps(duplicate))
+    else:
+        print(json.dumps(index.stats()))
+    index.close()
@@ -0,0 +1,276 @@
+# notebooks.py
+"""
+Streaming Jupyter notebook source extraction
+
+Notebooks are JSON documents whose size is mostly cell outputs: images,
+tables and logs. Only the source of code cells matters for imports, so the
+notebook is walked as a stream of byte chunks and every value other than a
+cell's "cell_type" and "source" is skipped as it is read, without being
+decoded or kept. Memory use is bounded by the chunk size plus the code
+itself (code cells capped at MAX_SOURCE_BYTES), however large the outputs
+and markdown cells are.
+
+IPython syntax is neutralized so the result parses as Python: shell
+(`!pip install x`) and line magic (`%matplotlib inline`) lines become
+`pass`, and cells run by a cell magic (`%%bash`) are dropped.
+"""
+import re
+import json
+from typing import Iterator, List, Optional
+
+NOTEBOOK_SUFFIX = ".ipynb"
+
+# Notebooks larger than this are skipped; they are streamed, so this bounds
+# download and scan time rather than memory
+MAX_NOTEBOOK_BYTES = 20 * 1024 * 1024
+
+# Code kept per notebook; further cells are skipped
+MAX_SOURCE_BYTES = 1024 * 1024
+
+# Keys whose values contain cells: "cells" (nbformat 4) and "worksheets" (nbformat 3)
+CELL_CONTAINERS = ("cells", "worksheets")
+
+# Keys holding a cell's code: "source" (nbformat 4) and "input" (nbformat 3)
+SOURCE_KEYS = ("source", "input")
+
+# Nesting of cell containers followed before giving up on a notebook
+MAX_DEPTH = 8
+
+_NON_SPACE = re.compile(rb"[^ \t\r\n]")
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_SCALAR_END = re.compile(rb"[ \t\r\n,\]}]")
+
+# `files = !ls` and `t = %timeit -o f()` assign the output of a magic
+_ASSIGNED_MAGIC = re.compile(r"^(\s*[\w.,\s]+=\s*)[!%].*$")
+
+class NotebookError(ValueError):
+    """The notebook is not valid JSON or not shaped like a notebook."""
+
+class _NotebookReader:
+    """Pull parser over a stream of JSON byte chunks that keeps only code cell sources."""
+
+    def __init__(self, chunks: Iterator[bytes], max_source: int = MAX_SOURCE_BYTES):
+        self.chunks = chunks
+        self.buf = b""
+        self.pos = 0
+        self.max_source = max_source
+        self.kept = 0
+        self.cells: List[str] = []
+
+    def _fill(self) -> None:
+        """Drop the consumed part of the buffer and append the next chunk."""
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            raise NotebookError("Unexpected end of notebook")
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def _peek(self) -> bytes:
+        """Next non-whitespace byte, without consuming it."""
+        while True:
+            match = _NON_SPACE.search(self.buf, self.pos)
+            if match is not None:
+                self.pos = match.start()
+                return self.buf[self.pos:self.pos + 1]
+            self.pos = len(self.buf)
+            self._fill()
+
+    def _expect(self, char: bytes) -> None:
+        if self._peek() != char:
+            raise NotebookError(f"Expected {char!r} in notebook")
+        self.pos += 1
+
+    def _string(self, keep: bool = True) -> Optional[bytes]:
+        """Consume a JSON string; return its raw (still escaped) bytes if keep is set."""
+        self._expect(b'"')
+        parts = []
+        while True:
+            match = _STRING_SPECIAL.search(self.buf, self.pos)
+            if match is None:
+                if keep:
+                    parts.append(self.buf[self.pos:])
+                self.pos = len(self.buf)
+                self._fill()
+                continue
+            end = match.start()
+            if self.buf[end:end + 1] == b'"':
+                if keep:
+                    parts.append(self.buf[self.pos:end])
+                self.pos = end + 1
+                return b"".join(parts) if keep else None
+            if end + 1 >= len(self.buf):
+                # The escaped character is in the next chunk
+                if keep:
+                    parts.append(self.buf[self.pos:end])
+                self.pos = end
+                self._fill()
+                continue
+            if keep:
+                parts.append(self.buf[self.pos:end + 2])
+            self.pos = end + 2
+
+    def _text(self) -> str:
+        """Consume a JSON string and decode it."""
+        try:
+            return json.loads(b'"' + self._string() + b'"')
+        except ValueError as e:
+            # Bad escapes and invalid UTF-8 (UnicodeDecodeError is a ValueError)
+            raise NotebookError(f"Invalid string in notebook: {e}") from None
+
+    def _skip(self) -> None:
+        """Consume one JSON value of any size without keeping it."""
+        depth = 0
+        while True:
+            char = self._peek()
+            if char == b'"':
+                self._string(keep=False)
+            elif char in (b"[", b"{"):
+                depth += 1
+                self.pos += 1
+                continue
+            elif char in (b"]", b"}") and depth > 0:
+                depth -= 1
+                self.pos += 1
+            elif char in (b",", b":") and depth > 0:
+                self.pos += 1
+                continue
+            elif char in (b",", b":", b"]", b"}"):
+                raise NotebookError("Expected a value in notebook")
+            else:
+                # Number, true, false or null
+                while True:
+                    match = _SCALAR_END.search(self.buf, self.pos)
+                    if match is not None:
+                        self.pos = match.start()
+                        break
+                    self.pos = len(self.buf)
+                    self._fill()
+            if depth <= 0:
+                return
+
+    def _items(self, close: bytes) -> Iterator[None]:
+        """Iterate over the elements of an array or members of an object the caller consumes."""
+        if self._peek() == close:
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self._peek()
+            self.pos += 1
+            if char == close:
+                return
+            if char != b",":
+                raise NotebookError("Expected ',' in notebook")
+
+    def _kept_text(self, taken: int) -> Optional[str]:
+        """Consume a string, decoding it unless the source budget is spent (with taken more pending)."""
+        if self.kept + taken >= self.max_source:
+            self._string(keep=False)
+            return None
+        return self._text()
+
+    def _source(self) -> Optional[str]:
+        """A cell's source, given as one string or a list of lines; charged by the caller."""
+        char = self._peek()
+        if char == b'"':
+            return self._kept_text(0)
+        if char != b"[":
+            self._skip()
+            return None
+        self.pos += 1
+        parts = []
+        taken = 0
+        for _ in self._items(b"]"):
+            if self._peek() == b'"':
+                text = self._kept_text(taken)
+                if text is not None:
+                    parts.append(text)
+                    taken += len(text)
+            else:
+                self._skip()
+        return "".join(parts)
+
+    def _value(self, depth: int) -> None:
+        """Walk a value that may contain cells."""
+        char = self._peek()
+        if depth > MAX_DEPTH:
+            raise NotebookError("Notebook is nested too deeply")
+        if char == b"{":
+            self._object(depth)
+        elif char == b"[":
+            self.pos += 1
+            for _ in self._items(b"]"):
+                self._value(depth + 1)
+        else:
+            self._skip()
+
+    def _object(self, depth: int) -> None:
+        """Walk an object, recording it if it is a code cell."""
+        self._expect(b"{")
+        cell_type = None
+        source = None
+        for _ in self._items(b"}"):
+            if self._peek() != b'"':
+                raise NotebookError("Expected a key in notebook")
+            key = self._text()
+            self._expect(b":")
+            if key in SOURCE_KEYS and cell_type not in (None, "code"):
+                # nbformat writes cell_type first: markdown and raw sources
+                # (often data-URI images) are never decoded
+                self._skip()
+            elif key in SOURCE_KEYS:
+                source = self._source()
+            elif key == "cell_type" and self._peek() == b'"':
+                cell_type = self._text()
+            elif key in CELL_CONTAINERS:
+                self._value(depth + 1)
+            else:
+                # Outputs, metadata and attachments are never decoded
+                self._skip()
+        if cell_type == "code" and source:
+            # Only code counts against the source budget
+            self.kept += len(source)
+            self.cells.append(source)
+
+    def read(self) -> List[str]:
+        """Parse the whole notebook and return the sources of its code cells."""
+        if self._peek() != b"{":
+            raise NotebookError("Notebook is not a JSON object")
+        self._object(0)
+        return self.cells
+
+def strip_magics(cell: str) -> str:
+    """
+    Turn a code cell into plain Python.
+
+    Shell and line magic lines are replaced by `pass` at the same indentation,
+    so the blocks around them stay valid; cell magic cells are dropped.
+    """
+    if cell.lstrip().startswith("%%"):
+        return ""
+    lines = []
+    for line in cell.splitlines():
+        stripped = line.lstrip()
+        if stripped.startswith(("!", "%")):
+            line = line[:len(line) - len(stripped)] + "pass"
+        else:
+            line = _ASSIGNED_MAGIC.sub(r"\1None", line)
+        lines.append(line)
+    return "\n".join(lines)
+
+def notebook_source(chunks: Iterator[bytes], max_source: int = MAX_SOURCE_BYTES) -> str:
+    """
+    Python source of a notebook's code cells, read from a stream of byte chunks.
+
+    Args:
+        chunks: The notebook file's bytes in chunks of any size
+        max_source: Code kept before further cells are skipped
+
+    Returns:
+        Code cells with IPython syntax removed, separated by blank lines
+
+    Raises:
+        NotebookError: If the notebook is not valid JSON
+    """
+    cells = _NotebookReader(chunks, max_source).read()
+    return "\n\n".join(filter(None, map(strip_magics, cells)))
@@ -0,0 +1,303 @@
+# parse_sandbox.py
+"""
+Sandboxed import extraction
+
+Parses files in a pool of reusable worker processes with hard per-file
+limits, so one pathological file (megabytes of generated code, deeply nested
+expressions) cannot stall or kill a whole run. Each worker caps its address
+space with RLIMIT_AS when it starts and sets RLIMIT_CPU before every file;
+the parent enforces a wall-clock timeout on top. A worker that times out,
+exceeds a limit or crashes is killed and replaced, and the file it was
+parsing is skipped and counted in the sandbox report.
+
+Workers are started from a fork server, so they never inherit pipes or
+locks held by the fetch threads of the parent.
+"""
+import time
+import signal
+import logging
+import resource
+import threading
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+from queue import Queue, Empty
+from typing import Dict, List, Optional, Tuple
+
+from git_fetch import SourceFile
+from analyze_imports import extract_imports
+
+# Why a file was killed: wall-clock timeout, RLIMIT_CPU, RLIMIT_AS (the worker's
+# MemoryError) or any other worker death, including SIGKILL from the OOM killer
+KILL_REASONS = ("timeout", "cpu", "memory", "crash")
+
+def _worker_main(conn, memory_mb: int, cpu_seconds: int) -> None:
+    """Worker loop: receive (content, engine), reply ("ok", imports, seconds) or ("error", message)."""
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        content, engine = task
+
+        if cpu_seconds:
+            # RLIMIT_CPU counts the process's total CPU time, so move the limit
+            # to cpu_seconds past what has been used so far; SIGXCPU kills us
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            soft = int(usage.ru_utime + usage.ru_stime) + 1 + cpu_seconds
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+        try:
+            start = time.perf_counter()
+            imports = extract_imports(content, engine)
+            conn.send(("ok", imports, time.perf_counter() - start))
+        except MemoryError:
+            # The heap may be fragmented or half-built objects leaked: exit and be replaced
+            conn.send(("memory", None, None))
+            return
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}", None))
+
+class SandboxWorker:
+    """One worker process and the parent's end of its pipe."""
+
+    def __init__(self, context, memory_mb: int, cpu_seconds: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, memory_mb, cpu_seconds), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.files = 0
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self, timeout: float = 5) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+class ParseSandbox:
+    """Pool of resource-limited parser processes, shared by any number of threads."""
+
+    def __init__(
+        self,
+        procs: Optional[int] = None,
+        cpu_seconds: int = 10,
+        memory_mb: int = 2048,
+        wall_timeout: float = 30,
+        max_files_per_worker: int = 1000
+    ):
+        """
+        Args:
+            procs: Number of worker processes (defaults to the CPU count)
+            cpu_seconds: CPU time limit per file (0 disables)
+            memory_mb: Address space limit of each worker in megabytes (0 disables)
+            wall_timeout: Wall-clock seconds per file before the worker is killed
+            max_files_per_worker: Replace a worker after this many files to bound leaks
+        """
+        self.procs = procs or multiprocessing.cpu_count()
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.wall_timeout = wall_timeout
+        self.max_files_per_worker = max_files_per_worker
+        self.context = multiprocessing.get_context("forkserver")
+        self.idle: Queue = Queue()
+        self.workers: List[SandboxWorker] = []
+        self.started = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.files_parsed = 0
+        self.files_failed = 0
+        self.killed: Dict[str, int] = {reason: 0 for reason in KILL_REASONS}
+        self.killed_files: List[Dict[str, str]] = []
+        self.restarts = 0
+
+    def _start_worker(self) -> SandboxWorker:
+        worker = SandboxWorker(self.context, self.memory_mb, self.cpu_seconds)
+        with self.lock:
+            self.workers.append(worker)
+        return worker
+
+    def _replace_worker(self, worker: SandboxWorker) -> SandboxWorker:
+        worker.kill()
+        with self.lock:
+            self.workers.remove(worker)
+            self.restarts += 1
+        return self._start_worker()
+
+    def _try_acquire(self) -> Optional[SandboxWorker]:
+        """An idle worker, a newly started one while below procs, or None."""
+        try:
+            return self.idle.get_nowait()
+        except Empty:
+            pass
+        with self.lock:
+            start = self.started < self.procs
+            if start:
+                self.started += 1
+        if not start:
+            return None
+        try:
+            return self._start_worker()
+        except Exception:
+            with self.lock:
+                self.started -= 1
+            raise
+
+    def _acquire(self) -> SandboxWorker:
+        worker = self._try_acquire()
+        return worker if worker is not None else self.idle.get()
+
+    def _release(self, worker: SandboxWorker) -> None:
+        if worker.files >= self.max_files_per_worker or not worker.process.is_alive():
+            worker = self._replace_worker(worker)
+        self.idle.put(worker)
+
+    def _death_reason(self, worker: SandboxWorker) -> str:
+        worker.process.join(1)
+        if worker.process.exitcode == -signal.SIGXCPU:
+            return "cpu"
+        # RLIMIT_AS surfaces as a MemoryError the worker reports itself; a SIGKILL
+        # comes from the OOM killer or someone else, so it is not counted as "memory"
+        return "crash"
+
+    def _record_kill(self, repo_name: str, file: SourceFile, reason: str) -> None:
+        logging.warning(f"Parser killed on {repo_name}:{file.path} ({reason}), skipping file")
+        with self.lock:
+            self.killed[reason] += 1
+            self.killed_files.append({"repo": repo_name, "path": file.path, "reason": reason})
+
+    def parse(self, files: List[SourceFile], engine: str = "ast", repo_name: str = "", metrics=None) -> List[SourceFile]:
+        """
+        Extract imports from the files that don't have them yet, like
+        analyze_imports.extract_file_imports but in the sandbox.
+
+        The files are spread over every worker that is free, one file per
+        worker at a time, so a single repository can use the whole pool and
+        a slow file only holds up its own worker. Files whose parse was
+        killed or raised are left out of the result.
+
+        Args:
+            files: List of SourceFile
+            engine: Import extraction engine (see analyze_imports.ENGINES)
+            repo_name: Repository the files belong to, for the report
+            metrics: Optional RepoMetrics; killed files are added to files_killed
+
+        Returns:
+            List of SourceFile with imports set, in the order given
+        """
+        if self.closed:
+            raise RuntimeError("Parse sandbox is closed")
+        parsed: Dict[int, SourceFile] = {}
+        todo = deque()
+        for index, file in enumerate(files):
+            if file.imports is not None:
+                parsed[index] = file
+            else:
+                todo.append((index, file))
+
+        # Connection of each busy worker -> (worker, index, file, wall-clock deadline)
+        busy: Dict[object, Tuple[SandboxWorker, int, SourceFile, float]] = {}
+
+        def finish(worker: SandboxWorker, index: int, file: SourceFile, status: str, imports, seconds) -> None:
+            if status == "ok":
+                with self.lock:
+                    self.files_parsed += 1
+                parsed[index] = file._replace(content=None, imports=imports, parse_time=seconds)
+            elif status == "error":
+                logging.warning(f"Error processing file {file.path}: {imports}")
+                with self.lock:
+                    self.files_failed += 1
+            else:
+                self._record_kill(repo_name, file, status)
+                if metrics is not None:
+                    metrics.files_killed += 1
+                worker = self._replace_worker(worker)
+            self._release(worker)
+
+        try:
+            while todo or busy:
+                # Hand out files while workers are free; only block for one
+                # when this call holds none, or it could wait on itself
+                while todo:
+                    worker = self._try_acquire() if busy else self._acquire()
+                    if worker is None:
+                        break
+                    index, file = todo.popleft()
+                    worker.files += 1
+                    try:
+                        worker.conn.send((file.content, engine))
+                    except (EOFError, OSError):
+                        finish(worker, index, file, self._death_reason(worker), None, None)
+                        continue
+                    busy[worker.conn] = (worker, index, file, time.monotonic() + self.wall_timeout)
+                if not busy:
+                    continue
+
+                timeout = max(0.0, min(entry[3] for entry in busy.values()) - time.monotonic())
+                ready = set(wait(list(busy), timeout))
+                now = time.monotonic()
+                for conn in list(busy):
+                    worker, index, file, deadline = busy[conn]
+                    if conn in ready:
+                        try:
+                            status, imports, seconds = conn.recv()
+                        except (EOFError, OSError):
+                            status, imports, seconds = self._death_reason(worker), None, None
+                    elif now >= deadline:
+                        status, imports, seconds = "timeout", None, None
+                    else:
+                        continue
+                    del busy[conn]
+                    finish(worker, index, file, status, imports, seconds)
+        finally:
+            # Workers still busy after an error hold a task nobody will read
+            for worker, _, _, _ in busy.values():
+                self._release(self._replace_worker(worker))
+        return [parsed[index] for index in sorted(parsed)]
+
+    def report(self) -> Dict:
+        """Counts of parsed, failed and killed files, worker restarts and the killed files."""
+        with self.lock:
+            return {
+                "files_parsed": self.files_parsed,
+                "files_failed": self.files_failed,
+                "killed": dict(self.killed),
+                "restarts": self.restarts,
+                "killed_files": list(self.killed_files)
+            }
+
+    def close(self) -> None:
+        """Stop all workers."""
+        self.closed = True
+        with self.lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
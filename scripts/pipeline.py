@@ -0,0 +1,177 @@
+# pipeline.py
+"""
+Concurrent fetch/parse pipeline
+
+Clones several repositories at once on a bounded thread pool, hands the
+fetched file contents to a sandboxed process pool (see parse_sandbox) for
+import extraction (or parses them on the fetch threads when sandboxing is
+off), and drains the results through a single writer so output
+files are only ever appended to from one place.
+"""
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING, List, Tuple, Optional
+
+from github_utils import save_results
+from analyze_imports import AnalysisOptions, analyze_repo, mark_processed
+from repo_queue import RepoQueue
+from metrics import RepoMetrics, MetricsRecorder
+
+if TYPE_CHECKING:
+    # Loads numpy, which only --schedule needs
+    from scheduler import RunScheduler
+
+def record_metrics(
+    recorder: Optional[MetricsRecorder],
+    metrics: RepoMetrics,
+    imports: int = 0,
+    status: Optional[str] = None
+) -> None:
+    """Finish a repository's metrics and add them to the recorder, if there is one."""
+    if recorder is not None:
+        metrics.finish(imports, status)
+        recorder.record(metrics)
+
+def run_pipeline(
+    repos: List[Tuple[str, str, str]],
+    options: AnalysisOptions,
+    imports_file: str = "imports.jsonl",
+    processed_file: str = "processed_repos.txt",
+    workers: int = 4,
+    queue: Optional[RepoQueue] = None,
+    recorder: Optional[MetricsRecorder] = None,
+    scheduler: Optional["RunScheduler"] = None
+) -> int:
+    """
+    Process repositories with concurrent clones and parallel parsing.
+
+    Args:
+        repos: Repositories to process as tuples of (repo_name, repo_url, last_updated)
+        options: How to fetch and analyze each repository, shared by the fetch
+            threads (the import cache, mirror cache, parser pool and near-duplicate
+            index included). No new clone jobs are started after options.deadline;
+            git operations still running are cut off at it and their repositories
+            are left for a later run
+        imports_file: File to append import results to
+        processed_file: File to track processed repositories
+        workers: Number of concurrent clone jobs
+        queue: Work queue the repositories come from, not yet leased (see
+            RepoQueue.pending). Each one is leased just before it starts, so
+            no lease runs out while it waits; ones another worker took first
+            are skipped and the batch is topped up from the queue. Failed
+            fetches are returned to it for a retry instead of being marked processed
+        recorder: Optional MetricsRecorder each repository's metrics are added to
+        scheduler: Optional RunScheduler ordering the repositories by predicted
+            cost; repositories predicted not to finish before its deadline are
+            not started, and the cost model learns from the ones completed
+
+    Returns:
+        Number of repositories processed
+    """
+    processed_count = 0
+    deadline = options.deadline
+    near_duplicates = options.near_duplicates
+    limit = len(repos)
+    started = 0
+    # Repositories started or found taken by another worker this run
+    tried = set()
+
+    def plan(batch: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+        return scheduler.order(list(batch), time.time()) if scheduler is not None else list(batch)
+
+    pending = plan(repos)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as fetch_pool:
+
+        def refill():
+            nonlocal started
+            # Keep at most `workers` clone jobs in flight
+            while len(in_flight) < workers:
+                if deadline is not None and time.time() > deadline:
+                    logging.warning("Approaching runtime limit, not starting new repositories")
+                    return
+                if not pending and queue is not None and started < limit:
+                    pending.extend(plan(queue.pending(limit - started, exclude=tried)))
+                if not pending:
+                    return
+                if scheduler is not None:
+                    repo_info = scheduler.pick(pending, time.time())
+                    if repo_info is None:
+                        logging.info(f"None of {len(pending)} remaining repositories is predicted to finish before the deadline")
+                        return
+                else:
+                    repo_info = pending.pop(0)
+                tried.add(repo_info[0])
+                if queue is not None and not queue.lease_repo(repo_info[0]):
+                    logging.info(f"Skipping {repo_info[0]}, leased by another worker")
+                    continue
+                started += 1
+                metrics = RepoMetrics(repo_info[0], options.fetch_mode, options.engine)
+                future = fetch_pool.submit(analyze_repo, repo_info, options, metrics)
+                in_flight[future] = (repo_info, metrics)
+
+        refill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            # Single writer: only this thread touches the output files
+            for future in done:
+                repo_info, metrics = in_flight.pop(future)
+                repo_name = repo_info[0]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logging.error(f"Error processing repository {repo_name}: {e}")
+                    if queue is not None:
+                        queue.fail(repo_name, str(e))
+                    record_metrics(recorder, metrics, status="error")
+                    continue
+
+                if metrics.status == "deadline":
+                    # Cut off by the deadline: left for a later run, not a failed attempt
+                    logging.info(f"Runtime limit reached while fetching {repo_name}")
+                    if queue is not None:
+                        queue.release(repo_name)
+                    record_metrics(recorder, metrics, status="deadline")
+                    continue
+
+                if results is None:
+                    if queue is not None:
+                        state = queue.fail(repo_name, "fetch failed")
+                        logging.warning(f"Could not fetch {repo_name}, repository is now {state}")
+                        record_metrics(recorder, metrics)
+                        continue
+
+                if queue is not None and not queue.renew(repo_name):
+                    # Another worker took the repository over; its results are theirs to save
+                    logging.warning(f"Lease on {repo_name} was lost, dropping its results")
+                    record_metrics(recorder, metrics, status="lease_lost")
+                    continue
+
+                if results:
+                    with metrics.stage("save"):
+                        save_results(results, imports_file)
+                    logging.info(f"Found {len(results)} non-standard imported libraries in {repo_name}")
+                else:
+                    logging.info(f"No non-standard library imports found in {repo_name}")
+
+                if queue is not None:
+                    queue.complete(repo_name)
+                if processed_file:
+                    mark_processed(processed_file, repo_name)
+                processed_count += 1
+                if near_duplicates is not None and results is not None:
+                    # Only repositories whose results were saved enter the index
+                    near_duplicates.commit(repo_name)
+                if scheduler is not None and metrics.status == "ok":
+                    scheduler.record(repo_info, time.time() - metrics.started)
+                record_metrics(recorder, metrics, imports=len(results or []))
+
+            refill()
+
+    if pending:
+        logging.info(f"Left {len(pending)} repositories for a later run")
+
+    return processed_count
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Repository Work Queue
+
+SQLite-backed queue of repositories to analyze. Each repository is in one of
+the states pending, leased, done or failed. Workers lease repositories for a
+limited time so that a crashed or parallel worker never causes a repository
+to be processed twice, and failed clones are retried before being given up on.
+
+Usage:
+    python repo_queue.py --db data/queue.db --repos data/repos.jsonl --processed data/processed_repos.txt
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import logging
+from datetime import datetime
+from typing import Callable, List, Sequence, Tuple, Optional, Dict
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    repo_name TEXT PRIMARY KEY,
+    repo_url TEXT,
+    last_updated TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_repos_state ON repos(state);
+CREATE INDEX IF NOT EXISTS idx_repos_lease ON repos(state, lease_expires);
+"""
+
+class RepoQueue:
+    """Persistent work queue of repositories backed by SQLite."""
+
+    def __init__(
+        self,
+        db_path: str,
+        lease_seconds: int = 1800,
+        max_attempts: int = 3,
+        worker_id: Optional[str] = None
+    ):
+        """
+        Open (and create if needed) a queue database.
+
+        Args:
+            db_path: Path to the SQLite database file
+            lease_seconds: How long a leased repository stays reserved for a worker
+            max_attempts: Number of failed attempts before a repository is marked failed
+            worker_id: Identifier recorded on leases (defaults to hostname-pid)
+        """
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        # Autocommit mode; transactions are opened explicitly where needed
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def add(self, repo_name: str, repo_url: Optional[str] = None, last_updated: Optional[str] = None) -> bool:
+        """
+        Add a repository to the queue if it is not already known.
+
+        Returns:
+            True if the repository was added, False if it was already queued
+        """
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO repos (repo_name, repo_url, last_updated) VALUES (?, ?, ?)",
+            (repo_name, repo_url or f"https://github.com/{repo_name}", last_updated)
+        )
+        return cursor.rowcount > 0
+
+    def import_repos_file(self, repos_file: str, accept: Optional[Callable[[str], bool]] = None) -> int:
+        """
+        Add every repository in a repos.jsonl file to the queue.
+
+        Args:
+            repos_file: repos.jsonl file to read
+            accept: Optional filter on repository names (e.g. a shard's membership test)
+
+        Returns:
+            Number of newly added repositories
+        """
+        added = 0
+        if not os.path.exists(repos_file):
+            return added
+
+        self.conn.execute("BEGIN")
+        try:
+            with open(repos_file, 'r') as f:
+                for line in f:
+                    try:
+                        repo_data = json.loads(line.strip())
+                    except json.JSONDecodeError:
+                        continue
+                    repo_name = repo_data.get("repo_name")
+                    if accept is not None and repo_name and not accept(repo_name):
+                        continue
+                    if repo_name and self.add(repo_name, repo_data.get("repo_url"), repo_data.get("last_updated")):
+                        added += 1
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def import_processed_file(self, processed_file: str) -> int:
+        """
+        Mark every repository listed in a processed_repos.txt file as done.
+
+        Returns:
+            Number of repositories marked done
+        """
+        marked = 0
+        if not os.path.exists(processed_file):
+            return marked
+
+        self.conn.execute("BEGIN")
+        try:
+            with open(processed_file, 'r') as f:
+                for line in f:
+                    repo_name = line.strip()
+                    if not repo_name:
+                        continue
+                    self.add(repo_name)
+                    cursor = self.conn.execute(
+                        "UPDATE repos SET state = ?, lease_owner = NULL, lease_expires = NULL "
+                        "WHERE repo_name = ? AND state != ?",
+                        (DONE, repo_name, DONE)
+                    )
+                    marked += cursor.rowcount
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return marked
+
+    def _expire_leases(self, now: float) -> None:
+        """Return expired leases to the pending state, so repositories held by a crashed worker become available again."""
+        self.conn.execute(
+            "UPDATE repos SET state = ?, lease_owner = NULL, lease_expires = NULL "
+            "WHERE state = ? AND lease_expires < ?",
+            (PENDING, LEASED, now)
+        )
+
+    def lease(self, limit: int = 1) -> List[Tuple[str, str, str]]:
+        """
+        Lease up to `limit` pending repositories for this worker.
+
+        Expired leases are returned to the pending state first, so repositories
+        held by a crashed worker become available again.
+
+        Returns:
+            List of tuples (repo_name, repo_url, last_updated)
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_leases(now)
+            rows = self.conn.execute(
+                "SELECT repo_name, repo_url, last_updated FROM repos "
+                "WHERE state = ? ORDER BY rowid LIMIT ?",
+                (PENDING, limit)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE repos SET state = ?, lease_owner = ?, lease_expires = ? WHERE repo_name = ?",
+                [(LEASED, self.worker_id, now + self.lease_seconds, row[0]) for row in rows]
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return [self._repo_info(*row) for row in rows]
+
+    def pending(self, limit: int = 1, exclude: Sequence[str] = ()) -> List[Tuple[str, str, str]]:
+        """
+        List up to `limit` pending repositories without leasing them.
+
+        Used to plan a batch whose repositories are leased one at a time with
+        lease_repo as they start, so no lease runs out while a repository
+        waits its turn.
+
+        Args:
+            limit: Maximum number of repositories
+            exclude: Repository names to leave out (e.g. ones already tried this run)
+
+        Returns:
+            List of tuples (repo_name, repo_url, last_updated)
+        """
+        exclude = set(exclude)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_leases(time.time())
+            rows = self.conn.execute(
+                "SELECT repo_name, repo_url, last_updated FROM repos "
+                "WHERE state = ? ORDER BY rowid LIMIT ?",
+                (PENDING, limit + len(exclude))
+            ).fetchall()
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [self._repo_info(*row) for row in rows if row[0] not in exclude][:limit]
+
+    def lease_repo(self, repo_name: str) -> bool:
+        """
+        Lease one pending repository for this worker.
+
+        Returns:
+            True if it was leased, False if another worker holds it or it is no longer pending
+        """
+        cursor = self.conn.execute(
+            "UPDATE repos SET state = ?, lease_owner = ?, lease_expires = ? WHERE repo_name = ? AND state = ?",
+            (LEASED, self.worker_id, time.time() + self.lease_seconds, repo_name, PENDING)
+        )
+        return cursor.rowcount > 0
+
+    def renew(self, repo_name: str) -> bool:
+        """
+        Extend this worker's lease on a repository by lease_seconds.
+
+        Called before a repository's results are saved, so they are only
+        written while this worker still holds the repository and the lease
+        cannot run out between the save and complete.
+
+        Returns:
+            False if this worker no longer holds the lease (it expired and was
+            taken over or returned to pending)
+        """
+        cursor = self.conn.execute(
+            "UPDATE repos SET lease_expires = ? WHERE repo_name = ? AND state = ? AND lease_owner = ?",
+            (time.time() + self.lease_seconds, repo_name, LEASED, self.worker_id)
+        )
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def _repo_info(repo_name: str, repo_url: Optional[str], last_updated: Optional[str]) -> Tuple[str, str, str]:
+        return (repo_name, repo_url or f"https://github.com/{repo_name}", last_updated or datetime.utcnow().isoformat())
+
+    def complete(self, repo_name: str) -> bool:
+        """
+        Mark a repository leased by this worker as done.
+
+        Returns:
+            False if this worker no longer holds the lease (it expired and was
+            taken over), in which case the repository is left alone
+        """
+        cursor = self.conn.execute(
+            "UPDATE repos SET state = ?, lease_owner = NULL, lease_expires = NULL, last_error = NULL "
+            "WHERE repo_name = ? AND state = ? AND lease_owner = ?",
+            (DONE, repo_name, LEASED, self.worker_id)
+        )
+        if cursor.rowcount == 0:
+            logging.warning(f"Lease on {repo_name} was lost, not marking it done")
+        return cursor.rowcount > 0
+
+    def release(self, repo_name: str) -> None:
+        """Return a repository leased by this worker to the pending state without counting an attempt."""
+        self.conn.execute(
+            "UPDATE repos SET state = ?, lease_owner = NULL, lease_expires = NULL "
+            "WHERE repo_name = ? AND state = ? AND lease_owner = ?",
+            (PENDING, repo_name, LEASED, self.worker_id)
+        )
+
+    def fail(self, repo_name: str, error: str = "") -> str:
+        """
+        Record a failed attempt for a repository leased by this worker.
+
+        The repository goes back to pending until it has failed max_attempts
+        times. A lease this worker no longer holds is left alone, so a stale
+        worker never spends another worker's attempts.
+
+        Returns:
+            The new state of the repository
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT state, attempts, lease_owner FROM repos WHERE repo_name = ?", (repo_name,)
+            ).fetchone()
+            if row is None or row[0] != LEASED or row[2] != self.worker_id:
+                self.conn.execute("COMMIT")
+                logging.warning(f"Lease on {repo_name} was lost, not recording the failure")
+                return row[0] if row else PENDING
+            attempts = row[1] + 1
+            state = FAILED if attempts >= self.max_attempts else PENDING
+            self.conn.execute(
+                "UPDATE repos SET state = ?, attempts = ?, last_error = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE repo_name = ?",
+                (state, attempts, error, repo_name)
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return state
+
+    def count(self, state: str = PENDING) -> int:
+        """Count repositories in the given state."""
+        return self.conn.execute("SELECT COUNT(*) FROM repos WHERE state = ?", (state,)).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        """Count repositories per state."""
+        return dict(self.conn.execute("SELECT state, COUNT(*) FROM repos GROUP BY state").fetchall())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import repository files into the work queue")
+    parser.add_argument("--db", type=str, required=True, help="Queue database file")
+    parser.add_argument("--repos", type=str, help="Repository information file (JSONL) to import")
+    parser.add_argument("--processed", type=str, help="Processed repositories file to import as done")
+
+    args = parser.parse_args()
+
+    queue = RepoQueue(args.db)
+    if args.repos:
+        logging.info(f"Imported {queue.import_repos_file(args.repos)} repositories from {args.repos}")
+    if args.processed:
+        logging.info(f"Marked {queue.import_processed_file(args.processed)} repositories done from {args.processed}")
+    print(f"Queue state: {queue.stats()}")
+    queue.close()
@@ -0,0 +1,144 @@
+# sampling.py
+"""
+Adaptive per-repository file sampling
+
+A fixed --max-files reads all of a small repository and a thin slice of a
+large one, and keeps parsing files that only repeat libraries already
+seen. With adaptive sampling the selected files are read and parsed one at
+a time in selection order (see file_selection.py) under a per-repository
+byte and time budget, and sampling stops once `patience` files in a row
+add no library the repository had not already shown; --max-files becomes
+an upper bound instead of the sample size.
+
+A file whose size (or expected parse time, from the bytes per second of
+the files parsed so far) no longer fits the remaining budget is passed
+over in favor of later, cheaper files. Every repository gets a stop
+reason in its metrics:
+
+- saturated: `patience` consecutive files added no new library
+- bytes: the byte budget is spent
+- time: the time budget is spent
+- max_files: max_files files were analyzed
+- exhausted: every candidate was analyzed
+
+When the candidates run out after some were passed over, the budget that
+turned the last of them away is the reason.
+"""
+import time
+from typing import Callable, List, NamedTuple, Optional, Set
+
+STOP_REASONS = ("saturated", "bytes", "time", "max_files", "exhausted")
+
+class SampleBudget(NamedTuple):
+    """Per-repository limits of adaptive sampling."""
+    # Bytes of file content read (cache hits are free)
+    max_bytes: int = 2_000_000
+    # Seconds spent reading and parsing
+    max_seconds: float = 30.0
+    # Consecutive files without a new library before sampling stops
+    patience: int = 5
+
+class AdaptiveSampler:
+    """Decides, file by file, whether a repository's sample is complete."""
+
+    def __init__(
+        self,
+        budget: SampleBudget,
+        parse: Callable[[list], list],
+        max_files: int = 10,
+        exclude: Optional[Set[str]] = None
+    ):
+        """
+        Args:
+            budget: Byte, time and saturation limits
+            parse: Function extracting the imports of a list of SourceFile
+                (analyze_imports.parse_files or ParseSandbox.parse); files it
+                drops count as adding nothing
+            max_files: Most files analyzed
+            exclude: Libraries that are never new, e.g. the repository's
+                first-party modules (may be filled in after construction)
+        """
+        self.budget = budget
+        self.parse = parse
+        self.max_files = max_files
+        self.exclude = exclude if exclude is not None else set()
+        self.started = time.perf_counter()
+        self.bytes_read = 0
+        self.files = 0
+        self.passed_over = 0
+        # Budget ("bytes" or "time") that last turned a file away
+        self.pass_reason: Optional[str] = None
+        self.parse_bytes = 0
+        self.parse_seconds = 0.0
+        self.libraries: Set[str] = set()
+        self.unproductive = 0
+        self.stop_reason: Optional[str] = None
+
+    def start(self) -> None:
+        """Start the time budget (at construction by default)."""
+        self.started = time.perf_counter()
+
+    def remaining_seconds(self) -> float:
+        return self.budget.max_seconds - (time.perf_counter() - self.started)
+
+    @property
+    def done(self) -> bool:
+        """Whether sampling has stopped; sets stop_reason when a limit is first reached."""
+        if self.stop_reason is None:
+            if self.files >= self.max_files:
+                self.stop_reason = "max_files"
+            elif self.unproductive >= self.budget.patience:
+                self.stop_reason = "saturated"
+            elif self.bytes_read >= self.budget.max_bytes:
+                self.stop_reason = "bytes"
+            elif self.remaining_seconds() <= 0:
+                self.stop_reason = "time"
+        return self.stop_reason is not None
+
+    def admit(self, size: Optional[int]) -> bool:
+        """
+        Whether a file of the given size fits the remaining budget.
+
+        A file of unknown size is always admitted; it is charged once read.
+        Files that do not fit are counted as passed over.
+        """
+        if size is None:
+            return True
+        if self.bytes_read + size > self.budget.max_bytes:
+            self.pass_reason = "bytes"
+        elif self.parse_seconds > 0 and size * self.parse_seconds / max(self.parse_bytes, 1) > self.remaining_seconds():
+            # Expected parse time at the repository's observed parse rate
+            self.pass_reason = "time"
+        else:
+            return True
+        self.passed_over += 1
+        return False
+
+    def add(self, file, size: int = 0) -> List:
+        """
+        Parse a file if its imports are not known yet and update the sample.
+
+        Args:
+            file: SourceFile, with imports set for cache hits
+            size: Bytes read for the file (0 for cache hits)
+
+        Returns:
+            The parsed file in a list, or an empty list if parsing dropped it
+        """
+        self.bytes_read += size
+        self.files += 1
+        parsed = self.parse([file]) if file.imports is None else [file]
+        for result in parsed:
+            if result.parse_time is not None:
+                self.parse_seconds += result.parse_time
+                self.parse_bytes += size
+        new = set().union(*(result.imports for result in parsed)) - self.libraries - self.exclude
+        self.libraries |= new
+        self.unproductive = 0 if new else self.unproductive + 1
+        return parsed
+
+    def finish(self) -> str:
+        """Stop reason once the candidates ran out, if no limit stopped sampling first."""
+        if not self.done:
+            self.stop_reason = self.pass_reason or "exhausted"
+        return self.stop_reason
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Cost-predictive run scheduling
+
+A scheduled run has a fixed window (max_runtime, under the 6 hour Actions
+limit) to get through its batch of repositories. Each repository's
+processing time is predicted from the metadata the Search API returns with
+it and find_repos keeps in repos.jsonl: size (KB), stargazers_count and
+fork. The prediction comes from a linear model fitted to the observed times
+of earlier repositories. Its sufficient statistics are kept in a small JSON
+state file, so every run refines the model and the next run starts from it.
+A prior of PRIOR_WEIGHT pseudo-observations keeps early predictions sane.
+
+The scheduler only changes the order when the batch is predicted not to fit
+in the time left. In that case it starts the cheapest repositories first,
+which maximizes the number completed. A repository is only started when its
+predicted cost, with a safety factor, ends before the deadline. Otherwise
+it is left for a later run rather than being cut off mid-clone.
+Repositories without metadata (e.g. found through GHArchive) are predicted
+at the mean observed size.
+
+Usage:
+    python main.py ... --schedule --cost-model data/cost_model.json
+    python scheduler.py predict data/cost_model.json --repos-file data/repos.jsonl
+"""
+import os
+import math
+import json
+import logging
+import argparse
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sharding import read_repos
+
+# Model inputs, in coefficient order
+FEATURES = ("intercept", "size_mb", "log_stars", "fork")
+
+# Coefficients before any observation: 5 s per repository plus 0.05 s per MB
+PRIOR = (5.0, 0.05, 0.0, 0.0)
+
+# Weight of the prior, in observations
+PRIOR_WEIGHT = 5.0
+
+# Size assumed for repositories without size metadata before any is observed
+DEFAULT_SIZE_KB = 2048
+
+# Lower bound of a predicted cost in seconds
+MIN_SECONDS = 1.0
+
+# Predicted costs are multiplied by this before checking they fit
+SAFETY = 1.5
+
+# Seconds kept free before the deadline for writing results and summaries
+DEADLINE_MARGIN = 30
+
+def load_repo_metadata(repos_files: Sequence[str]) -> Dict[str, Dict]:
+    """
+    Cost metadata of the repositories in repos.jsonl files.
+
+    Returns:
+        Dictionary of repo_name to a dict with size, stargazers_count and fork
+        (entries without any of them are left out)
+    """
+    metadata = {}
+    for path in repos_files:
+        for repo_data in read_repos(path):
+            fields = {key: repo_data[key] for key in ("size", "stargazers_count", "fork") if repo_data.get(key) is not None}
+            if fields:
+                metadata[repo_data["repo_name"]] = fields
+    return metadata
+
+class CostModel:
+    """Ridge regression of repository processing seconds on repository metadata."""
+
+    def __init__(self, state_file: Optional[str] = None):
+        """
+        Args:
+            state_file: JSON file holding the model's statistics; loaded if it
+                exists, and written by save
+        """
+        self.state_file = state_file
+        n = len(FEATURES)
+        self.xtx = np.zeros((n, n))
+        self.xty = np.zeros(n)
+        self.observations = 0
+        self.size_kb_total = 0.0
+        self.sized = 0
+        if state_file and os.path.exists(state_file):
+            try:
+                with open(state_file, 'r') as f:
+                    state = json.load(f)
+                if state.get("features") == list(FEATURES):
+                    self.xtx = np.array(state["xtx"], dtype=np.float64)
+                    self.xty = np.array(state["xty"], dtype=np.float64)
+                    self.observations = state["observations"]
+                    self.size_kb_total = state["size_kb_total"]
+                    self.sized = state["sized"]
+                else:
+                    logging.info("Cost model features changed, starting from the prior")
+            except (json.JSONDecodeError, KeyError, OSError, ValueError):
+                logging.warning(f"Ignoring unreadable cost model {state_file}")
+        self._coefficients = None
+
+    def features(self, metadata: Optional[Dict]) -> np.ndarray:
+        """Feature vector of a repository's metadata (see FEATURES)."""
+        metadata = metadata or {}
+        size_kb = metadata.get("size")
+        if size_kb is None:
+            size_kb = self.size_kb_total / self.sized if self.sized else DEFAULT_SIZE_KB
+        return np.array([
+            1.0,
+            size_kb / 1024,
+            math.log1p(metadata.get("stargazers_count") or 0),
+            1.0 if metadata.get("fork") else 0.0
+        ])
+
+    def coefficients(self) -> np.ndarray:
+        """Coefficients shrunk towards PRIOR by PRIOR_WEIGHT pseudo-observations."""
+        if self._coefficients is None:
+            ridge = PRIOR_WEIGHT * np.eye(len(FEATURES))
+            self._coefficients = np.linalg.solve(self.xtx + ridge, self.xty + ridge @ np.array(PRIOR))
+        return self._coefficients
+
+    def predict(self, metadata: Optional[Dict]) -> float:
+        """Predicted processing seconds of a repository."""
+        return max(MIN_SECONDS, float(self.features(metadata) @ self.coefficients()))
+
+    def observe(self, metadata: Optional[Dict], seconds: float) -> None:
+        """Add a repository's observed processing time."""
+        x = self.features(metadata)
+        self.xtx += np.outer(x, x)
+        self.xty += x * seconds
+        self.observations += 1
+        if metadata and metadata.get("size") is not None:
+            self.size_kb_total += metadata["size"]
+            self.sized += 1
+        self._coefficients = None
+
+    def save(self) -> None:
+        """Atomically write the model's statistics to its state file."""
+        if not self.state_file:
+            return
+        state = {
+            "features": list(FEATURES),
+            "xtx": self.xtx.tolist(),
+            "xty": self.xty.tolist(),
+            "observations": self.observations,
+            "size_kb_total": self.size_kb_total,
+            "sized": self.sized
+        }
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.state_file)
+
+class RunScheduler:
+    """Orders a run's repositories and decides which can still start before the deadline."""
+
+    def __init__(self, model: CostModel, metadata: Dict[str, Dict], deadline: float, workers: int = 1):
+        """
+        Args:
+            model: Cost model to predict with and to add observations to
+            metadata: Repository metadata by name (see load_repo_metadata)
+            deadline: Epoch time by which every started repository should be done
+            workers: Number of repositories processed at once
+        """
+        self.model = model
+        self.metadata = metadata
+        self.deadline = deadline - DEADLINE_MARGIN
+        self.workers = max(1, workers)
+
+    def cost(self, repo_info: Tuple[str, str, str]) -> float:
+        """Predicted processing seconds of a repository."""
+        return self.model.predict(self.metadata.get(repo_info[0]))
+
+    def order(self, repos: List[Tuple[str, str, str]], now: float) -> List[Tuple[str, str, str]]:
+        """
+        Order a batch of repositories for processing.
+
+        The batch keeps its order if its predicted cost fits in the time left
+        across the workers, and is sorted cheapest first otherwise.
+        """
+        total = sum(self.cost(repo_info) for repo_info in repos) * SAFETY / self.workers
+        if total <= self.deadline - now:
+            return list(repos)
+        logging.info(f"Batch predicted to take {total:.0f}s with {self.deadline - now:.0f}s left, starting cheapest first")
+        return sorted(repos, key=self.cost)
+
+    def pick(self, pending: List[Tuple[str, str, str]], now: float) -> Optional[Tuple[str, str, str]]:
+        """
+        Remove and return the first pending repository predicted to finish before the deadline.
+
+        Repositories that no longer fit stay in pending, to be left for a
+        later run.
+
+        Returns:
+            Repository to start, or None if none fits
+        """
+        for index, repo_info in enumerate(pending):
+            if now + self.cost(repo_info) * SAFETY <= self.deadline:
+                return pending.pop(index)
+        return None
+
+    def record(self, repo_info: Tuple[str, str, str], seconds: float) -> None:
+        """Add a completed repository's processing time to the model and save it."""
+        self.model.observe(self.metadata.get(repo_info[0]), seconds)
+        self.model.save()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Inspect the repository cost model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    predict_parser = subparsers.add_parser("predict", help="Print the predicted seconds of repositories")
+    predict_parser.add_argument("cost_model", help="Cost model state file")
+    predict_parser.add_argument("--repos-file", required=True, help="repos.jsonl to predict")
+
+    show_parser = subparsers.add_parser("show", help="Print the model's coefficients")
+    show_parser.add_argument("cost_model", help="Cost model state file")
+
+    args = parser.parse_args()
+
+    model = CostModel(args.cost_model)
+    if args.command == "show":
+        print(json.dumps({
+            "observations": model.observations,
+            "coefficients": dict(zip(FEATURES, (round(float(value), 6) for value in model.coefficients())))
+        }))
+    else:
+        metadata = load_repo_metadata([args.repos_file])
+        for repo_data in read_repos(args.repos_file):
+            print(f"{repo_data['repo_name']}\t{model.predict(metadata.get(repo_data['repo_name'])):.1f}")
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Sharded Runs and Result Merging
+
+Lets several workers (machines or matrix jobs) analyze disjoint parts of the
+repository list. A repository belongs to shard md5(repo_name) mod K, so every
+worker computes the same partition without coordination. A worker started
+with --shard-index i --shard-count K only processes its own repositories and
+writes its imports, processed names and newly found repositories to shard
+files next to the usual ones, e.g. data/imports.shard-2-of-8.jsonl.
+
+The merge command appends the shard files to the canonical files. Each
+repository's rows are taken from one place only: the canonical files first,
+then shards in (count, index) order, so a repository analyzed by two workers
+(after a change of K, or a retried job) is counted once and merging the
+same shards again adds nothing. Counts built from the merged imports match
+a single-worker run over the same repositories.
+
+Usage:
+    python main.py ... --shard-index 2 --shard-count 8
+    python sharding.py merge --imports-file data/imports.jsonl --processed-file data/processed_repos.txt \
+        --repos-file data/repos.jsonl --counts-output data/library_counts.csv --counts-state data/library_counts_state.json
+"""
+import os
+import re
+import glob
+import json
+import hashlib
+import argparse
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from github_utils import save_results
+from import_store import is_columnar_file, iter_records, record_row
+
+# Rows appended to the canonical imports file per write
+MERGE_BATCH_ROWS = 10_000
+
+def shard_of(repo_name: str, shard_count: int) -> int:
+    """Shard a repository belongs to."""
+    digest = hashlib.md5(repo_name.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+def in_shard(repo_name: str, shard_index: int, shard_count: int) -> bool:
+    """Whether a repository belongs to the given shard."""
+    return shard_count <= 1 or shard_of(repo_name, shard_count) == shard_index
+
+def shard_file(path: str, shard_index: int, shard_count: int) -> str:
+    """Path of a shard's segment of a data file (imports.jsonl -> imports.shard-2-of-8.jsonl)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard_index}-of-{shard_count}{ext}"
+
+def find_shard_files(path: str) -> Dict[Tuple[int, int], str]:
+    """
+    Shard segments of a data file that exist on disk.
+
+    Returns:
+        Dictionary of (shard_count, shard_index) to file path
+    """
+    root, ext = os.path.splitext(path)
+    pattern = re.compile(re.escape(root) + r"\.shard-(\d+)-of-(\d+)" + re.escape(ext) + "$")
+    shards = {}
+    for candidate in glob.glob(f"{glob.escape(root)}.shard-*-of-*{glob.escape(ext)}"):
+        match = pattern.match(candidate)
+        if match:
+            shards[(int(match.group(2)), int(match.group(1)))] = candidate
+    return shards
+
+def iter_import_records(path: str) -> Iterator[Dict[str, str]]:
+    """Yield the records of a JSON Lines or columnar imports file."""
+    if not os.path.exists(path):
+        return
+    if is_columnar_file(path):
+        yield from iter_records(path)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'repo' in record and 'library' in record:
+                yield record
+
+def read_processed(path: str) -> List[str]:
+    """Repository names of a processed file, in order and without duplicates."""
+    names = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                name = line.strip()
+                if name:
+                    names[name] = None
+    return list(names)
+
+def read_repos(path: str) -> Iterator[Dict]:
+    """Yield the entries of a repos.jsonl file."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                repo_data = json.loads(line.strip())
+            except json.JSONDecodeError:
+                continue
+            if repo_data.get("repo_name"):
+                yield repo_data
+
+def load_shard_repos(
+    repos_files: Sequence[str],
+    processed_files: Sequence[str],
+    shard_index: int,
+    shard_count: int,
+    limit: Optional[int] = None
+) -> List[Tuple[str, str, str]]:
+    """
+    Load a shard's unprocessed repositories.
+
+    Args:
+        repos_files: repos.jsonl files to read (the canonical one and the shard's own)
+        processed_files: Processed files whose repositories are skipped
+        shard_index: Index of this worker's shard
+        shard_count: Number of shards
+        limit: Maximum number of repositories to return
+
+    Returns:
+        List of tuples (repo_name, repo_url, last_updated)
+    """
+    skip: Set[str] = set()
+    for path in processed_files:
+        skip.update(read_processed(path))
+
+    repos = []
+    for path in repos_files:
+        for repo_data in read_repos(path):
+            if limit is not None and len(repos) >= limit:
+                return repos
+            repo_name = repo_data["repo_name"]
+            if repo_name in skip or not in_shard(repo_name, shard_index, shard_count):
+                continue
+            skip.add(repo_name)
+            repos.append((
+                repo_name,
+                repo_data.get("repo_url", f"https://github.com/{repo_name}"),
+                repo_data.get("last_updated", datetime.utcnow().isoformat())
+            ))
+    return repos
+
+def merge_imports(imports_file: str, processed_file: str) -> Tuple[int, int]:
+    """
+    Append the shard segments of an imports file and a processed file to them.
+
+    A repository's rows are kept from the first place it appears in: the
+    canonical files, then each shard in (count, index) order. A shard owns
+    the repositories in its processed file and its imports.
+
+    Returns:
+        Tuple of (import rows appended, processed names appended)
+    """
+    owned = set(read_processed(processed_file))
+    owned.update(record['repo'] for record in iter_import_records(imports_file))
+    processed_names = set(read_processed(processed_file))
+
+    import_shards = find_shard_files(imports_file)
+    processed_shards = find_shard_files(processed_file)
+    rows_added = 0
+    names_added = 0
+    for shard in sorted(set(import_shards) | set(processed_shards)):
+        claimed = set()
+        batch = []
+        if shard in import_shards:
+            for record in iter_import_records(import_shards[shard]):
+                repo_name = record['repo']
+                if repo_name in owned:
+                    continue
+                claimed.add(repo_name)
+                batch.append(record_row(record))
+                if len(batch) >= MERGE_BATCH_ROWS:
+                    save_results(batch, imports_file)
+                    rows_added += len(batch)
+                    batch = []
+        if batch:
+            save_results(batch, imports_file)
+            rows_added += len(batch)
+
+        new_names = []
+        if shard in processed_shards:
+            for repo_name in read_processed(processed_shards[shard]):
+                if repo_name not in processed_names:
+                    processed_names.add(repo_name)
+                    new_names.append(repo_name)
+                if repo_name not in owned:
+                    claimed.add(repo_name)
+        if new_names:
+            with open(processed_file, 'a') as f:
+                f.writelines(f"{name}\n" for name in new_names)
+            names_added += len(new_names)
+
+        owned |= claimed
+        logging.info(f"Merged shard {shard[1]} of {shard[0]}: {len(claimed)} repositories")
+    return rows_added, names_added
+
+def merge_repos(repos_file: str) -> int:
+    """
+    Append the repositories found by shards to a repos.jsonl file, skipping known ones.
+
+    Returns:
+        Number of repositories appended
+    """
+    known = {repo_data["repo_name"] for repo_data in read_repos(repos_file)}
+    added = 0
+    with open(repos_file, 'a') as out:
+        for shard in sorted(find_shard_files(repos_file)):
+            for repo_data in read_repos(find_shard_files(repos_file)[shard]):
+                if repo_data["repo_name"] not in known:
+                    known.add(repo_data["repo_name"])
+                    out.write(json.dumps(repo_data) + '\n')
+                    added += 1
+    return added
+
+def remove_shard_files(*paths: str) -> None:
+    """Delete the shard segments of data files after a merge."""
+    for path in paths:
+        for shard_path in find_shard_files(path).values():
+            os.remove(shard_path)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Merge the results of sharded runs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    merge_parser = subparsers.add_parser("merge", help="Append shard files to the canonical data files")
+    merge_parser.add_argument("--imports-file", required=True, help="Canonical imports file")
+    merge_parser.add_argument("--processed-file", required=True, help="Canonical processed repositories file")
+    merge_parser.add_argument("--repos-file", default=None, help="Canonical repos.jsonl to add shard-found repositories to")
+    merge_parser.add_argument("--counts-output", default=None, help="Recount libraries into this CSV after merging")
+    merge_parser.add_argument("--counts-state", default=None, help="count_libs state file for an incremental recount")
+    merge_parser.add_argument("--remove-shards", action="store_true", help="Delete the shard files after merging")
+
+    shard_parser = subparsers.add_parser("shard", help="Print the shard of repositories")
+    shard_parser.add_argument("repo_names", nargs="+", help="Repository names (owner/repo)")
+    shard_parser.add_argument("--shard-count", type=int, required=True, help="Number of shards")
+
+    args = parser.parse_args()
+
+    if args.command == "shard":
+        for repo_name in args.repo_names:
+            print(f"{repo_name}\t{shard_of(repo_name, args.shard_count)}")
+    else:
+        rows, names = merge_imports(args.imports_file, args.processed_file)
+        print(f"Appended {rows} import rows and {names} processed repositories")
+        if args.repos_file:
+            print(f"Appended {merge_repos(args.repos_file)} repositories to {args.repos_file}")
+        if args.counts_output:
+            from count_libs import count_libraries
+            count_libraries(args.imports_file, args.counts_output, state_file=args.counts_state)
+        if args.remove_shards:
+            remove_shard_files(args.imports_file, args.processed_file, *([args.repos_file] if args.repos_file else []))
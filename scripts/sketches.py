@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Mergeable Usage Sketches
+
+Fixed-memory summaries of the import records for counting distinct
+repositories per library:
+
+- HyperLogLog: estimates the number of distinct items with relative
+  standard error 1.04 / sqrt(2^precision).
+- Count-Min sketch whose cells are HyperLogLogs: each library is hashed to
+  one cell per row, the cell's HyperLogLog records the library's
+  repositories, and the estimate is the smallest cell of any row.
+  Collisions can only add repositories, so estimates are never low by more
+  than the HyperLogLog error.
+- Space-Saving: keeps the top_k most frequent libraries (counted once per
+  repository) as the candidates that are reported.
+
+HyperLogLog registers merge by taking the maximum, so merging sketches of
+different runs or shards gives exactly the sketch of the combined input.
+Space-Saving summaries merge by adding counts, which keeps their error
+bounds; the reported repository counts always come from the registers.
+
+Usage:
+    python sketches.py merge combined.sketch shard0.sketch shard1.sketch
+    python sketches.py report combined.sketch -o library_counts.csv
+"""
+import os
+import json
+import math
+import zlib
+import struct
+import heapq
+import hashlib
+import argparse
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"LIBSKT1\n"
+
+_LENGTH = struct.Struct("<I")
+
+def hash64(value: str) -> int:
+    """64-bit blake2b hash of a string."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+def precision_for_error(error: float) -> int:
+    """Smallest HyperLogLog precision whose standard error is at most error."""
+    return min(16, max(4, math.ceil(math.log2((1.04 / error) ** 2))))
+
+def _alpha(m: int) -> float:
+    if m == 16:
+        return 0.673
+    if m == 32:
+        return 0.697
+    if m == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / m)
+
+def hll_estimate(registers: np.ndarray) -> np.ndarray:
+    """
+    HyperLogLog cardinality estimates for the register arrays along the last axis.
+
+    Uses linear counting for small cardinalities; 64-bit hashes make the
+    large-range correction unnecessary.
+    """
+    m = registers.shape[-1]
+    raw = _alpha(m) * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+def _register_updates(hashes: np.ndarray, precision: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Register index and rank (position of the first 1 bit) of 64-bit hashes."""
+    bits = 64 - precision
+    index = (hashes >> np.uint64(bits)).astype(np.int64)
+    rest = hashes & np.uint64((1 << bits) - 1)
+    # Bit length in two exact halves; float64 holds 32-bit integers exactly
+    high = (rest >> np.uint64(32)).astype(np.float64)
+    low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        bit_length = np.where(
+            high > 0, 33 + np.floor(np.log2(high)),
+            np.where(low > 0, 1 + np.floor(np.log2(low)), 0)
+        )
+    return index, (bits - bit_length + 1).astype(np.uint8)
+
+class HyperLogLog:
+    """HyperLogLog distinct counter."""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        """Add items given as 64-bit hashes."""
+        index, rank = _register_updates(hashes.astype(np.uint64), self.precision)
+        np.maximum.at(self.registers, index, rank)
+
+    def add(self, values: Iterable[str]) -> None:
+        """Add string items."""
+        self.add_hashes(np.fromiter((hash64(value) for value in values), dtype=np.uint64))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Merge another counter of the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> float:
+        """Estimated number of distinct items."""
+        return float(hll_estimate(self.registers))
+
+class SpaceSaving:
+    """Space-Saving heavy hitters summary with a fixed number of counters."""
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        # item -> [count, overestimation error]
+        self.counters: Dict[str, List[int]] = {}
+        # Min-heap of (count, item); entries whose count is outdated are skipped
+        self._heap: List[Tuple[int, str]] = []
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(count, item) for item, (count, _) in self.counters.items()]
+        heapq.heapify(self._heap)
+
+    def add(self, item: str, count: int = 1) -> None:
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            heapq.heappush(self._heap, (counter[0], item))
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            heapq.heappush(self._heap, (count, item))
+        else:
+            # Replace the smallest counter; its count becomes the new item's error
+            while True:
+                floor, smallest = heapq.heappop(self._heap)
+                if self.counters.get(smallest, [None])[0] == floor:
+                    break
+            del self.counters[smallest]
+            self.counters[item] = [floor + count, floor]
+            heapq.heappush(self._heap, (floor + count, item))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """Merge another summary by adding counts and keeping the largest counters."""
+        combined = {item: list(counter) for item, counter in self.counters.items()}
+        for item, (count, error) in other.counters.items():
+            if item in combined:
+                combined[item][0] += count
+                combined[item][1] += error
+            else:
+                combined[item] = [count, error]
+        ranked = sorted(combined.items(), key=lambda entry: -entry[1][0])
+        self.counters = dict(ranked[:self.capacity])
+        self._rebuild_heap()
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """Items by decreasing count as (item, count, error)."""
+        ranked = sorted(self.counters.items(), key=lambda entry: (-entry[1][0], entry[0]))
+        return [(item, count, error) for item, (count, error) in ranked[:k]]
+
+class LibrarySketch:
+    """
+    Distinct repositories per library in fixed memory.
+
+    Memory is depth * width * 2^precision bytes of registers plus top_k
+    Space-Saving counters, independent of the number of records.
+    """
+
+    def __init__(self, error: float = 0.05, epsilon: float = 0.0005, delta: float = 0.01, top_k: int = 2000):
+        """
+        Args:
+            error: Relative standard error of each HyperLogLog
+            epsilon: Count-Min width parameter; collisions add at most about
+                epsilon times the total repository-library pairs with probability 1 - delta
+            delta: Count-Min failure probability (sets the number of rows)
+            top_k: Number of candidate libraries tracked and reported
+        """
+        self.precision = precision_for_error(error)
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.top_k = top_k
+        self.registers = np.zeros((self.depth, self.width, 1 << self.precision), dtype=np.uint8)
+        self.heavy_hitters = SpaceSaving(top_k)
+        self.records = 0
+
+    def params(self) -> Dict:
+        return {"precision": self.precision, "width": self.width, "depth": self.depth, "top_k": self.top_k}
+
+    def _cells(self, library: str) -> np.ndarray:
+        """Column of the library in each row (double hashing)."""
+        digest = hashlib.blake2b(library.encode("utf-8"), digest_size=16, person=b"library").digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return np.array([(h1 + row * h2) % self.width for row in range(self.depth)], dtype=np.int64)
+
+    def add(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        """
+        Add (repo, library) records.
+
+        Repeated pairs within the batch are added once; pairs repeated across
+        batches do not change the register estimates either.
+        """
+        unique = set(pairs)
+        if not unique:
+            return
+        self.records += len(unique)
+        cells: Dict[str, np.ndarray] = {}
+        columns = np.empty((len(unique), self.depth), dtype=np.int64)
+        hashes = np.empty(len(unique), dtype=np.uint64)
+        for i, (repo, library) in enumerate(unique):
+            if library not in cells:
+                cells[library] = self._cells(library)
+            columns[i] = cells[library]
+            hashes[i] = hash64(repo)
+            self.heavy_hitters.add(library)
+
+        index, rank = _register_updates(hashes, self.precision)
+        rows = np.broadcast_to(np.arange(self.depth), columns.shape)
+        np.maximum.at(
+            self.registers,
+            (rows.ravel(), columns.ravel(), np.repeat(index, self.depth)),
+            np.repeat(rank, self.depth)
+        )
+
+    def estimate(self, library: str) -> float:
+        """Estimated number of distinct repositories using a library."""
+        cells = self._cells(library)
+        return float(hll_estimate(self.registers[np.arange(self.depth), cells]).min())
+
+    def merge(self, other: "LibrarySketch") -> None:
+        """Merge a sketch built with the same parameters into this one."""
+        if other.params() != self.params():
+            raise ValueError(f"Cannot merge sketches with parameters {self.params()} and {other.params()}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        self.heavy_hitters.merge(other.heavy_hitters)
+        self.records += other.records
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Candidate libraries with their estimated repository counts, largest first."""
+        estimates = [(library, round(self.estimate(library))) for library, _, _ in self.heavy_hitters.top()]
+        estimates.sort(key=lambda entry: (-entry[1], entry[0]))
+        return estimates[:k]
+
+    def save(self, path: str) -> None:
+        """Atomically write the sketch to a file."""
+        header = json.dumps({
+            **self.params(),
+            "records": self.records,
+            "heavy_hitters": self.heavy_hitters.counters
+        }).encode("utf-8")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + _LENGTH.pack(len(header)) + header)
+            f.write(zlib.compress(self.registers.tobytes(), 6))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LibrarySketch":
+        """Read a sketch written by save()."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a library sketch")
+            header = json.loads(f.read(_LENGTH.unpack(f.read(_LENGTH.size))[0]))
+            registers = zlib.decompress(f.read())
+        sketch = cls.__new__(cls)
+        sketch.precision = header["precision"]
+        sketch.width = header["width"]
+        sketch.depth = header["depth"]
+        sketch.top_k = header["top_k"]
+        sketch.records = header["records"]
+        sketch.registers = np.frombuffer(registers, dtype=np.uint8).reshape(
+            sketch.depth, sketch.width, 1 << sketch.precision
+        ).copy()
+        sketch.heavy_hitters = SpaceSaving(sketch.top_k)
+        sketch.heavy_hitters.counters = {item: list(counter) for item, counter in header["heavy_hitters"].items()}
+        sketch.heavy_hitters._rebuild_heap()
+        return sketch
+
+def merge_sketch_files(output_file: str, input_files: List[str]) -> LibrarySketch:
+    """Merge sketch files into one and write it to output_file."""
+    merged = LibrarySketch.load(input_files[0])
+    for path in input_files[1:]:
+        merged.merge(LibrarySketch.load(path))
+    merged.save(output_file)
+    return merged
+
+if __name__ == "__main__":
+    from count_libs import write_counts
+
+    parser = argparse.ArgumentParser(description="Merge and report library sketches")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    merge_parser = subparsers.add_parser("merge", help="Merge sketches from several runs or shards")
+    merge_parser.add_argument("output_file", help="Path to the merged sketch")
+    merge_parser.add_argument("input_files", nargs="+", help="Sketches to merge")
+
+    report_parser = subparsers.add_parser("report", help="Write estimated repositories per library as CSV")
+    report_parser.add_argument("sketch_file", help="Path to the sketch")
+    report_parser.add_argument("-o", "--output", default="library_counts.csv", help="Path to the output CSV file")
+
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        sketch = merge_sketch_files(args.output_file, args.input_files)
+        print(f"Merged {len(args.input_files)} sketches ({sketch.records} records) into {args.output_file}")
+    else:
+        sketch = LibrarySketch.load(args.sketch_file)
+        write_counts(Counter(dict(sketch.top())), args.output)
+        print(f"Results written to {args.output}")
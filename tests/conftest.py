@@ -0,0 +1,8 @@
+# tests/conftest.py
+"""The scripts import each other by bare name, as they do when run from scripts/."""
+import os
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
@@ -0,0 +1,111 @@
+# tests/test_count_libs.py
+"""Tests of count_libs resuming from its byte-offset checkpoint."""
+import csv
+import json
+
+import pytest
+
+from count_libs import count_libraries
+
+def row(library, repo="o/r"):
+    return json.dumps({"library": library, "repo": repo, "file": "main.py", "source": "import"}) + "\n"
+
+def write(path, text, mode="w"):
+    with open(path, mode) as f:
+        f.write(text)
+
+def counts(path):
+    with open(path, newline="") as f:
+        return {line["library"]: int(line["count"]) for line in csv.DictReader(f)}
+
+@pytest.fixture
+def files(tmp_path):
+    return str(tmp_path / "imports.jsonl"), str(tmp_path / "counts.csv"), str(tmp_path / "state.json")
+
+def recount(input_file, tmp_path):
+    """Counts of a full run without a checkpoint, to compare incremental runs with."""
+    output = str(tmp_path / "full.csv")
+    count_libraries(input_file, output)
+    return counts(output)
+
+def test_resume_after_append(files, tmp_path, capsys):
+    input_file, output, state = files
+    write(input_file, row("numpy") + row("requests"))
+    count_libraries(input_file, output, state)
+    assert counts(output) == {"numpy": 1, "requests": 1}
+
+    write(input_file, row("numpy") + row("flask"), "a")
+    capsys.readouterr()
+    count_libraries(input_file, output, state)
+    assert "Resuming from byte" in capsys.readouterr().out
+    assert counts(output) == {"numpy": 2, "requests": 1, "flask": 1}
+    assert counts(output) == recount(input_file, tmp_path)
+
+def test_unchanged_file_adds_nothing(files):
+    input_file, output, state = files
+    write(input_file, row("numpy"))
+    count_libraries(input_file, output, state)
+    count_libraries(input_file, output, state)
+    assert counts(output) == {"numpy": 1}
+
+def test_partial_trailing_line_is_left_for_next_run(files, tmp_path):
+    input_file, output, state = files
+    # A writer is still appending the second row
+    write(input_file, row("numpy") + row("requests")[:10])
+    count_libraries(input_file, output, state)
+    assert counts(output) == {"numpy": 1}
+
+    write(input_file, row("requests")[10:], "a")
+    count_libraries(input_file, output, state)
+    assert counts(output) == {"numpy": 1, "requests": 1}
+    assert counts(output) == recount(input_file, tmp_path)
+
+def test_truncated_file_is_recounted(files, capsys):
+    input_file, output, state = files
+    write(input_file, row("numpy") + row("requests") + row("flask"))
+    count_libraries(input_file, output, state)
+
+    write(input_file, row("django"))
+    capsys.readouterr()
+    count_libraries(input_file, output, state)
+    assert "truncated or rewritten" in capsys.readouterr().out
+    assert counts(output) == {"django": 1}
+
+def test_rewritten_file_of_the_same_size_is_recounted(files, capsys):
+    input_file, output, state = files
+    write(input_file, row("numpy") + row("flask"))
+    count_libraries(input_file, output, state)
+
+    # Same length, different content: only the fingerprint tells them apart
+    write(input_file, row("scipy") + row("torch"))
+    capsys.readouterr()
+    count_libraries(input_file, output, state)
+    assert "truncated or rewritten" in capsys.readouterr().out
+    assert counts(output) == {"scipy": 1, "torch": 1}
+
+def test_checkpoint_of_another_mode_is_not_resumed(files, tmp_path, capsys):
+    pytest.importorskip("numpy")
+    input_file, output, state = files
+    write(input_file, row("numpy", "o/a") + row("numpy", "o/a") + row("numpy", "o/b"))
+    count_libraries(input_file, output, state)
+    assert counts(output) == {"numpy": 3}
+
+    capsys.readouterr()
+    sketch = str(tmp_path / "libs.sketch")
+    count_libraries(input_file, output, state, mode="repos", sketch_file=sketch)
+    assert "rebuilding counts" in capsys.readouterr().out
+    # Distinct repositories, not rows
+    assert counts(output) == {"numpy": 2}
+
+def test_repos_mode_resumes_from_its_sketch(files, tmp_path, capsys):
+    pytest.importorskip("numpy")
+    input_file, output, state = files
+    sketch = str(tmp_path / "libs.sketch")
+    write(input_file, row("numpy", "o/a") + row("flask", "o/a"))
+    count_libraries(input_file, output, state, mode="repos", sketch_file=sketch)
+
+    write(input_file, row("numpy", "o/a") + row("numpy", "o/b"), "a")
+    capsys.readouterr()
+    count_libraries(input_file, output, state, mode="repos", sketch_file=sketch)
+    assert "Resuming from byte" in capsys.readouterr().out
+    assert counts(output) == {"numpy": 2, "flask": 1}
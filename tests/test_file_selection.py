@@ -0,0 +1,36 @@
+# tests/test_file_selection.py
+"""Tests of the first-party module names a repository's own imports are filtered with."""
+from file_selection import first_party_modules
+
+def test_package_roots_and_root_modules():
+    paths = [
+        "setup.py",
+        "mypkg/__init__.py",
+        "mypkg/core/__init__.py",
+        "mypkg/core/engine.py",
+        "lib/inner/__init__.py",
+        "src/tool/cli.py",
+        "README.md",
+    ]
+    assert first_party_modules(paths) == {"setup", "mypkg", "inner", "tool"}
+
+def test_loose_modules_below_the_root_are_not_first_party():
+    paths = ["app.py", "docs/conf.py", "examples/requests.py", "scripts/numpy.py"]
+    assert first_party_modules(paths) == {"app"}
+
+def test_packages_in_example_and_test_directories_are_not_first_party():
+    # An example app named after the library it demonstrates must not hide `import flask`
+    paths = [
+        "examples/flask/__init__.py",
+        "examples/flask/app.py",
+        "docs/sphinx_ext/__init__.py",
+        "tests/__init__.py",
+        "tests/fixtures/requests/__init__.py",
+        "mypkg/__init__.py",
+        "mypkg/tests/__init__.py",
+    ]
+    assert first_party_modules(paths) == {"mypkg"}
+
+def test_vendored_packages_are_not_first_party():
+    paths = ["vendor/six/__init__.py", "venv/lib/site-packages/yaml/__init__.py", "mypkg/_vendor/attr/__init__.py"]
+    assert first_party_modules(paths) == set()
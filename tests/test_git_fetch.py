@@ -0,0 +1,104 @@
+# tests/test_git_fetch.py
+"""Offline tests of clone and partial fetch modes against local file:// bare repositories."""
+import shutil
+import subprocess
+
+import pytest
+
+import git_fetch
+from git_fetch import fetch_selected_files, list_tree
+from metrics import RepoMetrics
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+FILES = {
+    "main.py": "import requests\nfrom flask import Flask\n",
+    "pkg/__init__.py": "from .core import run\n",
+    "pkg/core.py": "import numpy as np\nimport os\n",
+    "pkg/util.py": "import yaml\n",
+    "tests/test_core.py": "import pytest\n",
+    "docs/conf.py": "import sphinx_rtd_theme\n",
+    "data/blob.bin": "x" * 200_000,
+    "README.md": "# r\n",
+}
+
+def git(*args, cwd=None):
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """
+    Make owner/repo (filtering allowed), owner/nofilter (filtering not allowed)
+    and owner/empty (no commits) under a file:// base URL.
+    """
+    source = tmp_path / "source"
+    for path, content in FILES.items():
+        (source / path).parent.mkdir(parents=True, exist_ok=True)
+        (source / path).write_text(content)
+    git("init", "--quiet", str(source))
+    git("add", "-A", cwd=source)
+    git("commit", "--quiet", "-m", "initial", cwd=source)
+
+    remotes = tmp_path / "remotes" / "owner"
+    for name, allow_filter in (("repo", True), ("nofilter", False)):
+        bare = remotes / f"{name}.git"
+        git("clone", "--quiet", "--bare", str(source), str(bare))
+        if allow_filter:
+            git("config", "uploadpack.allowFilter", "true", cwd=bare)
+            git("config", "uploadpack.allowAnySHA1InWant", "true", cwd=bare)
+    git("init", "--quiet", "--bare", str(remotes / "empty.git"))
+    monkeypatch.setattr(git_fetch, "GIT_BASE_URL", f"file://{tmp_path / 'remotes'}")
+    return tmp_path
+
+def local_blobs(repo_dir):
+    """SHAs of the blobs present in a clone's object store."""
+    output = git("cat-file", "--batch-check", "--batch-all-objects", cwd=repo_dir)
+    return {line.split()[0] for line in output.splitlines() if line.split()[1] == "blob"}
+
+def fetch(tmp_path, repo_name, fetch_mode, max_files=3):
+    dest = tmp_path / f"{repo_name.replace('/', '_')}-{fetch_mode}"
+    dest.mkdir()
+    metrics = RepoMetrics(repo_name, fetch_mode)
+    files = fetch_selected_files(repo_name, str(dest), max_files, fetch_mode=fetch_mode, metrics=metrics)
+    return files, str(dest), metrics
+
+def summary(files):
+    return sorted((file.path, file.blob_sha, file.content) for file in files)
+
+def test_partial_fetch_reads_only_selected_blobs(remote):
+    files, repo_dir, metrics = fetch(remote, "owner/repo", "partial")
+    assert files is not None and len(files) == 3
+    assert all(file.content for file in files)
+    # Only the selected Python blobs were downloaded: not the data file, docs or README
+    assert local_blobs(repo_dir) == {file.blob_sha for file in files}
+    assert git("config", "remote.origin.promisor", cwd=repo_dir).strip() == "true"
+    assert metrics.tree_files == len(FILES)
+
+def test_partial_fetch_matches_clone(remote):
+    partial, _, _ = fetch(remote, "owner/repo", "partial")
+    clone, clone_dir, _ = fetch(remote, "owner/repo", "clone")
+    assert summary(partial) == summary(clone)
+    # A full clone has every blob of HEAD
+    assert local_blobs(clone_dir) == {entry.sha for entry in list_tree(clone_dir)}
+
+def test_partial_fetch_without_server_filter_support(remote):
+    # The server ignores --filter, so git falls back to a full clone
+    files, repo_dir, _ = fetch(remote, "owner/nofilter", "partial")
+    clone, _, _ = fetch(remote, "owner/repo", "clone")
+    assert files is not None
+    assert summary(files) == summary(clone)
+    assert local_blobs(repo_dir) == {entry.sha for entry in list_tree(repo_dir)}
+
+def test_missing_repository(remote):
+    files, _, _ = fetch(remote, "owner/missing", "partial")
+    assert files is None
+
+@pytest.mark.parametrize("fetch_mode", ["clone", "partial"])
+def test_empty_repository(remote, fetch_mode):
+    # An unborn HEAD has no files; it is not a failed fetch
+    files, repo_dir, _ = fetch(remote, "owner/empty", fetch_mode)
+    assert files == []
+    assert list_tree(repo_dir) == []
@@ -0,0 +1,184 @@
+# tests/test_github_client.py
+"""Tests of the asynchronous GitHub client against a stubbed local API server."""
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import github_utils
+import github_client
+from github_utils import RateLimitExceeded
+from github_client import AsyncGitHubClient, RateLimitBucket, fetch_rate_limits
+
+class StubAPI:
+    """Local HTTP server answering each GET with the next scripted (status, headers, body) for its path."""
+
+    def __init__(self):
+        self.responses = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                stub.requests.append((path, time.time()))
+                script = stub.responses.get(path) or [(404, {}, {"message": "Not Found"})]
+                status, headers, body = script.pop(0) if len(script) > 1 else script[0]
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, str(value))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def script(self, path, *responses):
+        self.responses[path] = list(responses)
+
+    def count(self, path):
+        return sum(1 for requested, _ in self.requests if requested == path)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def api(monkeypatch):
+    # A fresh hourly guard for every test
+    monkeypatch.setattr(github_utils, "api_requests_count", 0)
+    monkeypatch.setattr(github_utils, "api_request_reset_time", time.time() + 3600)
+    stub = StubAPI()
+    yield stub
+    stub.close()
+
+def rate_headers(remaining, reset, limit=30, resource="search"):
+    return {
+        "X-RateLimit-Remaining": remaining,
+        "X-RateLimit-Reset": reset,
+        "X-RateLimit-Limit": limit,
+        "X-RateLimit-Resource": resource
+    }
+
+def get(url, **kwargs):
+    async def run():
+        async with AsyncGitHubClient(**kwargs) as client:
+            return await client.get(url), client
+    return asyncio.run(run())
+
+def test_retry_after_is_honored(api):
+    api.script(
+        "/search/repositories",
+        (403, {"Retry-After": "1"}, {"message": "secondary rate limit"}),
+        (200, {}, {"items": [1]})
+    )
+    data, client = get(f"{api.url}/search/repositories")
+    assert data == {"items": [1]}
+    assert client.requests_made == 2
+    first, second = [at for path, at in api.requests]
+    assert second - first >= 1
+
+def test_retry_after_beyond_max_wait_raises(api):
+    api.script("/search/repositories", (429, {"Retry-After": "600"}, {"message": "slow down"}))
+    with pytest.raises(RateLimitExceeded):
+        get(f"{api.url}/search/repositories", max_wait=5)
+    assert api.count("/search/repositories") == 1
+
+def test_empty_bucket_waits_for_reset(api):
+    reset = int(time.time()) + 2
+    api.script("/search/repositories", (200, rate_headers(0, reset), {"page": 1}))
+
+    async def run():
+        async with AsyncGitHubClient(max_wait=10) as client:
+            await client.get(f"{api.url}/search/repositories", use_cache=False)
+            await client.get(f"{api.url}/search/repositories", use_cache=False)
+            return client
+
+    client = asyncio.run(run())
+    first, second = [at for path, at in api.requests]
+    # The second request is held until the window the server reported resets
+    assert second >= reset
+    assert client.buckets["search"].limit == 30
+
+def test_empty_bucket_beyond_max_wait_raises_without_request(api):
+    api.script("/search/repositories", (200, rate_headers(0, int(time.time()) + 3600), {}))
+
+    async def run():
+        async with AsyncGitHubClient(max_wait=5) as client:
+            await client.get(f"{api.url}/search/repositories")
+            await client.get(f"{api.url}/search/repositories")
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(run())
+    assert api.count("/search/repositories") == 1
+
+def test_rate_limit_error_drains_bucket_and_retries(api):
+    reset = int(time.time()) + 1
+    api.script(
+        "/repos/o/r",
+        (403, rate_headers(0, reset, 5000, "core"), {"message": "API rate limit exceeded"}),
+        (200, rate_headers(4999, reset + 3600, 5000, "core"), {"full_name": "o/r"})
+    )
+    data, client = get(f"{api.url}/repos/o/r", max_wait=10)
+    assert data == {"full_name": "o/r"}
+    assert api.requests[1][1] >= reset
+    assert client.buckets["core"].remaining == 4999
+
+def test_resource_header_selects_bucket(api):
+    api.script("/search/code", (200, rate_headers(9, int(time.time()) + 60, 10, "code_search"), {}))
+    _, client = get(f"{api.url}/search/code")
+    assert client.buckets["code_search"].remaining == 9
+    assert client.buckets["search"].remaining is None
+
+def test_requests_count_against_shared_hourly_guard(api, monkeypatch):
+    api.script("/repos/o/r", (200, {}, {}))
+    get(f"{api.url}/repos/o/r")
+    assert github_utils.api_requests_count == 1
+
+    # Next to the guard, the async client stops before sending like make_github_request does
+    monkeypatch.setattr(github_utils, "api_requests_count", 899)
+    with pytest.raises(RateLimitExceeded):
+        get(f"{api.url}/repos/o/r")
+    assert api.count("/repos/o/r") == 1
+
+def test_rate_limit_endpoint_is_not_counted(api, monkeypatch):
+    reset = int(time.time()) + 600
+    api.script("/rate_limit", (200, {}, {"resources": {
+        "core": {"limit": 5000, "remaining": 4321, "reset": reset},
+        "search": {"limit": 30, "remaining": 12, "reset": reset}
+    }}))
+    monkeypatch.setattr(github_client, "GITHUB_API_URL", api.url)
+    # GitHub does not charge /rate_limit, so it works even at the guard
+    monkeypatch.setattr(github_utils, "api_requests_count", 899)
+
+    async def run():
+        async with AsyncGitHubClient() as client:
+            await fetch_rate_limits(client)
+            return client
+
+    client = asyncio.run(run())
+    assert github_utils.api_requests_count == 899
+    assert client.buckets["core"].remaining == 4321
+    assert client.buckets["search"].remaining == 12
+
+def test_bucket_keeps_lowest_count_within_window():
+    bucket = RateLimitBucket("core")
+    bucket.update(rate_headers(10, 1000, 60, "core"))
+    bucket.remaining -= 3
+    # A response sent before the local requests does not hand tokens back
+    bucket.update(rate_headers(9, 1000, 60, "core"))
+    assert bucket.remaining == 7
+    # A new window resets the count
+    bucket.update(rate_headers(59, 4600, 60, "core"))
+    assert (bucket.remaining, bucket.reset) == (59, 4600)
@@ -0,0 +1,71 @@
+# tests/test_import_scanner.py
+"""Differential tests of the streaming scanner against the AST extractor."""
+import os
+import ast
+
+import pytest
+
+from conftest import SCRIPTS_DIR
+from analyze_imports import extract_imports
+
+# Valid Python 3 snippets covering the statement forms the scanner matches by hand
+CORPUS = {
+    "plain": "import numpy\nimport os\n",
+    "dotted_and_aliases": "import numpy.linalg as la, scipy.sparse, yaml as y\n",
+    "from_import": "from requests.adapters import HTTPAdapter\nfrom flask import (\n    Flask,\n    request,\n)\n",
+    "relative": "from . import sibling\nfrom .mod import x\nfrom .. import parent\nfrom ..pkg.mod import y\n",
+    "relative_spaced": "from . mod import x\nfrom .\\\n    mod import y\n",
+    "continuation_import": "import numpy, \\\n    pandas, \\\n    scipy\n",
+    "continuation_from": "from \\\n    sklearn.linear_model import LinearRegression\n",
+    "indented": "def f():\n    import torch\n    if True:\n        from jax import numpy as jnp\n",
+    "semicolons": "x = 1; import attr; y = 2\nimport click; from rich import print\n",
+    "colon_suite": "try: import ujson as json\nexcept ImportError: import simplejson\nif True: from lxml import etree\n",
+    "docstring": '"""\nimport fake_in_docstring\nfrom fake import thing\n"""\nimport real_one\n',
+    "single_quoted_docstring": "'''import fake_single'''\nimport real_two\n",
+    "strings": "s = 'import fake_string'\nt = \"from fake_dq import x\"\nu = f'import {fake_f}'\nimport real_three\n",
+    "escaped_quotes": "s = 'it\\'s; import fake_escape'\nimport real_four\n",
+    "comments": "# import fake_comment\nimport real_five  # import fake_trailing\n",
+    "keyword_in_names": "important = 1\nimporter = fromage = 2\nimport real_six\n",
+    "attribute_call": "x.import_module('fake_call')\nimportlib.import_module('dyn')\n",
+    "future": "from __future__ import annotations\nimport real_seven\n",
+    "crlf": "import numpy\r\nfrom pandas import DataFrame\r\n",
+    "empty": "",
+}
+
+# Python 2 sources the AST extractor cannot parse; the scanner still finds their imports
+PYTHON2 = {
+    "print_statement": ("import requests\nprint 'fetched', requests.get\nfrom lxml import etree\n", {"requests", "lxml"}),
+    "exec_statement": ("import yaml\nexec 'import fake_exec' in ns\nfrom jinja2 import Template\n", {"yaml", "jinja2"}),
+    "backticks": ("import numpy\nx = `numpy.zeros(3)`\nimport MySQLdb\n", {"numpy", "MySQLdb"}),
+    "old_except": ("try:\n    import simplejson as json\nexcept ImportError, e:\n    import json\n", {"simplejson"}),
+    "print_chevron": ("import boto\nprint >>sys.stderr, 'import fake_print'\nprint 'done'\n", {"boto"}),
+}
+
+@pytest.mark.parametrize("name", sorted(CORPUS))
+def test_scanner_matches_ast(name):
+    content = CORPUS[name]
+    ast.parse(content)
+    assert extract_imports(content, "scan") == extract_imports(content, "ast")
+
+def test_corpus_expectations():
+    assert extract_imports(CORPUS["relative"], "scan") == set()
+    assert extract_imports(CORPUS["docstring"], "scan") == {"real_one"}
+    assert extract_imports(CORPUS["strings"], "scan") == {"real_three"}
+    assert extract_imports(CORPUS["continuation_import"], "scan") == {"numpy", "pandas", "scipy"}
+    assert extract_imports(CORPUS["colon_suite"], "scan") == {"ujson", "simplejson", "lxml"}
+
+@pytest.mark.parametrize("name", sorted(PYTHON2))
+def test_scanner_reads_python2(name):
+    content, expected = PYTHON2[name]
+    with pytest.raises(SyntaxError):
+        ast.parse(content)
+    assert extract_imports(content, "scan") == expected
+
+def test_scanner_matches_ast_on_scripts():
+    # The repository's own scripts are a fixed corpus of real-world code
+    files = sorted(name for name in os.listdir(SCRIPTS_DIR) if name.endswith(".py"))
+    assert files
+    for name in files:
+        with open(os.path.join(SCRIPTS_DIR, name), encoding="utf-8") as f:
+            content = f.read()
+        assert extract_imports(content, "scan") == extract_imports(content, "ast"), name
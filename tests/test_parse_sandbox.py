@@ -0,0 +1,105 @@
+# tests/test_parse_sandbox.py
+"""Tests of the parse sandbox killing runaway parses and replacing its workers."""
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from git_fetch import SourceFile
+from parse_sandbox import ParseSandbox
+
+# Takes the ast engine a few seconds and a few hundred megabytes to parse
+SLOW = "import numpy\n" + "y = 1\n" * 200_000
+
+def source(path, content):
+    return SourceFile(path, path, content)
+
+@pytest.fixture
+def make_sandbox():
+    sandboxes = []
+    def make(**kwargs):
+        sandboxes.append(ParseSandbox(1, **kwargs))
+        return sandboxes[-1]
+    yield make
+    for sandbox in sandboxes:
+        sandbox.close()
+
+def assert_killed(sandbox, reason, path="slow.py"):
+    report = sandbox.report()
+    assert report["killed"][reason] == 1
+    assert sum(report["killed"].values()) == 1
+    assert report["killed_files"] == [{"repo": "o/r", "path": path, "reason": reason}]
+    assert report["restarts"] == 1
+
+def assert_replaced(sandbox):
+    """The dead worker was replaced by one that parses the next file."""
+    parsed = sandbox.parse([source("next.py", "import requests\n")])
+    assert [file.imports for file in parsed] == [{"requests"}]
+    assert len(sandbox.workers) == 1
+
+def test_parses_in_order_and_keeps_cached_files(make_sandbox):
+    sandbox = make_sandbox()
+    cached = SourceFile("cached.py", "c", None, imports={"flask"})
+    files = [source("a.py", "import numpy\n"), cached, source("b.py", "import requests.adapters\nfrom yaml import load\n")]
+    parsed = sandbox.parse(files)
+    assert [file.path for file in parsed] == ["a.py", "cached.py", "b.py"]
+    assert [file.imports for file in parsed] == [{"numpy"}, {"flask"}, {"requests", "yaml"}]
+    assert parsed[0].content is None
+    assert sandbox.report()["files_parsed"] == 2
+
+def test_wall_clock_timeout(make_sandbox):
+    sandbox = make_sandbox(cpu_seconds=0, memory_mb=0, wall_timeout=0.5)
+    files = [source("a.py", "import numpy\n"), source("slow.py", SLOW), source("b.py", "import requests\n")]
+    start = time.monotonic()
+    parsed = sandbox.parse(files, repo_name="o/r")
+    assert time.monotonic() - start < 2
+    # The killed file is left out; the files after it are parsed by the replacement
+    assert [file.path for file in parsed] == ["a.py", "b.py"]
+    assert_killed(sandbox, "timeout")
+    assert_replaced(sandbox)
+
+def test_memory_limit(make_sandbox):
+    sandbox = make_sandbox(cpu_seconds=0, memory_mb=200, wall_timeout=60)
+    parsed = sandbox.parse([source("slow.py", SLOW)], repo_name="o/r")
+    assert parsed == []
+    assert_killed(sandbox, "memory")
+    assert_replaced(sandbox)
+
+def test_cpu_limit(make_sandbox):
+    sandbox = make_sandbox(cpu_seconds=1, memory_mb=0, wall_timeout=60)
+    assert sandbox.parse([source("slow.py", SLOW * 2)], repo_name="o/r") == []
+    assert_killed(sandbox, "cpu")
+    assert_replaced(sandbox)
+
+def test_external_sigkill_is_a_crash(make_sandbox):
+    sandbox = make_sandbox(cpu_seconds=0, memory_mb=0, wall_timeout=60)
+
+    def kill_worker():
+        while not sandbox.workers:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        os.kill(sandbox.workers[0].process.pid, signal.SIGKILL)
+
+    killer = threading.Thread(target=kill_worker)
+    killer.start()
+    parsed = sandbox.parse([source("slow.py", SLOW)], repo_name="o/r")
+    killer.join()
+    assert parsed == []
+    # Not "memory": nothing tells an OOM kill from any other SIGKILL
+    assert_killed(sandbox, "crash")
+    assert_replaced(sandbox)
+
+def test_workers_are_recycled_after_max_files(make_sandbox):
+    sandbox = make_sandbox(max_files_per_worker=2)
+    files = [source(f"{i}.py", "import numpy\n") for i in range(5)]
+    assert len(sandbox.parse(files)) == 5
+    assert sandbox.report()["restarts"] == 2
+    assert sum(sandbox.report()["killed"].values()) == 0
+
+def test_closed_sandbox_refuses_work(make_sandbox):
+    sandbox = make_sandbox()
+    sandbox.close()
+    with pytest.raises(RuntimeError):
+        sandbox.parse([source("a.py", "import numpy\n")])
@@ -0,0 +1,144 @@
+# tests/test_repo_queue.py
+"""Tests of the SQLite work queue's leases, and of workers losing a lease mid-run."""
+import json
+
+import pytest
+
+import pipeline
+import analyze_imports
+from analyze_imports import AnalysisOptions, process_repo_from_queue
+from repo_queue import RepoQueue, PENDING, LEASED, DONE, FAILED
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "queue.db")
+
+def open_queue(db, worker_id, **kwargs):
+    return RepoQueue(db, worker_id=worker_id, **kwargs)
+
+def state(queue, repo_name):
+    return queue.conn.execute(
+        "SELECT state, lease_owner, attempts FROM repos WHERE repo_name = ?", (repo_name,)
+    ).fetchone()
+
+def expire(queue, repo_name):
+    """Make a lease run out, as if its worker had stalled past lease_seconds."""
+    queue.conn.execute("UPDATE repos SET lease_expires = 0 WHERE repo_name = ?", (repo_name,))
+
+def test_lease_complete(db):
+    queue = open_queue(db, "a")
+    queue.add("o/one")
+    queue.add("o/two")
+    assert [repo[0] for repo in queue.lease(1)] == ["o/one"]
+    assert state(queue, "o/one")[:2] == (LEASED, "a")
+    assert queue.complete("o/one")
+    assert queue.stats() == {DONE: 1, PENDING: 1}
+
+def test_pending_does_not_lease(db):
+    a, b = open_queue(db, "a"), open_queue(db, "b")
+    a.add("o/one")
+    assert [repo[0] for repo in a.pending(5)] == ["o/one"]
+    assert a.pending(5, exclude=["o/one"]) == []
+    # Both workers plan the same repository; only the first to lease it gets it
+    assert b.lease_repo("o/one")
+    assert not a.lease_repo("o/one")
+    assert state(a, "o/one")[:2] == (LEASED, "b")
+
+def test_expired_lease_is_taken_over(db):
+    a, b = open_queue(db, "a"), open_queue(db, "b")
+    a.add("o/one")
+    assert a.lease(1)
+    # Not expired yet: nothing to lease
+    assert b.lease(1) == []
+    expire(a, "o/one")
+    assert [repo[0] for repo in b.lease(1)] == ["o/one"]
+    assert state(a, "o/one")[:2] == (LEASED, "b")
+
+def test_stale_worker_cannot_touch_a_lost_lease(db):
+    a, b = open_queue(db, "a", max_attempts=1), open_queue(db, "b")
+    a.add("o/one")
+    assert a.lease(1)
+    expire(a, "o/one")
+    assert b.lease(1)
+
+    assert not a.renew("o/one")
+    assert not a.complete("o/one")
+    a.release("o/one")
+    # With max_attempts=1 a counted failure would mark it failed
+    assert a.fail("o/one", "timeout") == LEASED
+    assert state(a, "o/one") == (LEASED, "b", 0)
+
+    assert b.renew("o/one")
+    assert b.complete("o/one")
+    assert state(a, "o/one")[0] == DONE
+
+def test_release_and_fail(db):
+    queue = open_queue(db, "a", max_attempts=2)
+    queue.add("o/one")
+    queue.lease(1)
+    queue.release("o/one")
+    assert state(queue, "o/one") == (PENDING, None, 0)
+
+    queue.lease(1)
+    assert queue.fail("o/one", "fetch failed") == PENDING
+    queue.lease(1)
+    assert queue.fail("o/one", "fetch failed") == FAILED
+    assert queue.lease(1) == []
+
+ROWS = [("requests", "o/one", "main.py", "2024-01-01T00:00:00", "2024-01-01T00:00:00", "import")]
+
+def steal_during_analysis(db):
+    """An analyze_repo stand-in during which the lease runs out and worker b takes the repository."""
+    def analyze(repo_info, options, metrics=None):
+        # Runs on a fetch thread, which needs its own connection
+        b = open_queue(db, "b")
+        expire(b, repo_info[0])
+        assert b.lease(1)
+        b.close()
+        return list(ROWS)
+    return analyze
+
+def read_rows(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_pipeline_saves_only_while_the_lease_is_held(db, tmp_path, monkeypatch):
+    a = open_queue(db, "a")
+    a.add("o/one")
+    imports_file, processed_file = tmp_path / "imports.jsonl", tmp_path / "processed.txt"
+    monkeypatch.setattr(pipeline, "analyze_repo", steal_during_analysis(db))
+
+    processed = pipeline.run_pipeline(
+        a.pending(1), AnalysisOptions(), imports_file=str(imports_file),
+        processed_file=str(processed_file), workers=1, queue=a
+    )
+    assert processed == 0
+    # The results are left for b, which now holds the repository
+    assert read_rows(imports_file) == []
+    assert not processed_file.exists()
+    assert state(a, "o/one")[:2] == (LEASED, "b")
+
+def test_pipeline_saves_and_completes(db, tmp_path, monkeypatch):
+    queue = open_queue(db, "a")
+    queue.add("o/one")
+    imports_file = tmp_path / "imports.jsonl"
+    monkeypatch.setattr(pipeline, "analyze_repo", lambda repo_info, options, metrics=None: list(ROWS))
+
+    processed = pipeline.run_pipeline(
+        queue.pending(1), AnalysisOptions(), imports_file=str(imports_file),
+        processed_file=None, workers=1, queue=queue
+    )
+    assert processed == 1
+    assert [row["library"] for row in read_rows(imports_file)] == ["requests"]
+    assert state(queue, "o/one")[0] == DONE
+
+def test_serial_worker_saves_only_while_the_lease_is_held(db, tmp_path, monkeypatch):
+    a = open_queue(db, "a")
+    a.add("o/one")
+    imports_file = tmp_path / "imports.jsonl"
+    monkeypatch.setattr(analyze_imports, "analyze_repo", steal_during_analysis(db))
+
+    assert not process_repo_from_queue(a, AnalysisOptions(), output_file=str(imports_file))
+    assert read_rows(imports_file) == []
+    assert state(a, "o/one")[:2] == (LEASED, "b")
@@ -0,0 +1,81 @@
+# tests/test_sampling.py
+"""Tests of the adaptive sampler's stop reasons."""
+import time
+
+from git_fetch import SourceFile
+from sampling import AdaptiveSampler, SampleBudget
+
+def fake_parse(seconds=0.001, sleep=0.0, drop=()):
+    """A parse function whose files list their libraries, space separated, as content."""
+    def parse(files):
+        time.sleep(sleep)
+        return [
+            file._replace(content=None, imports=set(file.content.split()), parse_time=seconds)
+            for file in files if file.path not in drop
+        ]
+    return parse
+
+def files(*contents):
+    return [SourceFile(f"{i}.py", str(i), content) for i, content in enumerate(contents)]
+
+def sample(sampler, candidates):
+    """Drive the sampler like git_fetch does, sizing each file by its content."""
+    analyzed = []
+    for file in candidates:
+        if sampler.done:
+            break
+        size = len(file.content) if file.imports is None else None
+        if not sampler.admit(size):
+            continue
+        analyzed.extend(sampler.add(file, size or 0))
+    return sampler.finish(), [file.path for file in analyzed]
+
+def test_exhausted():
+    sampler = AdaptiveSampler(SampleBudget(), fake_parse())
+    assert sample(sampler, files("numpy", "requests")) == ("exhausted", ["0.py", "1.py"])
+    assert sampler.libraries == {"numpy", "requests"}
+
+def test_max_files():
+    sampler = AdaptiveSampler(SampleBudget(), fake_parse(), max_files=2)
+    assert sample(sampler, files("numpy", "requests", "flask")) == ("max_files", ["0.py", "1.py"])
+
+def test_saturated():
+    sampler = AdaptiveSampler(SampleBudget(patience=2), fake_parse())
+    reason, analyzed = sample(sampler, files("numpy", "numpy", "numpy", "flask"))
+    assert (reason, analyzed) == ("saturated", ["0.py", "1.py", "2.py"])
+
+def test_new_library_resets_patience():
+    sampler = AdaptiveSampler(SampleBudget(patience=2), fake_parse())
+    assert sample(sampler, files("numpy", "numpy", "flask", "numpy", "flask"))[0] == "saturated"
+    assert sampler.files == 5
+
+def test_excluded_and_dropped_files_add_nothing():
+    sampler = AdaptiveSampler(SampleBudget(patience=2), fake_parse(drop={"1.py"}), exclude={"mypkg"})
+    assert sample(sampler, files("mypkg", "numpy", "requests")) == ("saturated", ["0.py"])
+    assert sampler.libraries == set()
+
+def test_cache_hits_are_free():
+    cached = SourceFile("cached.py", "c", None, imports={"flask"})
+    sampler = AdaptiveSampler(SampleBudget(max_bytes=5), fake_parse())
+    assert sample(sampler, [cached] + files("numpy")) == ("bytes", ["cached.py", "0.py"])
+    assert sampler.bytes_read == 5
+
+def test_bytes_passes_over_files_that_do_not_fit():
+    sampler = AdaptiveSampler(SampleBudget(max_bytes=10), fake_parse())
+    reason, analyzed = sample(sampler, files("numpy", "requests", "yaml"))
+    # requests would overrun the budget; the smaller yaml still fits
+    assert analyzed == ["0.py", "2.py"]
+    assert sampler.passed_over == 1
+    assert reason == "bytes"
+
+def test_time_spent():
+    sampler = AdaptiveSampler(SampleBudget(max_seconds=0.05), fake_parse(sleep=0.1))
+    assert sample(sampler, files("numpy", "requests")) == ("time", ["0.py"])
+
+def test_time_passes_over_files_expected_to_be_too_slow():
+    # One second per byte parsed: a 40-byte file would take longer than the budget
+    sampler = AdaptiveSampler(SampleBudget(max_seconds=30), fake_parse(seconds=5))
+    reason, analyzed = sample(sampler, files("numpy", "x" * 40))
+    assert analyzed == ["0.py"]
+    assert sampler.passed_over == 1
+    assert reason == "time"